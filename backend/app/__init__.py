@@ -1,6 +1,7 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
+from flask_sock import Sock
 from dotenv import load_dotenv
 from datetime import datetime
 import os
@@ -10,6 +11,7 @@ load_dotenv()
 
 # Initialize extensions
 jwt = JWTManager()
+sock = Sock()
 
 # Import Supabase client
 from app.utils.supabase import get_supabase_client
@@ -18,9 +20,18 @@ supabase = get_supabase_client()
 def create_app(config=None):
     app = Flask(__name__)
 
+    # Stream multipart uploads straight to disk instead of buffering them
+    from app.utils.upload_stream import StreamingUploadRequest, get_max_content_length
+    app.request_class = StreamingUploadRequest
+
     # Configure the app
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-for-testing')
 
+    # Configure uploads - bodies larger than this are rejected before being read
+    app.config['MAX_CONTENT_LENGTH'] = get_max_content_length()
+    app.config['UPLOAD_FOLDER'] = os.path.join(app.root_path, 'static', 'uploads')
+    app.config['IMAGE_CACHE_FOLDER'] = os.environ.get('IMAGE_CACHE_FOLDER', os.path.join(app.instance_path, 'image_cache'))
+
     # Configure JWT
     app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'jwt-secret-key-for-testing')
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = 3600  # 1 hour
@@ -28,6 +39,11 @@ def create_app(config=None):
     # Initialize JWT extension with app
     jwt.init_app(app)
 
+    # WebSocket support for the chat gateway; pings keep idle sockets open
+    # through proxies
+    app.config['SOCK_SERVER_OPTIONS'] = {'ping_interval': int(os.environ.get('CHAT_SOCKET_PING_SECONDS', 25))}
+    sock.init_app(app)
+
     # Configure CORS properly - SINGLE configuration to avoid conflicts
     cors_origins = ["http://localhost:3000", "https://pantherfinder.vercel.app"]
     CORS(app,
@@ -57,6 +73,11 @@ def create_app(config=None):
     from app.routes.claims import claims_bp
     from app.routes.notifications import notifications_bp
     from app.routes.messages import messages_bp
+    from app.routes.images import images_bp
+    from app.routes.uploads import uploads_bp
+    from app.routes.stream import stream_bp
+    from app.routes.chat import chat_bp
+    from app.routes.me import me_bp
 
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(items_bp, url_prefix='/api/items')
@@ -65,12 +86,31 @@ def create_app(config=None):
     app.register_blueprint(claims_bp, url_prefix='/api/claims')
     app.register_blueprint(notifications_bp, url_prefix='/api/notifications')
     app.register_blueprint(messages_bp, url_prefix='/api/messages')
+    app.register_blueprint(images_bp, url_prefix='/api/images')
+    app.register_blueprint(stream_bp, url_prefix='/api/stream')
+    app.register_blueprint(chat_bp, url_prefix='/api/chat')
+    app.register_blueprint(me_bp, url_prefix='/api/me')
+
+    # Relay stream and chat events between workers when a broker is configured
+    from app.utils.event_bus import start_relay
+    start_relay()
+
+    # Takes precedence over the default static handler for /static/uploads
+    app.register_blueprint(uploads_bp)
 
     # Register error handlers
     @app.errorhandler(404)
     def not_found(error):
         return jsonify({'error': 'Not found'}), 404
 
+    @app.errorhandler(413)
+    def request_entity_too_large(error):
+        return jsonify({'error': 'Upload too large'}), 413
+
+    @app.errorhandler(415)
+    def unsupported_media_type(error):
+        return jsonify({'error': 'Unsupported file type'}), 415
+
     @app.errorhandler(500)
     def server_error(error):
         return jsonify({'error': 'Server error'}), 500
@@ -112,6 +152,24 @@ def create_app(config=None):
         # Return a simple response
         return {'status': 'ok', 'message': 'CORS is working', 'timestamp': str(datetime.now())}, 200
 
+    # Periodically remove uploads that no item references
+    upload_gc_interval = int(os.environ.get('UPLOAD_GC_INTERVAL_SECONDS', 0))
+    if upload_gc_interval > 0:
+        from app.utils.upload_gc import start_upload_sweeper
+        start_upload_sweeper(app, upload_gc_interval)
+
+    # Periodically send hourly and daily notification digests
+    digest_interval = int(os.environ.get('NOTIFICATION_DIGEST_INTERVAL_SECONDS', 0))
+    if digest_interval > 0:
+        from app.utils.notification_digest import start_digest_scheduler
+        start_digest_scheduler(app, digest_interval)
+
+    # Periodically move old read notifications into the archive
+    archive_interval = int(os.environ.get('NOTIFICATION_ARCHIVE_INTERVAL_SECONDS', 0))
+    if archive_interval > 0:
+        from app.utils.notification_retention import start_notification_archiver
+        start_notification_archiver(app, archive_interval)
+
     # Add a root endpoint
     @app.route('/', methods=['GET'])
     def root():
@@ -0,0 +1,198 @@
+from flask import Blueprint, request, current_app
+import os
+import json
+import time
+import threading
+from simple_websocket import ConnectionClosed
+from app import sock
+from app.utils.event_bus import event_bus, publish
+from app.routes.stream import authenticate, unread_counts, parse_event_id
+from app.routes.messages import (
+    send_user_message, mark_conversation_read, parse_client_read_at, conversation_exists, MessageError
+)
+
+chat_bp = Blueprint('chat', __name__)
+
+# Sockets are closed after this long; clients reconnect with last_event_id,
+# which also re-checks the token
+DEFAULT_MAX_SOCKET_SECONDS = 3600
+
+# How often the event forwarder wakes up to notice a closed socket
+FORWARD_POLL_SECONDS = 15
+
+# Longest chat message accepted over the socket
+MAX_MESSAGE_LENGTH = 5000
+
+
+class ChatConnection:
+    """
+    One authenticated chat socket.
+
+    The request thread reads client frames; a second thread forwards the
+    user's bus events (messages, read receipts, typing, notifications) to the
+    socket as they are published, so delivery never waits for the client to
+    send something. Sends from both threads go through one lock.
+    """
+
+    def __init__(self, ws, user, last_event_id, logger):
+        self.ws = ws
+        self.user = user
+        self.user_id = str(user.get('id'))
+        self.last_event_id = last_event_id
+        self.logger = logger
+        self.closed = threading.Event()
+        self._send_lock = threading.Lock()
+        # (receiver_id, item_id) pairs already checked for typing frames
+        self._typing_allowed = set()
+
+    def send(self, frame):
+        with self._send_lock:
+            self.ws.send(json.dumps(frame, default=str))
+
+    def forward_events(self):
+        try:
+            while not self.closed.is_set():
+                events = event_bus.wait(self.user_id, self.last_event_id, timeout=FORWARD_POLL_SECONDS)
+                for item in events:
+                    self.last_event_id = item.id
+                    self.send({'type': 'event', 'id': item.id, 'event': item.event, 'data': item.data})
+
+                # Anything that arrived may have moved the badges
+                if events:
+                    try:
+                        self.send({'type': 'unread-count', 'data': unread_counts(self.user_id)})
+                    except ConnectionClosed:
+                        raise
+                    except Exception as e:
+                        self.logger.error(f"Error refreshing unread counts for chat socket: {str(e)}")
+        except ConnectionClosed:
+            pass
+        finally:
+            self.closed.set()
+
+    def handle(self, frame):
+        """Act on one client frame and return the reply, if any"""
+        kind = frame.get('type')
+
+        if kind == 'message':
+            if not frame.get('receiver_id'):
+                raise MessageError('Receiver ID is required')
+            content = frame.get('content')
+            if not isinstance(content, str) or not content.strip():
+                raise MessageError('Message content is required')
+            if len(content) > MAX_MESSAGE_LENGTH:
+                raise MessageError(f"Message content is limited to {MAX_MESSAGE_LENGTH} characters")
+
+            message = send_user_message(self.user, frame['receiver_id'], content, frame.get('item_id'))
+            return {'type': 'ack', 'ref': frame.get('ref'), 'message': message}
+
+        if kind == 'typing':
+            if not frame.get('receiver_id'):
+                raise MessageError('Receiver ID is required')
+
+            # Only relayed within an existing conversation; anything else is
+            # dropped so a client can't push frames to arbitrary users
+            key = (str(frame['receiver_id']), frame.get('item_id') or None)
+            if key not in self._typing_allowed:
+                if key[0] == self.user_id or not conversation_exists(self.user_id, *key):
+                    return None
+                self._typing_allowed.add(key)
+
+            publish([frame['receiver_id']], 'typing', {
+                'sender_id': self.user_id,
+                'item_id': frame.get('item_id'),
+                'typing': frame.get('typing', True) is not False
+            })
+            return None
+
+        if kind == 'read':
+            if not frame.get('other_user_id'):
+                raise MessageError('Other user ID is required')
+            read_at = frame.get('read_at')
+            if read_at is not None:
+                read_at = parse_client_read_at(read_at)
+            unread = mark_conversation_read(self.user_id, frame['other_user_id'], frame.get('item_id'), read_at)
+            return {'type': 'ack', 'ref': frame.get('ref'), 'unread_count': unread}
+
+        if kind == 'ping':
+            return {'type': 'pong', 'ref': frame.get('ref')}
+
+        raise MessageError(f"Unknown frame type: {kind}")
+
+
+@sock.route('/ws', bp=chat_bp)
+def chat_socket(ws):
+    """
+    Chat over one WebSocket
+
+    Client frames are JSON objects with a type:
+      message  {receiver_id, content, item_id?, ref?} - stored and pushed to
+               the receiver, acked with the stored message
+      typing   {receiver_id, item_id?, typing?} - relayed to the receiver if
+               the two already have a conversation, otherwise dropped
+      read     {other_user_id, item_id?, read_at?, ref?} - advances the read
+               watermark (read_at is capped at now) and sends a receipt to
+               the other side
+      ping     {ref?}
+    The server sends {type: 'event', id, event, data} for everything published
+    to the user, plus acks, unread counts and {type: 'error'} frames. Browsers
+    can't set headers on a WebSocket, so the token may be passed as the
+    access_token query parameter.
+    """
+    user = authenticate()
+    if not user:
+        ws.close(reason=1008, message='Invalid or expired token')
+        return
+
+    # Resume after the last event the client saw, or start from now
+    user_id = str(user.get('id'))
+    last_id = parse_event_id(request.args.get('last_event_id'))
+    if last_id is None:
+        last_id = event_bus.last_event_id(user_id)
+
+    connection = ChatConnection(ws, user, last_id, current_app.logger)
+    max_seconds = int(os.environ.get('CHAT_SOCKET_MAX_SECONDS', DEFAULT_MAX_SOCKET_SECONDS))
+    deadline = time.monotonic() + max_seconds
+
+    try:
+        unread = unread_counts(user_id)
+    except Exception as e:
+        current_app.logger.error(f"Error loading unread counts for chat socket: {str(e)}")
+        unread = None
+
+    try:
+        connection.send({'type': 'ready', 'last_event_id': last_id, 'unread_count': unread})
+    except ConnectionClosed:
+        return
+
+    forwarder = threading.Thread(target=connection.forward_events, name='chat-forwarder', daemon=True)
+    forwarder.start()
+
+    try:
+        while not connection.closed.is_set() and time.monotonic() < deadline:
+            raw = ws.receive(timeout=min(FORWARD_POLL_SECONDS, max(deadline - time.monotonic(), 0)))
+            if raw is None:
+                continue
+
+            try:
+                frame = json.loads(raw)
+            except ValueError:
+                frame = None
+            if not isinstance(frame, dict):
+                connection.send({'type': 'error', 'error': 'Frames must be JSON objects', 'status': 400})
+                continue
+
+            try:
+                reply = connection.handle(frame)
+            except MessageError as e:
+                reply = {'type': 'error', 'ref': frame.get('ref'), 'error': str(e), 'status': e.status}
+            except Exception as e:
+                current_app.logger.error(f"Error handling chat frame: {str(e)}")
+                reply = {'type': 'error', 'ref': frame.get('ref'), 'error': f"Failed to handle {frame.get('type')}: {str(e)}", 'status': 500}
+
+            if reply:
+                connection.send(reply)
+    except ConnectionClosed:
+        pass
+    finally:
+        connection.closed.set()
@@ -1,8 +1,12 @@
 from flask import Blueprint, request, jsonify, current_app, g
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from datetime import datetime
+from datetime import datetime, timedelta
+import base64
+import json
 from app.utils.supabase import get_supabase_client
 from app.utils.supabase_auth import supabase_auth_required, supabase_auth_optional, get_current_user
+from app.utils.notification_service import notify_claim_submitted, publish_notifications, invalidate_pending_claim_counts
+from app.utils.claim_scoring import score_claim, score_claims
 
 claims_bp = Blueprint('claims', __name__)
 supabase = get_supabase_client()
@@ -38,13 +42,17 @@ def get_claims():
         # Admins can see all claims with filtering
         status = request.args.get('status')
 
-        # Start with base query
-        query = supabase.table('claims').select('*')
+        # Start with base query, counting with the same filters
+        query = supabase.table('claims').select('*', count='exact')
 
         # Apply filters if provided
         if status:
             query = query.eq('verification_status', status)
 
+        # Most likely legitimate claims first when requested
+        if request.args.get('sort') == 'score':
+            query = query.order('evidence_score', desc=True).order('created_at')
+
         # Apply pagination
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
@@ -59,9 +67,8 @@ def get_claims():
         # Execute query
         result = query.execute()
 
-        # Get total count
-        count_result = supabase.table('claims').select('id', count='exact').execute()
-        total_count = count_result.count if hasattr(count_result, 'count') else len(result.data)
+        # Total count of the filtered claims, returned with the page
+        total_count = result.count if result.count is not None else len(result.data)
 
         # Calculate total pages
         total_pages = (total_count + per_page - 1) // per_page if total_count > 0 else 1
@@ -78,6 +85,170 @@ def get_claims():
         current_app.logger.error(f"Error fetching claims: {str(e)}")
         return jsonify({'error': f"Failed to fetch claims: {str(e)}"}), 500
 
+# Range of the manual triage priority admins can set on a claim
+MIN_CLAIM_PRIORITY = -100
+MAX_CLAIM_PRIORITY = 100
+
+def parse_claim_priority(value):
+    """Return value as a claim priority, or raise ValueError with the message to report"""
+    try:
+        priority = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('Priority must be an integer')
+    if not MIN_CLAIM_PRIORITY <= priority <= MAX_CLAIM_PRIORITY:
+        raise ValueError(f"Priority must be between {MIN_CLAIM_PRIORITY} and {MAX_CLAIM_PRIORITY}")
+    return priority
+
+# Sort orders for the review queue: (column, descending) pairs, always ending
+# in id so the keyset cursor is unique
+REVIEW_QUEUE_SORTS = {
+    'age': [('created_at', False), ('id', False)],
+    'newest': [('created_at', True), ('id', True)],
+    'priority': [('priority', True), ('created_at', False), ('id', False)],
+    'score': [('evidence_score', True), ('created_at', False), ('id', False)],
+}
+
+def encode_cursor(row, sort_columns):
+    values = [row.get(column) for column, _ in sort_columns]
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor, sort_columns):
+    values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    if not isinstance(values, list) or len(values) != len(sort_columns):
+        raise ValueError('Cursor does not match the sort order')
+    return values
+
+def keyset_filter(sort_columns, values):
+    """
+    Build a PostgREST or= filter selecting rows after the cursor position
+
+    For columns (a, b, c) this is a > A or (a = A and b > B) or
+    (a = A and b = B and c > C), with > flipped for descending columns.
+    """
+    clauses = []
+    for i, (column, descending) in enumerate(sort_columns):
+        op = 'lt' if descending else 'gt'
+        terms = [f'{prev}.eq."{value}"' for (prev, _), value in zip(sort_columns[:i], values[:i])]
+        terms.append(f'{column}.{op}."{values[i]}"')
+        clauses.append(terms[0] if len(terms) == 1 else f"and({','.join(terms)})")
+    return ','.join(clauses)
+
+@claims_bp.route('/review-queue', methods=['GET'])
+@supabase_auth_required
+def get_review_queue():
+    try:
+        user = g.user
+        if user.get('role') != 'admin':
+            return jsonify({'error': 'Unauthorized access'}), 403
+
+        status = request.args.get('status', 'pending')
+        category = request.args.get('category')
+        min_age_days = request.args.get('min_age_days', type=int)
+        max_age_days = request.args.get('max_age_days', type=int)
+        sort = request.args.get('sort', 'age')
+        cursor = request.args.get('cursor')
+        limit = min(max(request.args.get('limit', 25, type=int), 1), 100)
+
+        sort_columns = REVIEW_QUEUE_SORTS.get(sort)
+        if not sort_columns:
+            return jsonify({'error': f"Unsupported sort '{sort}'"}), 400
+
+        # Embed the item and the claimant so the UI doesn't fetch them per claim.
+        # Filtering by category needs an inner join on the item.
+        item_embed = 'item:items!inner(*)' if category else 'item:items(*)'
+        select = f"*, {item_embed}, claimant:users(id, name, email)"
+
+        # Only the first page pays for the exact count
+        query = supabase.table('claims').select(select, count='exact' if not cursor else None)
+
+        if status and status != 'all':
+            query = query.eq('verification_status', status)
+        if category:
+            query = query.eq('item.category', category)
+
+        now = datetime.utcnow()
+        if min_age_days is not None:
+            query = query.lte('created_at', (now - timedelta(days=min_age_days)).isoformat())
+        if max_age_days is not None:
+            query = query.gte('created_at', (now - timedelta(days=max_age_days)).isoformat())
+
+        if cursor:
+            try:
+                values = decode_cursor(cursor, sort_columns)
+            except Exception:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            query = query.or_(keyset_filter(sort_columns, values))
+
+        for column, descending in sort_columns:
+            query = query.order(column, desc=descending)
+
+        # Fetch one extra row to know whether there is a next page
+        result = query.limit(limit + 1).execute()
+        claims = result.data or []
+
+        has_more = len(claims) > limit
+        claims = claims[:limit]
+        next_cursor = encode_cursor(claims[-1], sort_columns) if has_more else None
+
+        response = {
+            'claims': claims,
+            'next_cursor': next_cursor,
+            'has_more': has_more
+        }
+        if not cursor:
+            response['total'] = result.count if result.count is not None else len(claims)
+
+        return jsonify(response), 200
+    except Exception as e:
+        current_app.logger.error(f"Error fetching review queue: {str(e)}")
+        return jsonify({'error': f"Failed to fetch review queue: {str(e)}"}), 500
+
+@claims_bp.route('/rescore', methods=['POST'])
+@supabase_auth_required
+def rescore_claims():
+    try:
+        user = g.user
+        if user.get('role') != 'admin':
+            return jsonify({'error': 'Unauthorized access'}), 403
+
+        data = request.get_json(silent=True) or {}
+        status = data.get('status', 'pending')
+        batch_size = min(max(int(data.get('batch_size', 200)), 1), 1000)
+
+        # Walk the claims by id, scoring and writing one batch at a time
+        rescored = 0
+        last_id = None
+        while True:
+            query = supabase.table('claims').select('id, proof_description, item:items(*)')
+            if status and status != 'all':
+                query = query.eq('verification_status', status)
+            if last_id is not None:
+                query = query.gt('id', last_id)
+            result = query.order('id').limit(batch_size).execute()
+
+            rows = result.data or []
+            scorable = [row for row in rows if row.get('item')]
+            if scorable:
+                scores = score_claims([(row.get('proof_description'), row['item']) for row in scorable])
+                supabase.rpc('set_claim_scores', {
+                    'scores': [{'id': row['id'], 'score': score} for row, score in zip(scorable, scores)]
+                }).execute()
+                rescored += len(scorable)
+
+            if len(rows) < batch_size:
+                break
+            last_id = rows[-1]['id']
+
+        current_app.logger.info(f"Rescored {rescored} claims with status {status}")
+
+        return jsonify({
+            'message': 'Claims rescored successfully',
+            'rescored': rescored
+        }), 200
+    except Exception as e:
+        current_app.logger.error(f"Error rescoring claims: {str(e)}")
+        return jsonify({'error': f"Failed to rescore claims: {str(e)}"}), 500
+
 @claims_bp.route('/<claim_id>', methods=['GET'])
 @supabase_auth_required
 def get_claim(claim_id):
@@ -135,11 +306,13 @@ def create_claim():
         if existing_claim_result.data and len(existing_claim_result.data) > 0:
             return jsonify({'error': 'You already have a claim for this item'}), 400
 
-        # Create new claim
+        # Create new claim, scored against the item for the review queue
         claim_data = {
             'item_id': data['item_id'],
             'user_id': user_id,
             'proof_description': data.get('proof_description', ''),
+            'evidence_score': score_claim(data.get('proof_description', ''), item),
+            'evidence_scored_at': datetime.utcnow().isoformat(),
             'verification_status': 'pending',
             'claim_date': datetime.utcnow().isoformat(),
             'created_at': datetime.utcnow().isoformat(),
@@ -153,36 +326,13 @@ def create_claim():
             return jsonify({'error': 'Failed to create claim'}), 500
 
         claim = claim_result.data[0]
+        invalidate_pending_claim_counts()
 
-        # Create notification for admin
-        # Find admin users
-        admin_result = supabase.table('users').select('id').eq('role', 'admin').execute()
-
-        if admin_result.data and len(admin_result.data) > 0:
-            for admin in admin_result.data:
-                notification_data = {
-                    'user_id': admin.get('id'),
-                    'item_id': item.get('id'),
-                    'message': f"New claim submitted for item '{item.get('name')}'",
-                    'notification_type': 'claim_update',
-                    'created_at': datetime.utcnow().isoformat(),
-                    'read': False
-                }
-
-                supabase.table('notifications').insert(notification_data).execute()
-
-        # Create notification for the finder
-        if item.get('user_found_id'):
-            notification_data = {
-                'user_id': item.get('user_found_id'),
-                'item_id': item.get('id'),
-                'message': f"Someone has claimed the item '{item.get('name')}' that you found",
-                'notification_type': 'claim_update',
-                'created_at': datetime.utcnow().isoformat(),
-                'read': False
-            }
-
-            supabase.table('notifications').insert(notification_data).execute()
+        # Notify admins and the finder in a single multi-row insert
+        try:
+            notify_claim_submitted(item)
+        except Exception as e:
+            current_app.logger.error(f"Error notifying about claim {claim.get('id')}: {str(e)}")
 
         return jsonify({
             'message': 'Claim submitted successfully',
@@ -200,6 +350,50 @@ def update_claim(claim_id):
         user = g.user
         user_id = user.get('id')
 
+        data = request.get_json()
+
+        # Admins verify or reject through the review_claim function, which
+        # updates the claim and the item and notifies the claimant in one
+        # transaction (see sql/create_review_claim_function.sql)
+        if user.get('role') == 'admin' and data.get('verification_status') in ('verified', 'rejected'):
+            priority = None
+            if data.get('priority') is not None:
+                try:
+                    priority = parse_claim_priority(data['priority'])
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
+
+            try:
+                review_result = supabase.rpc('review_claim', {
+                    'p_claim_id': claim_id,
+                    'p_status': data['verification_status'],
+                    'p_admin_notes': data.get('admin_notes'),
+                    'p_priority': priority
+                }).execute()
+            except Exception as e:
+                if 'CLAIM_NOT_FOUND' in str(e):
+                    return jsonify({'error': 'Claim not found'}), 404
+                if 'ITEM_ALREADY_CLAIMED' in str(e):
+                    return jsonify({'error': 'This item has already been claimed'}), 409
+                raise
+
+            review = review_result.data or {}
+            invalidate_pending_claim_counts()
+
+            # The function wrote the claimant's notification itself
+            claim = review.get('claim') or {}
+            publish_notifications([{
+                'user_id': claim.get('user_id'),
+                'item_id': claim.get('item_id'),
+                'notification_type': 'claim_update'
+            }])
+
+            return jsonify({
+                'message': 'Claim updated successfully',
+                'claim': review.get('claim'),
+                'item': review.get('item')
+            }), 200
+
         # Get claim from Supabase
         claim_result = supabase.table('claims').select('*').eq('id', claim_id).execute()
 
@@ -208,8 +402,6 @@ def update_claim(claim_id):
 
         claim = claim_result.data[0]
 
-        data = request.get_json()
-
         # Regular users can only update their own claims' proof description
         if claim.get('user_id') == user_id and user.get('role') != 'admin':
             if 'proof_description' in data:
@@ -218,6 +410,12 @@ def update_claim(claim_id):
                     'updated_at': datetime.utcnow().isoformat()
                 }
 
+                # Re-score the new proof against the item
+                item_result = supabase.table('items').select('*').eq('id', claim.get('item_id')).execute()
+                if item_result.data:
+                    update_data['evidence_score'] = score_claim(data['proof_description'], item_result.data[0])
+                    update_data['evidence_scored_at'] = datetime.utcnow().isoformat()
+
                 update_result = supabase.table('claims').update(update_data).eq('id', claim_id).execute()
 
                 if not update_result.data or len(update_result.data) == 0:
@@ -236,64 +434,28 @@ def update_claim(claim_id):
                 'updated_at': datetime.utcnow().isoformat()
             }
 
+            # Verification and rejection are handled by review_claim above
             if 'verification_status' in data:
-                old_status = claim.get('verification_status')
-                new_status = data['verification_status']
-                update_data['verification_status'] = new_status
-
-                # If claim is verified, update the item status
-                if new_status == 'verified' and old_status != 'verified':
-                    item_result = supabase.table('items').select('*').eq('id', claim.get('item_id')).execute()
-
-                    if item_result.data and len(item_result.data) > 0:
-                        item = item_result.data[0]
-
-                        item_update = {
-                            'status': 'claimed',
-                            'user_claimed_id': claim.get('user_id'),
-                            'updated_at': datetime.utcnow().isoformat()
-                        }
-
-                        supabase.table('items').update(item_update).eq('id', claim.get('item_id')).execute()
-
-                        # Create notification for the claimer
-                        notification_data = {
-                            'user_id': claim.get('user_id'),
-                            'item_id': item.get('id'),
-                            'message': f"Your claim for '{item.get('name')}' has been verified. You can now pick it up.",
-                            'notification_type': 'claim_update',
-                            'created_at': datetime.utcnow().isoformat(),
-                            'read': False
-                        }
-
-                        supabase.table('notifications').insert(notification_data).execute()
-
-                # If claim is rejected, notify the user
-                if new_status == 'rejected' and old_status != 'rejected':
-                    item_result = supabase.table('items').select('*').eq('id', claim.get('item_id')).execute()
-
-                    if item_result.data and len(item_result.data) > 0:
-                        item = item_result.data[0]
-
-                        notification_data = {
-                            'user_id': claim.get('user_id'),
-                            'item_id': item.get('id'),
-                            'message': f"Your claim for '{item.get('name')}' has been rejected.",
-                            'notification_type': 'claim_update',
-                            'created_at': datetime.utcnow().isoformat(),
-                            'read': False
-                        }
-
-                        supabase.table('notifications').insert(notification_data).execute()
+                update_data['verification_status'] = data['verification_status']
 
             if 'admin_notes' in data:
                 update_data['admin_notes'] = data['admin_notes']
 
+            # Manual triage priority for the review queue, higher first
+            if 'priority' in data:
+                try:
+                    update_data['priority'] = parse_claim_priority(data['priority'])
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
+
             update_result = supabase.table('claims').update(update_data).eq('id', claim_id).execute()
 
             if not update_result.data or len(update_result.data) == 0:
                 return jsonify({'error': 'Failed to update claim'}), 500
 
+            if 'verification_status' in data:
+                invalidate_pending_claim_counts()
+
             return jsonify({
                 'message': 'Claim updated successfully',
                 'claim': update_result.data[0]
@@ -327,6 +489,9 @@ def delete_claim(claim_id):
             if not delete_result.data or len(delete_result.data) == 0:
                 return jsonify({'error': 'Failed to delete claim'}), 500
 
+            if claim.get('verification_status') == 'pending':
+                invalidate_pending_claim_counts()
+
             return jsonify({'message': 'Claim deleted successfully'}), 200
 
         return jsonify({'error': 'Unauthorized to delete this claim'}), 403
@@ -0,0 +1,95 @@
+from flask import Blueprint, request, jsonify, current_app, send_file, make_response
+from werkzeug.utils import secure_filename
+import io
+from app.utils.image_handler import render_variant, VARIANT_FORMATS
+from app.utils.image_cache import get_image_cache
+from app.utils.storage import get_storage
+
+images_bp = Blueprint('images', __name__)
+
+# Widths we render; requested widths are rounded up to the next one so the
+# cache can't be flooded with one variant per pixel
+ALLOWED_WIDTHS = [64, 128, 160, 240, 320, 480, 640, 800, 1024, 1280]
+
+# Variants are content-addressed by the original's key, size and mtime, so
+# they can be cached forever
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Map source extensions to the default output format
+SOURCE_FORMATS = {
+    'jpg': 'jpeg',
+    'jpeg': 'jpeg',
+    'png': 'png',
+    'gif': 'png',
+    'webp': 'webp',
+}
+
+def pick_width(requested):
+    """Round a requested width up to the nearest allowed width"""
+    for width in ALLOWED_WIDTHS:
+        if requested <= width:
+            return width
+    return ALLOWED_WIDTHS[-1]
+
+@images_bp.route('/<path:key>', methods=['GET'])
+def get_image(key):
+    try:
+        # Keys are storage keys such as "3f2a...c1.jpg" or "direct/9b1e...0a.png"
+        parts = key.split('/')
+        if any(not part or secure_filename(part) != part for part in parts):
+            return jsonify({'error': 'Invalid image key'}), 400
+        filename = parts[-1]
+
+        storage = get_storage()
+        source_stat = storage.stat(key)
+        if source_stat is None:
+            return jsonify({'error': 'Image not found'}), 404
+        source_size, source_mtime = source_stat
+
+        # Parse the requested size and format
+        width = request.args.get('w', ALLOWED_WIDTHS[-1], type=int)
+        if width is None or width <= 0:
+            return jsonify({'error': 'Width must be a positive integer'}), 400
+        width = pick_width(width)
+
+        source_ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+        fmt = request.args.get('fmt', SOURCE_FORMATS.get(source_ext, 'jpeg')).lower()
+        if fmt == 'jpg':
+            fmt = 'jpeg'
+        if fmt not in VARIANT_FORMATS:
+            return jsonify({'error': f"Unsupported format '{fmt}'"}), 400
+
+        cache = get_image_cache()
+        etag = cache.make_key(key, source_size, source_mtime, width, fmt)
+
+        # Answer revalidation requests without touching the image at all
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+            return response
+
+        variant_path = cache.get(etag, fmt)
+        if not variant_path:
+            current_app.logger.info(f"Rendering {key} at w={width} as {fmt}")
+            source = storage.open(key)
+            try:
+                # Pillow needs to seek; remote object bodies are plain streams
+                if not (hasattr(source, 'seekable') and source.seekable()):
+                    body = source
+                    source = io.BytesIO(body.read())
+                    body.close()
+                variant_path = cache.put(
+                    etag, fmt,
+                    lambda tmp_path: render_variant(source, tmp_path, width, fmt)
+                )
+            finally:
+                source.close()
+
+        response = send_file(variant_path, mimetype=VARIANT_FORMATS[fmt][1], etag=False, conditional=False)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        return response
+    except Exception as e:
+        current_app.logger.error(f"Error serving image {key}: {str(e)}")
+        return jsonify({'error': f"Failed to serve image: {str(e)}"}), 500
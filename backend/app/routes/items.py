@@ -3,9 +3,14 @@ from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from datetime import datetime
 import os
 import uuid
+import tempfile
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import HTTPException, BadRequest, UnsupportedMediaType
 from app.utils.supabase import get_supabase_client
 from app.utils.supabase_auth import supabase_auth_required, supabase_auth_optional, get_current_user
+from app.utils.upload_stream import UploadSpool, commit_upload, get_max_image_bytes, sniff_image_type, SNIFF_BYTES
+from app.utils.storage import get_storage, new_upload_key, direct_upload_prefix
+from app.utils.notification_service import publish_notifications
 
 items_bp = Blueprint('items', __name__)
 supabase = get_supabase_client()
@@ -20,18 +25,48 @@ def save_image(file):
     if not file:
         return None
 
+    # Files streamed through StreamingUploadRequest are already on disk and
+    # have been size checked and sniffed
+    if isinstance(file.stream, UploadSpool):
+        return commit_upload(file)
+
     filename = secure_filename(file.filename)
     unique_filename = f"{uuid.uuid4()}_{filename}"
-    upload_folder = os.path.join(current_app.root_path, 'static', 'uploads')
-
-    # Create directory if it doesn't exist
-    os.makedirs(upload_folder, exist_ok=True)
 
-    file_path = os.path.join(upload_folder, unique_filename)
+    # Write to a scratch file and let the storage backend take it from there
+    fd, file_path = tempfile.mkstemp()
+    os.close(fd)
     file.save(file_path)
 
-    # Return relative path for database storage
-    return f"/static/uploads/{unique_filename}"
+    # Return the URL for database storage
+    return get_storage().save_file(file_path, unique_filename, content_type=file.mimetype)
+
+# Helper function to resolve an image the client uploaded directly to storage
+def resolve_uploaded_image(image_key, user_id):
+    if not image_key:
+        return None
+
+    # Only keys we handed out to this user through /upload-url are accepted
+    if not image_key.startswith(direct_upload_prefix(user_id)) or '..' in image_key:
+        raise BadRequest('Invalid image key')
+
+    storage = get_storage()
+    if storage.stat(image_key) is None:
+        raise BadRequest('No image has been uploaded for this image key')
+
+    # The presigned policy only pins the declared content type, so check the
+    # bytes the same way streamed uploads are checked
+    body = storage.open(image_key)
+    try:
+        header = body.read(SNIFF_BYTES)
+    finally:
+        body.close()
+    ext = sniff_image_type(header)
+    if ext is None or not image_key.endswith(f".{ext}"):
+        storage.delete(image_key)
+        raise UnsupportedMediaType('Uploaded file is not a supported image type')
+
+    return storage.url_for(image_key)
 
 @items_bp.route('', methods=['GET'])
 @supabase_auth_optional
@@ -156,8 +191,8 @@ def create_item():
         if 'name' not in data:
             return jsonify({'error': 'Item name is required'}), 400
 
-        # Save image if provided
-        image_path = save_image(image) if image else None
+        # Save image if provided, either in the request or uploaded directly to storage
+        image_path = save_image(image) if image else resolve_uploaded_image(data.get('image_key'), user_id)
         current_app.logger.info(f"Image path: {image_path}")
 
         # Prepare item data for Supabase
@@ -203,6 +238,7 @@ def create_item():
 
             current_app.logger.info(f"Creating notification: {notification_data}")
             notification_result = supabase.table('notifications').insert(notification_data).execute()
+            publish_notifications(notification_result.data or [notification_data])
 
             if hasattr(notification_result, 'error') and notification_result.error:
                 current_app.logger.error(f"Notification creation error: {notification_result.error}")
@@ -212,10 +248,44 @@ def create_item():
             'item': created_item
         }), 201
 
+    except HTTPException as e:
+        current_app.logger.error(f"Rejected item upload: {e.description}")
+        return jsonify({'error': e.description}), e.code
     except Exception as e:
         current_app.logger.error(f"Error creating item: {str(e)}")
         return jsonify({'error': f"Failed to create item: {str(e)}"}), 500
 
+@items_bp.route('/upload-url', methods=['POST'])
+@supabase_auth_required
+def create_upload_url():
+    try:
+        storage = get_storage()
+        if not storage.supports_direct_upload:
+            return jsonify({'error': 'Direct uploads are not available with the current storage backend'}), 400
+
+        data = request.get_json() or {}
+        content_type = data.get('content_type', '')
+
+        # Same types the streaming upload path accepts
+        allowed_types = {'image/jpeg': 'jpg', 'image/png': 'png', 'image/gif': 'gif'}
+        if content_type not in allowed_types:
+            return jsonify({'error': 'Unsupported file type'}), 400
+
+        key = new_upload_key(allowed_types[content_type], g.user.get('id'))
+        upload = storage.presign_upload(key, content_type, get_max_image_bytes())
+
+        current_app.logger.info(f"Issued direct upload URL for {key} to user {g.user.get('id')}")
+
+        # The client uploads to upload['url'] and then submits the item with image_key
+        return jsonify({
+            'image_key': key,
+            'image_url': storage.url_for(key),
+            'upload': upload
+        }), 200
+    except Exception as e:
+        current_app.logger.error(f"Error creating upload URL: {str(e)}")
+        return jsonify({'error': f"Failed to create upload URL: {str(e)}"}), 500
+
 @items_bp.route('/<item_id>', methods=['PUT'])
 @supabase_auth_required
 def update_item(item_id):
@@ -354,8 +424,8 @@ def create_lost_item():
         if 'name' not in data:
             return jsonify({'error': 'Item name is required'}), 400
 
-        # Save image if provided
-        image_path = save_image(image) if image else None
+        # Save image if provided, either in the request or uploaded directly to storage
+        image_path = save_image(image) if image else resolve_uploaded_image(data.get('image_key'), user_id)
         current_app.logger.info(f"Image path: {image_path}")
 
         # Prepare item data for Supabase
@@ -406,6 +476,7 @@ def create_lost_item():
 
                 current_app.logger.info(f"Creating notification: {notification_data}")
                 notification_result = supabase.table('notifications').insert(notification_data).execute()
+                publish_notifications(notification_result.data or [notification_data])
 
                 if hasattr(notification_result, 'error') and notification_result.error:
                     current_app.logger.error(f"Notification creation error: {notification_result.error}")
@@ -443,6 +514,7 @@ def create_lost_item():
 
             current_app.logger.info(f"Creating notification: {notification_data}")
             notification_result = supabase.table('notifications').insert(notification_data).execute()
+            publish_notifications(notification_result.data or [notification_data])
 
             if hasattr(notification_result, 'error') and notification_result.error:
                 current_app.logger.error(f"Notification creation error: {notification_result.error}")
@@ -452,6 +524,9 @@ def create_lost_item():
             'item': created_item
         }), 201
 
+    except HTTPException as e:
+        current_app.logger.error(f"Rejected lost item upload: {e.description}")
+        return jsonify({'error': e.description}), e.code
     except Exception as e:
         current_app.logger.error(f"Error creating lost item: {str(e)}")
         return jsonify({'error': f"Failed to report lost item: {str(e)}"}), 500
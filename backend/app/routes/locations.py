@@ -1,13 +1,15 @@
 from flask import Blueprint, request, jsonify, current_app, g
 from flask_jwt_extended import jwt_required, get_jwt
-from app.models.drop_off_location import DropOffLocation
 from app.utils.supabase import get_supabase_client
 from app.utils.supabase_auth import supabase_auth_required, supabase_auth_optional
-from geopy.distance import geodesic
+from app.utils.location_index import get_location_index, invalidate_location_index
 from datetime import datetime
 
 supabase = get_supabase_client()
 
+# Upper bound on how many locations one nearest query returns
+MAX_NEAREST_RESULTS = 20
+
 locations_bp = Blueprint('locations', __name__)
 
 # Helper function to check if user is admin
@@ -95,7 +97,9 @@ def create_location():
         
         if not result.data or len(result.data) == 0:
             return jsonify({'error': 'Failed to create location'}), 500
-    
+
+        invalidate_location_index()
+
         return jsonify({
             'message': 'Location created successfully',
             'location': result.data[0]
@@ -137,7 +141,9 @@ def update_location(location_id):
         
         if not result.data or len(result.data) == 0:
             return jsonify({'error': 'Failed to update location'}), 500
-    
+
+        invalidate_location_index()
+
         return jsonify({
             'message': 'Location updated successfully',
             'location': result.data[0]
@@ -172,7 +178,9 @@ def delete_location(location_id):
         
         if not result.data:
             return jsonify({'error': 'Failed to delete location'}), 500
-            
+
+        invalidate_location_index()
+
         return jsonify({'message': 'Location deleted successfully'}), 200
     except Exception as e:
         current_app.logger.error(f"Error deleting location {location_id}: {str(e)}")
@@ -186,30 +194,39 @@ def get_nearest_location():
         user_lng = float(request.args.get('longitude'))
     except (TypeError, ValueError):
         return jsonify({'error': 'Valid latitude and longitude are required'}), 400
-    
-    # Get all locations with coordinates
-    locations = DropOffLocation.query.filter(
-        DropOffLocation.latitude.isnot(None),
-        DropOffLocation.longitude.isnot(None)
-    ).all()
-    
-    if not locations:
-        return jsonify({'error': 'No locations with coordinates available'}), 404
-    
-    # Calculate distances and find the nearest location
-    user_coords = (user_lat, user_lng)
-    nearest_location = None
-    min_distance = float('inf')
-    
-    for location in locations:
-        location_coords = (location.latitude, location.longitude)
-        distance = geodesic(user_coords, location_coords).kilometers
-        
-        if distance < min_distance:
-            min_distance = distance
-            nearest_location = location
-    
-    return jsonify({
-        'location': nearest_location.to_dict(),
-        'distance_km': min_distance
-    }), 200
\ No newline at end of file
+
+    if not -90 <= user_lat <= 90 or not -180 <= user_lng <= 180:
+        return jsonify({'error': 'Valid latitude and longitude are required'}), 400
+
+    # Optionally several locations, and/or only those within a radius
+    limit = request.args.get('limit', 1, type=int)
+    if limit < 1 or limit > MAX_NEAREST_RESULTS:
+        return jsonify({'error': f"Limit must be between 1 and {MAX_NEAREST_RESULTS}"}), 400
+    radius_km = request.args.get('radius_km', type=float)
+    if radius_km is not None and radius_km <= 0:
+        return jsonify({'error': 'Radius must be positive'}), 400
+
+    try:
+        # Locations with coordinates, indexed in memory (see utils/location_index.py)
+        index = get_location_index()
+        if not len(index):
+            return jsonify({'error': 'No locations with coordinates available'}), 404
+
+        if radius_km is not None:
+            matches = index.within(user_lat, user_lng, radius_km, limit=limit)
+        else:
+            matches = index.nearest(user_lat, user_lng, k=limit)
+
+        if not matches:
+            return jsonify({'error': 'No locations within the given radius'}), 404
+
+        nearest_location, min_distance = matches[0]
+
+        return jsonify({
+            'location': nearest_location,
+            'distance_km': min_distance,
+            'locations': [{'location': location, 'distance_km': distance} for location, distance in matches]
+        }), 200
+    except Exception as e:
+        current_app.logger.error(f"Error finding nearest location: {str(e)}")
+        return jsonify({'error': f"Failed to find nearest location: {str(e)}"}), 500
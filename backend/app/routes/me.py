@@ -0,0 +1,21 @@
+from flask import Blueprint, jsonify, current_app, g
+from app.utils.supabase_auth import supabase_auth_required
+from app.utils.badge_counters import get_badge_counters
+
+me_bp = Blueprint('me', __name__)
+
+@me_bp.route('/counters', methods=['GET'])
+@supabase_auth_required
+def get_counters():
+    """All header badge counts in one request, for polling clients"""
+    try:
+        # Get user from g object (set by supabase_auth_required)
+        user = g.user
+        user_id = user.get('id')
+
+        counters = get_badge_counters(user_id, is_admin=user.get('role') == 'admin')
+
+        return jsonify({'counters': counters}), 200
+    except Exception as e:
+        current_app.logger.error(f"Error getting badge counters: {str(e)}")
+        return jsonify({'error': f"Failed to get badge counters: {str(e)}"}), 500
@@ -1,11 +1,175 @@
 from flask import Blueprint, request, jsonify, current_app, g
-from datetime import datetime
+import os
+import uuid
+from datetime import datetime, timezone
 from app.utils.supabase import get_supabase_client
 from app.utils.supabase_auth import supabase_auth_required
+from app.utils.notification_service import publish_notifications, DEFAULT_COALESCE_WINDOW
+from app.utils.event_bus import publish
+from app.utils.badge_counters import invalidate_badge_counters
+from app.routes.notifications import is_uuid
 
 messages_bp = Blueprint('messages', __name__)
 supabase = get_supabase_client()
 
+def get_unread_message_count(user_id):
+    """Unread messages across a user's conversations, past their read watermarks"""
+    result = supabase.rpc('get_unread_message_count', {'p_user_id': user_id}).execute()
+    return result.data or 0
+
+class MessageError(Exception):
+    """A message that can't be sent, with the HTTP status to report"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def send_user_message(user, receiver_id, content, item_id=None):
+    """
+    Store a message, notify the receiver and push it to both users' open connections
+
+    Shared by the REST endpoint and the chat socket.
+
+    Args:
+        user (dict): The sending user
+        receiver_id (str): ID of the receiving user
+        content (str): Message text
+        item_id (str, optional): Item the conversation is about
+
+    Returns:
+        dict: The stored message
+
+    Raises:
+        MessageError: If the message can't be sent
+    """
+    user_id = user.get('id')
+
+    # Prevent messaging yourself
+    if str(user_id) == str(receiver_id):
+        raise MessageError('You cannot message yourself')
+
+    # The receiver's notification; further messages from this sender about
+    # the same item fold into it until it's read
+    sender_name = user.get('name') or user.get('email') or 'someone'
+    notification_data = {
+        'title': 'New Message',
+        'message': f"You have a new message from {sender_name}",
+        'type': 'message'
+    }
+
+    # Item check, insert, conversation summary and notification in one
+    # transaction and one round trip
+    try:
+        result = supabase.rpc('send_message', {
+            'p_sender_id': str(user_id),
+            'p_receiver_id': str(receiver_id),
+            'p_content': content,
+            'p_item_id': item_id or None,
+            'p_notification': notification_data,
+            'p_coalesce_key': f"message:{user_id}:{item_id or ''}",
+            'p_window_seconds': int(os.environ.get('NOTIFICATION_COALESCE_SECONDS', DEFAULT_COALESCE_WINDOW)),
+            'p_summary': f"You have %s new messages from {sender_name.replace('%', '%%')}"
+        }).execute()
+    except Exception as e:
+        if 'ITEM_NOT_FOUND' in str(e):
+            raise MessageError('Item not found', 404)
+        if 'SELF_MESSAGE' in str(e):
+            raise MessageError('You cannot message yourself')
+        raise
+
+    if not result.data or not result.data.get('message'):
+        raise MessageError('Failed to send message', 500)
+
+    message = result.data['message']
+    if result.data.get('notification'):
+        publish_notifications([result.data['notification']])
+
+    # Push to the receiver's open connections, and the sender's other tabs
+    invalidate_badge_counters([receiver_id])
+    publish([str(receiver_id), user_id], 'message', message)
+
+    return message
+
+def conversation_exists(user_id, other_user_id, item_id=None):
+    """
+    Whether the two users have a conversation (about item_id, if given)
+
+    Returns:
+        bool: True if a conversations row exists for the pair
+    """
+    try:
+        user_a, user_b = sorted((str(uuid.UUID(str(user_id))), str(uuid.UUID(str(other_user_id)))))
+        if item_id:
+            item_id = str(uuid.UUID(str(item_id)))
+    except ValueError:
+        return False
+
+    query = supabase.table('conversations').select('id').eq('user_a', user_a).eq('user_b', user_b)
+    query = query.eq('item_id', item_id) if item_id else query.is_('item_id', 'null')
+    result = query.limit(1).execute()
+    return bool(result.data)
+
+def parse_client_read_at(value):
+    """
+    Validate a client-supplied read watermark
+
+    A watermark in the future would mark messages read before they arrive,
+    so it is clamped to now.
+
+    Returns:
+        str: ISO timestamp, no later than the current time
+    """
+    if not isinstance(value, str):
+        raise MessageError('read_at must be an ISO 8601 timestamp')
+    try:
+        read_at = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise MessageError('read_at must be an ISO 8601 timestamp')
+    if read_at.tzinfo is None:
+        read_at = read_at.replace(tzinfo=timezone.utc)
+    return min(read_at, datetime.now(timezone.utc)).isoformat()
+
+def mark_conversation_read(user_id, other_user_id, item_id=None, read_at=None):
+    """
+    Advance a user's read watermark in a conversation and send read receipts
+
+    Args:
+        user_id (str): The reading user
+        other_user_id (str): The other participant
+        item_id (str, optional): Item the conversation is about
+        read_at (str, optional): Everything received up to this time is read;
+            defaults to now
+
+    Returns:
+        int: Messages in the conversation still unread by the user
+    """
+    read_at = read_at or datetime.utcnow().isoformat()
+    result = supabase.rpc('mark_conversation_read', {
+        'p_user_id': user_id,
+        'p_other_user_id': other_user_id,
+        'p_item_id': item_id,
+        'p_read_at': read_at
+    }).execute()
+
+    # Badge counts for this user, read receipts for the other side
+    invalidate_badge_counters([user_id])
+    publish([user_id], 'message-read', {'conversation_with': other_user_id, 'item_id': item_id})
+    publish([other_user_id], 'conversation-read', {
+        'reader_id': user_id,
+        'item_id': item_id,
+        'read_at': read_at
+    })
+
+    return result.data or 0
+
+# Page sizes for cursor-paged conversation history
+DEFAULT_MESSAGE_PAGE_SIZE = 50
+MAX_MESSAGE_PAGE_SIZE = 200
+
+# Page sizes for message search
+DEFAULT_SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 50
+
 @messages_bp.route('/conversations', methods=['GET'])
 @supabase_auth_required
 def get_conversations():
@@ -42,34 +206,70 @@ def get_conversation_messages(receiver_id):
         # Get item_id from query params if provided
         item_id = request.args.get('item_id')
 
+        # Optional paging: message-id cursors and a page size. Without any of
+        # them the whole thread is returned, as before
+        before = request.args.get('before')
+        after = request.args.get('after')
+        limit = request.args.get('limit', type=int)
+        if before and after:
+            return jsonify({'error': 'Use either before or after, not both'}), 400
+        try:
+            for cursor in (before, after):
+                if cursor:
+                    uuid.UUID(cursor)
+        except ValueError:
+            return jsonify({'error': 'Cursors must be message ids'}), 400
+        if (before or after) and limit is None:
+            limit = DEFAULT_MESSAGE_PAGE_SIZE
+        if limit is not None:
+            limit = max(1, min(limit, MAX_MESSAGE_PAGE_SIZE))
+
         current_app.logger.info(f"Fetching messages between {user_id} and {receiver_id} for item {item_id}")
 
         # Call the get_conversation_messages function
+        params = {
+            'user1_uuid': user_id,
+            'user2_uuid': receiver_id
+        }
         if item_id:
-            result = supabase.rpc('get_conversation_messages', {
-                'user1_uuid': user_id,
-                'user2_uuid': receiver_id,
-                'item_uuid': item_id
-            }).execute()
-        else:
-            result = supabase.rpc('get_conversation_messages', {
-                'user1_uuid': user_id,
-                'user2_uuid': receiver_id
-            }).execute()
-
-        if not result.data:
-            return jsonify({'messages': []}), 200
+            params['item_uuid'] = item_id
+        if before:
+            params['p_before'] = before
+        if after:
+            params['p_after'] = after
+        if limit is not None:
+            # One extra row tells whether another page exists
+            params['p_limit'] = limit + 1
 
-        # Mark messages as read
-        messages_to_mark = []
-        for message in result.data:
-            if message.get('receiver_id') == user_id and not message.get('read'):
-                messages_to_mark.append(message.get('id'))
-
-        if messages_to_mark:
-            supabase.table('messages').update({'read': True}).in_('id', messages_to_mark).execute()
+        try:
+            result = supabase.rpc('get_conversation_messages', params).execute()
+        except Exception as e:
+            if 'CURSOR_NOT_FOUND' in str(e):
+                return jsonify({'error': 'Cursor is not a message in this conversation'}), 400
+            raise
+
+        messages = result.data or []
+        has_more = limit is not None and len(messages) > limit
+        if has_more:
+            # Older pages drop their oldest row, newer pages their newest
+            messages = messages[:limit] if after else messages[1:]
+
+        if not messages:
+            return jsonify({'messages': [], 'has_more': False}), 200
+
+        # Advance the user's read watermark to the newest message they were
+        # shown, instead of marking each message read
+        received = [message for message in messages if message.get('receiver_id') == user_id and not message.get('read')]
+        if received:
+            mark_conversation_read(user_id, receiver_id, item_id, received[-1].get('created_at'))
 
-        return jsonify({'messages': result.data}), 200
+        return jsonify({
+            'messages': messages,
+            'has_more': has_more,
+            # Cursors for the next older page and for polling newer messages
+            'before': messages[0].get('id'),
+            'after': messages[-1].get('id')
+        }), 200
     except Exception as e:
         current_app.logger.error(f"Error fetching messages: {str(e)}")
         return jsonify({'error': f"Failed to fetch messages: {str(e)}"}), 500
@@ -80,7 +280,6 @@ def send_message():
     try:
         # Get user from g object (set by supabase_auth_required)
         user = g.user
-        user_id = user.get('id')
 
         data = request.get_json()
 
@@ -90,89 +289,14 @@ def send_message():
         if 'content' not in data:
             return jsonify({'error': 'Message content is required'}), 400
 
-        # Prevent messaging yourself
-        if user_id == data['receiver_id']:
-            return jsonify({'error': 'You cannot message yourself'}), 400
-
-        # Create message data
-        message_data = {
-            'sender_id': str(user_id),  # Ensure sender_id is a string
-            'receiver_id': str(data['receiver_id']),  # Ensure receiver_id is a string
-            'content': data['content'],
-            'read': False,
-            'created_at': datetime.utcnow().isoformat(),
-            'updated_at': datetime.utcnow().isoformat()
-        }
-
-        # Log the message data for debugging
-        current_app.logger.info(f"Sending message with data: {message_data}")
-
-        # Add item_id if provided
-        if 'item_id' in data and data['item_id']:
-            message_data['item_id'] = data['item_id']
-
-            # Check if item exists
-            item_result = supabase.table('items').select('*').eq('id', data['item_id']).execute()
-            if not item_result.data or len(item_result.data) == 0:
-                return jsonify({'error': 'Item not found'}), 404
-
         try:
-            # Try to insert message into Supabase using the table API
-            result = supabase.table('messages').insert(message_data).execute()
-
-            if not result.data or len(result.data) == 0:
-                raise Exception('No data returned from insert operation')
-
-            current_app.logger.info(f"Message inserted successfully: {result.data[0]}")
-        except Exception as insert_error:
-            current_app.logger.error(f"Error inserting message with table API: {str(insert_error)}")
-
-            try:
-                # Fallback to using the bypass RLS function
-                current_app.logger.info("Trying fallback with bypass RLS function")
-
-                # Prepare parameters for the bypass function
-                sender_id = message_data['sender_id']
-                receiver_id = message_data['receiver_id']
-                content = message_data['content']
-                item_id = message_data.get('item_id', None)
-
-                # Create SQL query to call the bypass function
-                if item_id:
-                    sql_query = f"SELECT * FROM insert_message_bypass_rls('{sender_id}'::uuid, '{receiver_id}'::uuid, '{content}', '{item_id}'::uuid);"
-                else:
-                    sql_query = f"SELECT * FROM insert_message_bypass_rls('{sender_id}'::uuid, '{receiver_id}'::uuid, '{content}');"
-
-                current_app.logger.info(f"Executing bypass function: {sql_query}")
-
-                # Execute SQL query
-                sql_result = supabase.sql(sql_query).execute()
-
-                if not sql_result.data or len(sql_result.data) == 0:
-                    return jsonify({'error': 'Failed to send message using fallback method'}), 500
-
-                result = sql_result
-                current_app.logger.info(f"Message inserted successfully with SQL: {result.data[0]}")
-            except Exception as sql_error:
-                current_app.logger.error(f"Error inserting message with SQL: {str(sql_error)}")
-                return jsonify({'error': f"Failed to send message: {str(sql_error)}"}), 500
-
-        # Create notification for receiver
-        notification_data = {
-            'user_id': data['receiver_id'],
-            'related_id': result.data[0].get('id'),
-            'title': 'New Message',
-            'message': f"You have a new message from {user.get('name') or user.get('email')}",
-            'type': 'message',
-            'created_at': datetime.utcnow().isoformat(),
-            'read': False
-        }
-
-        supabase.table('notifications').insert(notification_data).execute()
+            message = send_user_message(user, data['receiver_id'], data['content'], data.get('item_id'))
+        except MessageError as e:
+            return jsonify({'error': str(e)}), e.status
 
         return jsonify({
             'message': 'Message sent successfully',
-            'data': result.data[0]
+            'data': message
         }), 201
     except Exception as e:
         current_app.logger.error(f"Error sending message: {str(e)}")
@@ -203,6 +327,9 @@ def mark_as_read(message_id):
         if not update_result.data or len(update_result.data) == 0:
             return jsonify({'error': 'Failed to mark message as read'}), 500
 
+        invalidate_badge_counters([user_id])
+        publish([user_id], 'message-read', {'id': message_id})
+
         return jsonify({
             'message': 'Message marked as read',
             'data': update_result.data[0]
@@ -219,12 +346,58 @@ def get_unread_count():
         user = g.user
         user_id = user.get('id')
 
-        # Count unread messages
-        result = supabase.table('messages').select('id', count='exact').eq('receiver_id', user_id).eq('read', False).execute()
-
-        unread_count = result.count if hasattr(result, 'count') else 0
+        # Count unread messages from the conversation summaries
+        unread_count = get_unread_message_count(user_id)
 
         return jsonify({'unread_count': unread_count}), 200
     except Exception as e:
         current_app.logger.error(f"Error getting unread count: {str(e)}")
         return jsonify({'error': f"Failed to get unread count: {str(e)}"}), 500
+
+@messages_bp.route('/search', methods=['GET'])
+@supabase_auth_required
+def search_messages():
+    try:
+        # Get user from g object (set by supabase_auth_required)
+        user = g.user
+        user_id = user.get('id')
+
+        query = (request.args.get('q') or '').strip()
+        if len(query) < 2:
+            return jsonify({'error': 'Search query must be at least 2 characters'}), 400
+
+        limit = request.args.get('limit', DEFAULT_SEARCH_PAGE_SIZE, type=int)
+        if limit < 1 or limit > MAX_SEARCH_PAGE_SIZE:
+            return jsonify({'error': f"Limit must be between 1 and {MAX_SEARCH_PAGE_SIZE}"}), 400
+        offset = max(request.args.get('offset', 0, type=int), 0)
+
+        # The function takes UUIDs; a malformed one would fail as a 500
+        other_user_id = request.args.get('with') or None
+        item_id = request.args.get('item_id') or None
+        if other_user_id is not None and not is_uuid(other_user_id):
+            return jsonify({'error': 'with must be a user ID'}), 400
+        if item_id is not None and not is_uuid(item_id):
+            return jsonify({'error': 'item_id must be an item ID'}), 400
+
+        # Ranked matches from the user's own conversations, optionally within
+        # one conversation; one extra row tells whether another page exists
+        result = supabase.rpc('search_messages', {
+            'p_user_id': user_id,
+            'p_query': query,
+            'p_other_user_id': other_user_id,
+            'p_item_id': item_id,
+            'p_limit': limit + 1,
+            'p_offset': offset
+        }).execute()
+
+        results = result.data or []
+        has_more = len(results) > limit
+
+        return jsonify({
+            'results': results[:limit],
+            'has_more': has_more,
+            'next_offset': offset + limit if has_more else None
+        }), 200
+    except Exception as e:
+        current_app.logger.error(f"Error searching messages: {str(e)}")
+        return jsonify({'error': f"Failed to search messages: {str(e)}"}), 500
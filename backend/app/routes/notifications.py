@@ -2,7 +2,11 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from datetime import datetime
 import os
+import uuid
 from app.utils.supabase import get_supabase_client
+from app.utils.notification_service import (
+    unread_count_cache, get_unread_notification_count, publish_notifications, publish_read_state
+)
 
 notifications_bp = Blueprint('notifications', __name__)
 supabase = get_supabase_client()
@@ -12,6 +16,55 @@ def is_admin():
     jwt_data = get_jwt()
     return jwt_data.get('role') == 'admin'
 
+# Bulk operations
+BULK_ACTIONS = ('read', 'unread', 'delete')
+BULK_FILTER_KEYS = {'read', 'type', 'notification_type', 'item_id', 'related_id', 'before', 'after'}
+BULK_FILTER_UUID_KEYS = ('item_id', 'related_id')
+BULK_FILTER_TIME_KEYS = ('before', 'after')
+MAX_BULK_IDS = 1000
+
+def bulk_update_notifications(user_id, action, ids=None, notification_filter=None):
+    """
+    Apply a bulk action to a user's notifications in one statement
+
+    See sql/create_notification_bulk_functions.sql; rows the user doesn't
+    own are never matched.
+
+    Returns:
+        int: The number of notifications changed
+    """
+    result = supabase.rpc('bulk_update_notifications', {
+        'p_user_id': user_id,
+        'p_action': action,
+        'p_ids': ids,
+        'p_filter': notification_filter or {}
+    }).execute()
+    updated = result.data or 0
+    if updated:
+        publish_read_state([user_id], {'action': action, 'updated': updated})
+    return updated
+
+def is_uuid(value):
+    try:
+        uuid.UUID(str(value))
+        return True
+    except ValueError:
+        return False
+
+def is_timestamp(value):
+    try:
+        datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        return True
+    except ValueError:
+        return False
+
+def notification_write_failed(notification_id):
+    """Tell a missing notification apart from someone else's after a write matched nothing"""
+    check_result = supabase.table('notifications').select('id').eq('id', notification_id).execute()
+    if not check_result.data:
+        return jsonify({'error': 'Notification not found'}), 404
+    return jsonify({'error': 'Unauthorized access'}), 403
+
 @notifications_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_notifications():
@@ -21,50 +74,59 @@ def get_notifications():
         
         # Get query parameters for filtering
         is_read = request.args.get('is_read')
-        
-        # Start with base query for current user
-        query = supabase.table('notifications').select('*').eq('user_id', user_id)
-        
-        # Apply filters if provided
-        if is_read is not None:
-            is_read_bool = is_read.lower() == 'true'
-            query = query.eq('read', is_read_bool)
+        is_read_bool = is_read.lower() == 'true' if is_read is not None else None
         
         # Get paginated results
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
         
-        # Calculate start and end for pagination
-        start = (page - 1) * per_page
-        end = start + per_page - 1
-        
-        # Execute the query with pagination and ordering
-        result = query.order('created_at', desc=True).range(start, end).execute()
-        
-        # Get total count for pagination
-        count_result = supabase.table('notifications')\
-            .select('id', count='exact')\
-            .eq('user_id', user_id)\
-            .execute()
-        
-        total_count = count_result.count if hasattr(count_result, 'count') else 0
+        # Old read notifications live in the archive and are only listed on request
+        if request.args.get('archived', 'false').lower() == 'true':
+            start = (page - 1) * per_page
+            archive_result = supabase.table('notifications_archive')\
+                .select('*', count='exact')\
+                .eq('user_id', user_id)\
+                .order('created_at', desc=True)\
+                .range(start, start + per_page - 1)\
+                .execute()
+            total_count = archive_result.count or 0
+            return jsonify({
+                'notifications': archive_result.data or [],
+                'total': total_count,
+                'pages': (total_count + per_page - 1) // per_page if total_count > 0 else 0,
+                'current_page': page,
+                'unread_count': get_unread_notification_count(user_id)
+            }), 200
+        
+        # One round trip for the page and both counts (see sql/create_notification_inbox.sql)
+        result = supabase.rpc('get_notification_inbox', {
+            'p_user_id': user_id,
+            'p_is_read': is_read_bool,
+            'p_limit': per_page,
+            'p_offset': (page - 1) * per_page
+        }).execute()
+        
+        inbox = result.data or {}
+        notifications = inbox.get('notifications') or []
+        all_count = inbox.get('total', 0)
+        unread_count = inbox.get('unread_count', 0)
+        unread_count_cache.set(user_id, unread_count)
+        
+        # Total for pagination follows the read filter
+        if is_read_bool is None:
+            total_count = all_count
+        elif is_read_bool:
+            total_count = max(all_count - unread_count, 0)
+        else:
+            total_count = unread_count
         
         # Calculate total pages
         total_pages = (total_count + per_page - 1) // per_page if total_count > 0 else 0
         
-        # Get unread count
-        unread_result = supabase.table('notifications')\
-            .select('id', count='exact')\
-            .eq('user_id', user_id)\
-            .eq('read', False)\
-            .execute()
-        
-        unread_count = unread_result.count if hasattr(unread_result, 'count') else 0
-        
-        current_app.logger.info(f"Found {len(result.data)} notifications, total: {total_count}, unread: {unread_count}")
+        current_app.logger.info(f"Found {len(notifications)} notifications, total: {total_count}, unread: {unread_count}")
         
         return jsonify({
-            'notifications': result.data,
+            'notifications': notifications,
             'total': total_count,
             'pages': total_pages,
             'current_page': page,
@@ -74,6 +136,17 @@ def get_notifications():
         current_app.logger.error(f"Error fetching notifications: {str(e)}")
         return jsonify({'error': f"Failed to fetch notifications: {str(e)}"}), 500
 
+@notifications_bp.route('/unread-count', methods=['GET'])
+@jwt_required()
+def get_unread_count():
+    try:
+        user_id = get_jwt_identity()
+        
+        return jsonify({'unread_count': get_unread_notification_count(user_id)}), 200
+    except Exception as e:
+        current_app.logger.error(f"Error getting unread notification count: {str(e)}")
+        return jsonify({'error': f"Failed to get unread count: {str(e)}"}), 500
+
 @notifications_bp.route('/<string:notification_id>', methods=['GET'])
 @jwt_required()
 def get_notification(notification_id):
@@ -106,25 +179,17 @@ def mark_notification_read(notification_id):
         user_id = get_jwt_identity()
         current_app.logger.info(f"User {user_id} marking notification {notification_id} as read")
         
-        # Check if notification exists and belongs to user
-        check_result = supabase.table('notifications').select('*').eq('id', notification_id).execute()
-        
-        if not check_result.data or len(check_result.data) == 0:
-            return jsonify({'error': 'Notification not found'}), 404
-            
-        notification = check_result.data[0]
-        
-        # Users can only update their own notifications
-        if notification.get('user_id') != user_id and not is_admin():
-            return jsonify({'error': 'Unauthorized access'}), 403
-        
-        # Update notification in Supabase
-        result = supabase.table('notifications').update({'read': True}).eq('id', notification_id).execute()
+        # Update in one conditional write; users can only update their own notifications
+        query = supabase.table('notifications').update({'read': True}).eq('id', notification_id)
+        if not is_admin():
+            query = query.eq('user_id', user_id)
+        result = query.execute()
         
         if not result.data or len(result.data) == 0:
-            return jsonify({'error': 'Failed to update notification'}), 500
+            return notification_write_failed(notification_id)
             
         updated_notification = result.data[0]
+        publish_read_state([updated_notification.get('user_id')], {'id': notification_id})
         current_app.logger.info(f"Notification marked as read: {updated_notification}")
         
         return jsonify({
@@ -142,22 +207,64 @@ def mark_all_notifications_read():
         user_id = get_jwt_identity()
         current_app.logger.info(f"User {user_id} marking all notifications as read")
         
-        # Update all unread notifications for the user
-        result = supabase.table('notifications').update({'read': True}).eq('user_id', user_id).eq('read', False).execute()
+        # Update all unread notifications for the user, returning only the count
+        updated = bulk_update_notifications(user_id, 'read')
         
-        if not result.data or len(result.data) == 0:
-            return jsonify({'error': 'Failed to update notifications'}), 500
-            
-        updated_notifications = result.data
-        current_app.logger.info(f"All notifications marked as read: {updated_notifications}")
+        current_app.logger.info(f"{updated} notifications marked as read for user {user_id}")
         
         return jsonify({
             'message': 'All notifications marked as read',
-            'notifications': updated_notifications
+            'updated': updated
         }), 200
     except Exception as e:
         current_app.logger.error(f"Error marking all notifications as read: {str(e)}")
         return jsonify({'error': f"Failed to mark all notifications as read: {str(e)}"}), 500
+
+@notifications_bp.route('/bulk', methods=['POST'])
+@jwt_required()
+def bulk_notifications():
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json() or {}
+        
+        action = data.get('action')
+        if action not in BULK_ACTIONS:
+            return jsonify({'error': f"action must be one of: {', '.join(BULK_ACTIONS)}"}), 400
+        
+        # Either explicit ids or a filter; an empty filter means the whole inbox
+        ids = data.get('ids')
+        notification_filter = data.get('filter') or {}
+        if ids is not None and (not isinstance(ids, list) or len(ids) > MAX_BULK_IDS):
+            return jsonify({'error': f"ids must be a list of at most {MAX_BULK_IDS} notification ids"}), 400
+        if ids is not None and not all(isinstance(i, str) and is_uuid(i) for i in ids):
+            return jsonify({'error': 'ids must be notification UUIDs'}), 400
+        if not isinstance(notification_filter, dict) or set(notification_filter) - BULK_FILTER_KEYS:
+            return jsonify({'error': f"filter keys must be among: {', '.join(sorted(BULK_FILTER_KEYS))}"}), 400
+        
+        # The function casts these, so bad values would surface as a 500
+        if 'read' in notification_filter and not isinstance(notification_filter['read'], bool):
+            return jsonify({'error': 'filter read must be true or false'}), 400
+        for key in BULK_FILTER_UUID_KEYS:
+            if key in notification_filter and not is_uuid(notification_filter[key]):
+                return jsonify({'error': f"filter {key} must be a UUID"}), 400
+        for key in BULK_FILTER_TIME_KEYS:
+            if key in notification_filter and not is_timestamp(notification_filter[key]):
+                return jsonify({'error': f"filter {key} must be an ISO 8601 timestamp"}), 400
+        if ids is None and not notification_filter and not data.get('all'):
+            return jsonify({'error': "Provide ids, a filter, or all: true"}), 400
+        
+        current_app.logger.info(f"User {user_id} bulk {action} on {len(ids) if ids is not None else 'filtered'} notifications")
+        
+        updated = bulk_update_notifications(user_id, action, ids=ids, notification_filter=notification_filter)
+        
+        return jsonify({
+            'action': action,
+            'updated': updated
+        }), 200
+    except Exception as e:
+        current_app.logger.error(f"Error applying bulk notification update: {str(e)}")
+        return jsonify({'error': f"Failed to update notifications: {str(e)}"}), 500
+
 @notifications_bp.route('/', methods=['POST'])
 @jwt_required()
 def create_notification():
@@ -189,6 +296,8 @@ def create_notification():
         if not result.data or len(result.data) == 0:
             return jsonify({'error': 'Failed to create notification'}), 500
             
+        publish_notifications(result.data)
+            
         created_notification = result.data[0]
         current_app.logger.info(f"Notification created successfully: {created_notification}")
         
@@ -207,23 +316,34 @@ def delete_notification(notification_id):
         user_id = get_jwt_identity()
         current_app.logger.info(f"User {user_id} attempting to delete notification {notification_id}")
         
-        # Check if notification exists
-        check_result = supabase.table('notifications').select('*').eq('id', notification_id).execute()
-        
-        if not check_result.data or len(check_result.data) == 0:
-            return jsonify({'error': 'Notification not found'}), 404
-            
-        notification = check_result.data[0]
+        # Delete in one conditional write; users can only delete their own notifications
+        query = supabase.table('notifications').delete().eq('id', notification_id)
+        if not is_admin():
+            query = query.eq('user_id', user_id)
+        result = query.execute()
         
-        # Users can only delete their own notifications
-        if notification.get('user_id') != user_id and not is_admin():
-            return jsonify({'error': 'Unauthorized access'}), 403
+        if not result.data or len(result.data) == 0:
+            return notification_write_failed(notification_id)
         
-        # Delete notification from Supabase
-        result = supabase.table('notifications').delete().eq('id', notification_id).execute()
+        publish_read_state([result.data[0].get('user_id')], {'id': notification_id, 'deleted': True})
         
         current_app.logger.info(f"Notification {notification_id} deleted successfully")
         return jsonify({'message': 'Notification deleted successfully'}), 200
     except Exception as e:
         current_app.logger.error(f"Error deleting notification {notification_id}: {str(e)}")
-        return jsonify({'error': f"Failed to delete notification: {str(e)}"}), 500
\ No newline at end of file
+        return jsonify({'error': f"Failed to delete notification: {str(e)}"}), 500
+
+@notifications_bp.route('/delivery-metrics', methods=['GET'])
+@jwt_required()
+def get_delivery_metrics():
+    try:
+        # Only admins can see delivery metrics
+        if not is_admin():
+            return jsonify({'error': 'Unauthorized access'}), 403
+        
+        from app.utils.sms_dispatcher import get_sms_dispatcher
+        
+        return jsonify({'sms': get_sms_dispatcher().metrics()}), 200
+    except Exception as e:
+        current_app.logger.error(f"Error getting delivery metrics: {str(e)}")
+        return jsonify({'error': f"Failed to get delivery metrics: {str(e)}"}), 500
@@ -0,0 +1,141 @@
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+import os
+import json
+import time
+from app.utils.supabase_auth import get_token_from_header, verify_supabase_token
+from app.utils.event_bus import event_bus
+from app.utils.badge_counters import get_badge_counters
+
+stream_bp = Blueprint('stream', __name__)
+
+# Comment lines sent on idle streams so proxies don't time them out
+DEFAULT_HEARTBEAT_SECONDS = 15
+
+# Streams are closed after this long; EventSource reconnects on its own and
+# resumes from Last-Event-ID, which also re-checks the token
+DEFAULT_MAX_STREAM_SECONDS = 300
+
+# Upper bound on how long a long-poll request is held open
+MAX_POLL_TIMEOUT = 30
+
+
+def authenticate():
+    """
+    Resolve the user for a stream request
+
+    EventSource can't set headers, so the Supabase access token may also be
+    passed as the access_token query parameter.
+    """
+    token = get_token_from_header() or request.args.get('access_token')
+    if not token:
+        return None
+    return verify_supabase_token(token)
+
+
+def unread_counts(user_id):
+    return get_badge_counters(user_id)
+
+
+def format_sse(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def parse_event_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@stream_bp.route('', methods=['GET'])
+def stream():
+    user = authenticate()
+    if not user:
+        return jsonify({
+            'error': 'Authentication failed',
+            'message': 'Invalid or expired token'
+        }), 401
+
+    user_id = str(user.get('id'))
+    heartbeat = int(os.environ.get('STREAM_HEARTBEAT_SECONDS', DEFAULT_HEARTBEAT_SECONDS))
+    max_seconds = int(os.environ.get('STREAM_MAX_SECONDS', DEFAULT_MAX_STREAM_SECONDS))
+
+    # Resume after the last event the browser saw, or start from now
+    last_id = parse_event_id(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+    if last_id is None:
+        last_id = event_bus.last_event_id(user_id)
+
+    def generate():
+        nonlocal last_id
+        deadline = time.monotonic() + max_seconds
+
+        # Tell the client how long to wait before reconnecting, then give it
+        # the current badge counts so it can drop any polling; a failed count
+        # shouldn't end the stream, the next event brings a fresh one
+        yield "retry: 3000\n\n"
+        try:
+            yield format_sse('unread-count', unread_counts(user_id), last_id)
+        except Exception as e:
+            current_app.logger.error(f"Error loading unread counts for stream: {str(e)}")
+
+        while time.monotonic() < deadline:
+            events = event_bus.wait(user_id, last_id, timeout=min(heartbeat, max(deadline - time.monotonic(), 0)))
+            if not events:
+                yield ': keepalive\n\n'
+                continue
+
+            for item in events:
+                last_id = item.id
+                yield format_sse(item.event, item.data, item.id)
+
+            # Anything that arrived may have moved the badges
+            try:
+                yield format_sse('unread-count', unread_counts(user_id), last_id)
+            except Exception as e:
+                current_app.logger.error(f"Error refreshing unread counts for stream: {str(e)}")
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Keep nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@stream_bp.route('/poll', methods=['GET'])
+def poll():
+    """Long-poll fallback for clients that can't keep an EventSource open"""
+    try:
+        user = authenticate()
+        if not user:
+            return jsonify({
+                'error': 'Authentication failed',
+                'message': 'Invalid or expired token'
+            }), 401
+
+        user_id = str(user.get('id'))
+        timeout = min(request.args.get('timeout', 25, type=int), MAX_POLL_TIMEOUT)
+        since = parse_event_id(request.args.get('since'))
+
+        # First poll: return the current state and a cursor to poll from
+        if since is None:
+            return jsonify({
+                'events': [],
+                'unread_count': unread_counts(user_id),
+                'last_event_id': event_bus.last_event_id(user_id)
+            }), 200
+
+        events = event_bus.wait(user_id, since, timeout=max(timeout, 0))
+
+        return jsonify({
+            'events': [{'id': item.id, 'event': item.event, 'data': item.data} for item in events],
+            'unread_count': unread_counts(user_id) if events else None,
+            'last_event_id': events[-1].id if events else since
+        }), 200
+    except Exception as e:
+        current_app.logger.error(f"Error polling events: {str(e)}")
+        return jsonify({'error': f"Failed to poll events: {str(e)}"}), 500
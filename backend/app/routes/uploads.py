@@ -0,0 +1,92 @@
+from flask import Blueprint, request, jsonify, current_app, send_file, make_response
+from werkzeug.utils import safe_join
+import mimetypes
+import os
+import re
+from app.utils.storage import DEFAULT_QUARANTINE_PREFIX
+
+uploads_bp = Blueprint('uploads', __name__)
+
+# Uploads stored under a random 32-hex-digit name (see utils/upload_stream)
+# are never rewritten
+CONTENT_HASHED_NAME = re.compile(r'^[0-9a-f]{32}\.[a-z0-9]+$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'public, max-age=86400'
+
+# Precompressed siblings we look for, in order of preference
+PRECOMPRESSED_ENCODINGS = [
+    ('br', '.br'),
+    ('gzip', '.gz'),
+]
+
+# In-flight upload spools (see utils/upload_stream and utils/storage)
+SPOOL_SUFFIX = '.part'
+
+def get_offload_mode():
+    """
+    Return how file bodies are handed off to a fronting proxy
+
+    'nginx' sets X-Accel-Redirect, 'sendfile' sets X-Sendfile (Apache,
+    lighttpd), anything else serves the file from the worker.
+    """
+    return os.environ.get('UPLOADS_OFFLOAD', '').lower()
+
+def cache_control_for(filename):
+    if CONTENT_HASHED_NAME.match(os.path.basename(filename)):
+        return IMMUTABLE_CACHE_CONTROL
+    return DEFAULT_CACHE_CONTROL
+
+def is_servable(name):
+    """False for spools still being written and uploads the sweeper quarantined"""
+    return not name.endswith(SPOOL_SUFFIX) and not name.startswith(DEFAULT_QUARANTINE_PREFIX)
+
+def pick_precompressed(path):
+    """Return (encoding, path) of a precompressed variant the client accepts"""
+    for encoding, suffix in PRECOMPRESSED_ENCODINGS:
+        if encoding in request.accept_encodings and os.path.isfile(path + suffix):
+            return encoding, path + suffix
+    return None, path
+
+@uploads_bp.route('/static/uploads/<path:filename>', methods=['GET', 'HEAD'])
+def serve_upload(filename):
+    try:
+        upload_folder = current_app.config.get(
+            'UPLOAD_FOLDER',
+            os.path.join(current_app.root_path, 'static', 'uploads')
+        )
+        # Checked on the resolved name, before any of the serving branches
+        # below (proxy offloads included) get to see the file
+        path = safe_join(upload_folder, filename)
+        if path is None or not is_servable(os.path.relpath(path, upload_folder).replace(os.sep, '/')) \
+                or not os.path.isfile(path):
+            return jsonify({'error': 'Not found'}), 404
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding, served_path = pick_precompressed(path)
+        served_name = os.path.relpath(served_path, upload_folder).replace(os.sep, '/')
+        offload = get_offload_mode()
+
+        if offload == 'nginx':
+            # nginx streams the file itself and handles ranges and conditionals;
+            # the internal location must alias the upload folder
+            prefix = os.environ.get('UPLOADS_ACCEL_PREFIX', '/protected-uploads/')
+            response = make_response('', 200)
+            response.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + served_name
+            response.headers['Content-Type'] = mimetype
+        elif offload == 'sendfile':
+            response = make_response('', 200)
+            response.headers['X-Sendfile'] = served_path
+            response.headers['Content-Type'] = mimetype
+        else:
+            # conditional=True gives us ETag/Last-Modified and byte range
+            # support; the WSGI server's file_wrapper uses sendfile(2) when it can
+            response = send_file(served_path, mimetype=mimetype, conditional=True)
+
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = cache_control_for(filename)
+        return response
+    except Exception as e:
+        current_app.logger.error(f"Error serving upload {filename}: {str(e)}")
+        return jsonify({'error': f"Failed to serve file: {str(e)}"}), 500
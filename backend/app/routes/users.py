@@ -3,6 +3,7 @@ from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from datetime import datetime
 import os
 from app.utils.supabase import get_supabase_client
+from app.utils.notification_service import invalidate_admin_roster
 
 users_bp = Blueprint('users', __name__)
 supabase = get_supabase_client()
@@ -135,6 +136,9 @@ def delete_user(user_id):
         # Delete user from Supabase
         result = supabase.table('users').delete().eq('id', user_id).execute()
 
+        # A deleted admin must stop receiving claim notifications straight away
+        invalidate_admin_roster()
+
         current_app.logger.info(f"User {user_id} deleted successfully")
         return jsonify({'message': 'User deleted successfully'}), 200
     except Exception as e:
@@ -211,9 +215,15 @@ def get_my_notifications():
 
         # Get notifications for the user from Supabase, ordered by created_at desc
         result = supabase.table('notifications').select('*').eq('user_id', user_id).order('created_at', desc=True).execute()
+        notifications = result.data or []
 
-        current_app.logger.info(f"Found {len(result.data)} notifications for user {user_id}")
-        return jsonify(result.data), 200
+        # Archived (old, read) notifications only when asked for
+        if request.args.get('include_archived', 'false').lower() == 'true':
+            archive_result = supabase.table('notifications_archive').select('*').eq('user_id', user_id).order('created_at', desc=True).execute()
+            notifications = sorted(notifications + (archive_result.data or []), key=lambda n: n.get('created_at') or '', reverse=True)
+
+        current_app.logger.info(f"Found {len(notifications)} notifications for user {user_id}")
+        return jsonify(notifications), 200
     except Exception as e:
         current_app.logger.error(f"Error fetching notifications for user {user_id}: {str(e)}")
         return jsonify({'error': f"Failed to fetch notifications: {str(e)}"}), 500
@@ -276,12 +286,15 @@ def update_profile():
 
         # Only update allowed fields
         update_data = {}
-        allowed_fields = ['name', 'email', 'phone', 'bio', 'avatar_url']
+        allowed_fields = ['name', 'email', 'phone', 'bio', 'avatar_url', 'digest_frequency', 'digest_sms']
 
         for field in allowed_fields:
             if field in data:
                 update_data[field] = data[field]
 
+        if 'digest_frequency' in update_data and update_data['digest_frequency'] not in ('off', 'hourly', 'daily'):
+            return jsonify({'error': "digest_frequency must be 'off', 'hourly' or 'daily'"}), 400
+
         if not update_data:
             return jsonify({'error': 'No valid fields to update'}), 400
 
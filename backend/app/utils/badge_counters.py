@@ -0,0 +1,46 @@
+import os
+from app.utils.supabase import get_supabase_client
+from app.utils.ttl_cache import TTLCache
+
+supabase = get_supabase_client()
+
+# Header badge counts per user; writes that move a count drop the entry and
+# the TTL bounds how stale other workers can be
+counters_cache = TTLCache(ttl=int(os.environ.get('BADGE_COUNTERS_TTL_SECONDS', 5)))
+
+
+def get_badge_counters(user_id, is_admin=False):
+    """
+    Return a user's badge counts: unread notifications and messages, plus
+    pending claims for admins
+
+    Served from the in-process cache when fresh, otherwise read with the
+    get_badge_counters function (see sql/create_badge_counters_function.sql).
+
+    Args:
+        user_id (str): The user
+        is_admin (bool): Include the pending claim count
+
+    Returns:
+        dict: Counts keyed 'notifications', 'messages' and, for admins,
+            'pending_claims'
+    """
+    key = (str(user_id), bool(is_admin))
+    counters = counters_cache.get(key)
+    if counters is None:
+        result = supabase.rpc('get_badge_counters', {
+            'p_user_id': user_id,
+            'p_include_claims': bool(is_admin)
+        }).execute()
+        counters = result.data or {'notifications': 0, 'messages': 0}
+        if not is_admin:
+            counters.pop('pending_claims', None)
+        counters_cache.set(key, counters)
+    return dict(counters)
+
+
+def invalidate_badge_counters(user_ids):
+    """Drop cached badge counts after something they count changed"""
+    for user_id in set(str(user_id) for user_id in user_ids if user_id):
+        counters_cache.invalidate((user_id, False))
+        counters_cache.invalidate((user_id, True))
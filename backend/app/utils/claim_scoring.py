@@ -0,0 +1,130 @@
+import re
+import math
+from collections import Counter
+from datetime import datetime
+
+# Weights of the individual signals in the final score
+SIMILARITY_WEIGHT = 0.5
+KEYWORD_WEIGHT = 0.35
+DATE_WEIGHT = 0.15
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'for', 'from', 'has', 'have',
+    'i', 'in', 'is', 'it', 'its', 'my', 'of', 'on', 'or', 'that', 'the', 'this', 'to',
+    'was', 'were', 'with', 'me', 'mine', 'we', 'our', 'you', 'your', 'there', 'they',
+    'had', 'which', 'item', 'lost', 'found', 'belongs', 'belong',
+}
+
+MONTHS = [
+    'january', 'february', 'march', 'april', 'may', 'june', 'july',
+    'august', 'september', 'october', 'november', 'december',
+]
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords or single characters"""
+    if not text:
+        return []
+    return [token for token in TOKEN_PATTERN.findall(text.lower())
+            if len(token) > 1 and token not in STOPWORDS]
+
+
+def item_text(item):
+    """The item fields a legitimate owner is likely to describe"""
+    return ' '.join(str(item.get(field) or '') for field in ('name', 'category', 'description', 'found_location'))
+
+
+def date_patterns(item):
+    """
+    Patterns matching ways an owner might say when the item went missing
+
+    A day number only counts next to its month ("March 3", "3rd of March",
+    "3/3") and abbreviations only with a day, so "iPhone 15" or "it may be"
+    are not read as dates.
+
+    Returns:
+        list: Compiled patterns, one per phrasing of each item date
+    """
+    patterns = []
+    for field in ('date_lost', 'found_date'):
+        value = item.get(field)
+        if not value:
+            continue
+        try:
+            date = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            continue
+        month = MONTHS[date.month - 1]
+        month_name = f"(?:{month}|{month[:3]}\\.?)"
+        day = f"0?{date.day}(?:st|nd|rd|th)?"
+        phrasings = [
+            re.escape(date.strftime('%Y-%m-%d')),
+            f"{month_name}\\s+{day}",
+            f"{day}\\s+(?:of\\s+)?{month_name}",
+            f"0?{date.month}/0?{date.day}(?:/(?:\\d{{2}}|\\d{{4}}))?",
+        ]
+        # "may" is too common a word to count on its own
+        if month != 'may':
+            phrasings.append(month)
+        patterns.extend(re.compile(f"(?<![a-z0-9]){phrasing}(?![a-z0-9])") for phrasing in phrasings)
+    return patterns
+
+
+def term_vector(tokens):
+    """
+    Sublinear term-frequency vector for one tokenized document
+
+    No IDF: it would depend on which other claims were scored alongside,
+    and a claim's score has to be the same whether it is scored alone on
+    create or in a rescore batch.
+    """
+    return {term: 1 + math.log(count) for term, count in Counter(tokens).items()}
+
+
+def cosine(a, b):
+    if not a or not b:
+        return 0.0
+    dot = sum(weight * b.get(term, 0.0) for term, weight in a.items())
+    norm = math.sqrt(sum(w * w for w in a.values())) * math.sqrt(sum(w * w for w in b.values()))
+    return dot / norm if norm else 0.0
+
+
+def score_claims(pairs):
+    """
+    Score how well each claim's proof matches the claimed item
+
+    Each pair is scored on its own, so the result doesn't depend on the batch
+
+    Args:
+        pairs (list): (proof_description, item) tuples
+
+    Returns:
+        list: Scores from 0 to 100, in the same order as pairs
+    """
+    if not pairs:
+        return []
+
+    scores = []
+    for proof, item in pairs:
+        proof_tokens = tokenize(proof)
+        item_tokens = tokenize(item_text(item))
+        proof_terms = set(proof_tokens)
+        item_terms = set(item_tokens)
+
+        similarity = cosine(term_vector(proof_tokens), term_vector(item_tokens))
+        overlap = len(proof_terms & item_terms) / len(item_terms) if item_terms else 0.0
+
+        proof_text = (proof or '').lower()
+        date_match = 1.0 if any(pattern.search(proof_text) for pattern in date_patterns(item)) else 0.0
+
+        score = SIMILARITY_WEIGHT * similarity + KEYWORD_WEIGHT * overlap + DATE_WEIGHT * date_match
+        scores.append(round(score * 100, 2))
+
+    return scores
+
+
+def score_claim(proof_description, item):
+    """Score a single claim, see score_claims"""
+    return score_claims([(proof_description, item)])[0]
@@ -0,0 +1,340 @@
+import os
+import time
+import random
+import sqlite3
+import smtplib
+import argparse
+import threading
+from app.utils.email_service import get_smtp_config, build_message
+
+DEFAULT_OUTBOX_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'instance', 'email_outbox.sqlite3')
+
+DEFAULT_WORKERS = 2
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_MAX_ATTEMPTS = 6
+DEFAULT_BACKOFF_SECONDS = 30
+MAX_BACKOFF_SECONDS = 3600
+
+# A claimed message not marked sent or failed by then is assumed lost with
+# its worker (e.g. the process was killed) and is claimed again
+SENDING_TIMEOUT_SECONDS = 300
+
+# Idle SMTP sessions are closed after this long
+DEFAULT_IDLE_SECONDS = 30
+
+# Delivered messages are kept this long for inspection
+SENT_RETENTION_SECONDS = 7 * 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    recipient TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    claimed_at REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at);
+"""
+
+
+class PermanentFailure(Exception):
+    """The server rejected the message; retrying won't help"""
+
+
+class SMTPSession:
+    """
+    A reusable authenticated SMTP connection
+
+    Connecting, STARTTLS and login happen once and are then shared by every
+    message the owning worker sends, until the server drops the connection
+    or the session sits idle.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.server = None
+        self.last_used = 0
+
+    def connect(self):
+        server = smtplib.SMTP(self.config['server'], self.config['port'], timeout=30)
+        server.starttls()
+        server.login(self.config['username'], self.config['password'])
+        self.server = server
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except Exception:
+                pass
+            self.server = None
+
+    def send(self, recipient, subject, body):
+        msg = build_message(self.config['sender'], recipient, subject, body)
+
+        # One reconnect per message: the server may have dropped an idle session
+        for attempt in range(2):
+            if self.server is None:
+                self.connect()
+            try:
+                self.server.send_message(msg)
+                self.last_used = time.monotonic()
+                return
+            except smtplib.SMTPServerDisconnected:
+                self.server = None
+                if attempt:
+                    raise
+            except smtplib.SMTPRecipientsRefused as e:
+                codes = [code for code, _ in e.recipients.values()]
+                if all(code >= 500 for code in codes):
+                    raise PermanentFailure(str(e))
+                raise
+            except (smtplib.SMTPDataError, smtplib.SMTPSenderRefused) as e:
+                if e.smtp_code >= 500:
+                    raise PermanentFailure(str(e))
+                raise
+
+
+class EmailOutbox:
+    """
+    Durable queue of outgoing email backed by a local SQLite database
+
+    Callers only insert a row. A pool of worker threads claims due messages
+    in batches, sends each batch over the worker's persistent SMTP session
+    and retries transient failures with exponential backoff. Claiming takes
+    SQLite's write lock, so several processes can share one outbox file.
+    """
+
+    def __init__(self, path=None, workers=None, batch_size=DEFAULT_BATCH_SIZE,
+                 max_attempts=None, backoff_seconds=None, idle_seconds=DEFAULT_IDLE_SECONDS):
+        self.path = path or os.environ.get('EMAIL_OUTBOX_PATH', DEFAULT_OUTBOX_PATH)
+        self.workers = workers or int(os.environ.get('EMAIL_OUTBOX_WORKERS', DEFAULT_WORKERS))
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts or int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS))
+        self.backoff_seconds = backoff_seconds or int(os.environ.get('EMAIL_OUTBOX_BACKOFF_SECONDS', DEFAULT_BACKOFF_SECONDS))
+        self.idle_seconds = idle_seconds
+
+        self._local = threading.local()
+        self._wakeup = threading.Condition()
+        self._threads = []
+        self._threads_lock = threading.Lock()
+        self._last_purged = 0
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        # SQLite connections can't be shared between threads, so each
+        # thread opens its own
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def enqueue(self, recipient, subject, body):
+        """
+        Queue one message
+
+        Returns:
+            int: The outbox id of the message
+        """
+        return self.enqueue_many([(recipient, subject, body)])[0]
+
+    def enqueue_many(self, messages):
+        """
+        Queue many messages in one transaction
+
+        Args:
+            messages (list): (recipient, subject, body) tuples
+
+        Returns:
+            list: The outbox ids, in order
+        """
+        now = time.time()
+        connection = self._connection()
+        ids = []
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            for recipient, subject, body in messages:
+                cursor = connection.execute(
+                    'INSERT INTO outbox (recipient, subject, body, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?)',
+                    (recipient, subject, body, now, now)
+                )
+                ids.append(cursor.lastrowid)
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+        self.start()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        return ids
+
+    def claim(self):
+        """Mark a batch of due messages as being sent and return them"""
+        now = time.time()
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            rows = connection.execute(
+                """SELECT * FROM outbox
+                   WHERE (status = 'pending' AND next_attempt_at <= ?)
+                      OR (status = 'sending' AND claimed_at < ?)
+                   ORDER BY next_attempt_at
+                   LIMIT ?""",
+                (now, now - SENDING_TIMEOUT_SECONDS, self.batch_size)
+            ).fetchall()
+            if rows:
+                connection.executemany(
+                    "UPDATE outbox SET status = 'sending', claimed_at = ? WHERE id = ?",
+                    [(now, row['id']) for row in rows]
+                )
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return rows
+
+    def next_due_in(self):
+        """Seconds until the next pending message is due, or None"""
+        row = self._connection().execute(
+            "SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'"
+        ).fetchone()
+        if row[0] is None:
+            return None
+        return max(row[0] - time.time(), 0)
+
+    def mark_sent(self, message_id):
+        self._connection().execute(
+            "UPDATE outbox SET status = 'sent', sent_at = ?, attempts = attempts + 1, last_error = NULL WHERE id = ?",
+            (time.time(), message_id)
+        )
+
+    def mark_failed(self, row, error, permanent=False):
+        attempts = row['attempts'] + 1
+        if permanent or attempts >= self.max_attempts:
+            self._connection().execute(
+                "UPDATE outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                (attempts, str(error), row['id'])
+            )
+            return
+
+        # Exponential backoff with jitter so retries don't arrive in lockstep
+        delay = min(self.backoff_seconds * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS)
+        delay *= random.uniform(0.8, 1.2)
+        self._connection().execute(
+            "UPDATE outbox SET status = 'pending', attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?",
+            (attempts, str(error), time.time() + delay, row['id'])
+        )
+
+    def retry_failed(self):
+        """Requeue every failed message; returns how many were requeued"""
+        cursor = self._connection().execute(
+            "UPDATE outbox SET status = 'pending', attempts = 0, next_attempt_at = ? WHERE status = 'failed'",
+            (time.time(),)
+        )
+        return cursor.rowcount
+
+    def purge_sent(self, older_than=SENT_RETENTION_SECONDS):
+        cursor = self._connection().execute(
+            "DELETE FROM outbox WHERE status = 'sent' AND sent_at < ?",
+            (time.time() - older_than,)
+        )
+        return cursor.rowcount
+
+    def stats(self):
+        rows = self._connection().execute('SELECT status, COUNT(*) FROM outbox GROUP BY status').fetchall()
+        return {status: count for status, count in rows}
+
+    def deliver(self, session, rows):
+        """Send a claimed batch over one session"""
+        for row in rows:
+            try:
+                session.send(row['recipient'], row['subject'], row['body'])
+                self.mark_sent(row['id'])
+            except PermanentFailure as e:
+                print(f"Email {row['id']} to {row['recipient']} rejected: {str(e)}")
+                self.mark_failed(row, e, permanent=True)
+            except Exception as e:
+                print(f"Error sending email {row['id']}: {str(e)}")
+                self.mark_failed(row, e)
+                # Anything but a plain SMTP reply may have left the session
+                # unusable; start the next message on a fresh one
+                if not isinstance(e, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+                    session.close()
+
+    def _run_worker(self):
+        session = SMTPSession(get_smtp_config())
+        while True:
+            try:
+                rows = self.claim()
+                if rows:
+                    self.deliver(session, rows)
+                    continue
+
+                if session.server is not None and time.monotonic() - session.last_used > self.idle_seconds:
+                    session.close()
+                if time.time() - self._last_purged > 3600:
+                    self._last_purged = time.time()
+                    self.purge_sent()
+
+                due_in = self.next_due_in()
+                timeout = self.idle_seconds if due_in is None else min(due_in, self.idle_seconds)
+                with self._wakeup:
+                    self._wakeup.wait(timeout)
+            except Exception as e:
+                print(f"Email outbox worker error: {str(e)}")
+                time.sleep(5)
+
+    def start(self):
+        """Start the worker threads if they aren't running"""
+        with self._threads_lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            for index in range(len(self._threads), self.workers):
+                thread = threading.Thread(target=self._run_worker, name=f'email-outbox-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_email_outbox():
+    """Return the process-wide outbox"""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = EmailOutbox()
+        return _outbox
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Inspect or drain the outgoing email queue')
+    parser.add_argument('--retry-failed', action='store_true', help='Requeue messages that exhausted their retries')
+    parser.add_argument('--drain', action='store_true', help='Send everything that is due, then exit')
+    args = parser.parse_args()
+
+    outbox = get_email_outbox()
+    if args.retry_failed:
+        print(f"Requeued {outbox.retry_failed()} messages")
+    if args.drain:
+        session = SMTPSession(get_smtp_config())
+        while True:
+            rows = outbox.claim()
+            if not rows:
+                break
+            outbox.deliver(session, rows)
+        session.close()
+    print(outbox.stats())
@@ -7,9 +7,80 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+def get_smtp_config():
+    """Read the SMTP settings from the environment"""
+    username = os.environ.get('SMTP_USERNAME')
+    return {
+        'server': os.environ.get('SMTP_SERVER', 'smtp.gmail.com'),
+        'port': int(os.environ.get('SMTP_PORT', 587)),
+        'username': username,
+        'password': os.environ.get('SMTP_PASSWORD'),
+        'sender': os.environ.get('SENDER_EMAIL', username)
+    }
+
+def build_message(sender_email, recipient_email, subject, message_body):
+    """Build an HTML email message"""
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = sender_email
+    msg['To'] = recipient_email
+    
+    # Attach HTML content
+    html_part = MIMEText(message_body, 'html')
+    msg.attach(html_part)
+    return msg
+
 def send_email(recipient_email, subject, message_body):
     """
-    Send an email using SMTP
+    Queue an email for delivery by the background outbox
+    
+    Returns immediately; the outbox workers send the message and retry
+    transient failures. Set EMAIL_OUTBOX=false to send synchronously.
+    
+    Args:
+        recipient_email (str): The recipient's email address
+        subject (str): The email subject
+        message_body (str): The email body (HTML format supported)
+    
+    Returns:
+        bool: True if email was queued (or sent) successfully, False otherwise
+    """
+    if os.environ.get('EMAIL_OUTBOX', 'true').lower() in ('0', 'false', 'no'):
+        return send_email_now(recipient_email, subject, message_body)
+
+    return send_bulk_email([recipient_email], subject, message_body)
+
+def send_bulk_email(recipient_emails, subject, message_body):
+    """
+    Queue the same email for many recipients in one outbox transaction
+    
+    Args:
+        recipient_emails (list): The recipients' email addresses
+        subject (str): The email subject
+        message_body (str): The email body (HTML format supported)
+    
+    Returns:
+        bool: True if the emails were queued, False otherwise
+    """
+    try:
+        config = get_smtp_config()
+        
+        # Check if credentials are available
+        if not all([config['username'], config['password']]):
+            print("SMTP credentials not configured. Email not sent.")
+            return False
+        
+        from app.utils.email_outbox import get_email_outbox
+        get_email_outbox().enqueue_many([(recipient, subject, message_body) for recipient in recipient_emails])
+        return True
+    
+    except Exception as e:
+        print(f"Error queueing email: {str(e)}")
+        return False
+
+def send_email_now(recipient_email, subject, message_body):
+    """
+    Send an email using SMTP, blocking until the server accepts it
     
     Args:
         recipient_email (str): The recipient's email address
@@ -20,32 +91,20 @@ def send_email(recipient_email, subject, message_body):
         bool: True if email was sent successfully, False otherwise
     """
     try:
-        # Get email configuration from environment variables
-        smtp_server = os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
-        smtp_port = int(os.environ.get('SMTP_PORT', 587))
-        smtp_username = os.environ.get('SMTP_USERNAME')
-        smtp_password = os.environ.get('SMTP_PASSWORD')
-        sender_email = os.environ.get('SENDER_EMAIL', smtp_username)
+        config = get_smtp_config()
         
         # Check if credentials are available
-        if not all([smtp_username, smtp_password]):
+        if not all([config['username'], config['password']]):
             print("SMTP credentials not configured. Email not sent.")
             return False
         
         # Create message
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = subject
-        msg['From'] = sender_email
-        msg['To'] = recipient_email
-        
-        # Attach HTML content
-        html_part = MIMEText(message_body, 'html')
-        msg.attach(html_part)
+        msg = build_message(config['sender'], recipient_email, subject, message_body)
         
         # Send email
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
+        with smtplib.SMTP(config['server'], config['port']) as server:
             server.starttls()
-            server.login(smtp_username, smtp_password)
+            server.login(config['username'], config['password'])
             server.send_message(msg)
         
         return True
@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import uuid
+import threading
+from collections import deque, namedtuple
+
+# Events kept per user so reconnecting clients can catch up (Last-Event-ID)
+DEFAULT_HISTORY_SIZE = 50
+
+# Channels nobody listens to are dropped after this long without events
+DEFAULT_IDLE_SECONDS = 600
+
+# Redis pub/sub channel the workers relay events over
+RELAY_CHANNEL = 'pantherfinder:events'
+
+Event = namedtuple('Event', ['id', 'event', 'data'])
+
+
+class _Channel:
+    def __init__(self, history_size):
+        self.history = deque(maxlen=history_size)
+        self.condition = threading.Condition()
+        self.listeners = 0
+        self.last_active = time.monotonic()
+
+
+class EventBus:
+    """
+    In-process publish/subscribe of per-user events.
+
+    Each user has a channel holding their most recent events. Listeners wait
+    on that channel's condition only, so publishing to one user never wakes
+    the connections of everyone else. Event ids increase across restarts
+    (they are derived from the clock), so a Last-Event-ID sent by a client
+    after a redeploy never hides new events.
+
+    The waits are plain threading primitives; under a gevent worker they are
+    monkey-patched into cooperative ones, which is what lets a single worker
+    hold thousands of idle streams.
+
+    On its own the bus only reaches connections held by this process. With a
+    relay attached (see start_relay) every publish is also sent to the other
+    workers, which deliver it to their own connections.
+    """
+
+    def __init__(self, history_size=DEFAULT_HISTORY_SIZE, idle_seconds=DEFAULT_IDLE_SECONDS):
+        self.history_size = history_size
+        self.idle_seconds = idle_seconds
+        self.relay = None
+        self._channels = {}
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._last_pruned = time.monotonic()
+
+    def _next_id(self):
+        # Caller holds self._lock
+        self._last_id = max(self._last_id + 1, time.time_ns() // 1000)
+        return self._last_id
+
+    def _channel(self, user_id):
+        # Caller holds self._lock
+        channel = self._channels.get(user_id)
+        if channel is None:
+            channel = self._channels[user_id] = _Channel(self.history_size)
+        return channel
+
+    def _prune(self):
+        # Caller holds self._lock
+        now = time.monotonic()
+        if now - self._last_pruned < self.idle_seconds:
+            return
+        self._last_pruned = now
+        for user_id, channel in list(self._channels.items()):
+            if channel.listeners == 0 and now - channel.last_active > self.idle_seconds:
+                del self._channels[user_id]
+
+    def publish(self, user_ids, event, data=None):
+        """
+        Publish an event to each of the given users
+
+        Args:
+            user_ids (iterable): Recipient user ids
+            event (str): Event name, e.g. 'notification' or 'message'
+            data: JSON-serializable payload
+        """
+        user_ids = [str(user_id) for user_id in user_ids if user_id]
+        self.deliver(user_ids, event, data)
+        if self.relay is not None and user_ids:
+            self.relay.send(user_ids, event, data)
+
+    def deliver(self, user_ids, event, data=None):
+        """Hand an event to this process's listeners only"""
+        for user_id in set(user_ids):
+            with self._lock:
+                self._prune()
+                channel = self._channel(user_id)
+                item = Event(self._next_id(), event, data)
+            with channel.condition:
+                channel.history.append(item)
+                channel.last_active = time.monotonic()
+                channel.condition.notify_all()
+
+    def last_event_id(self, user_id):
+        """Id of the newest event held for a user, or 0"""
+        with self._lock:
+            channel = self._channels.get(str(user_id))
+        if channel is None:
+            return 0
+        with channel.condition:
+            return channel.history[-1].id if channel.history else 0
+
+    def wait(self, user_id, after_id=0, timeout=None):
+        """
+        Return a user's events newer than after_id, waiting for one if needed
+
+        Args:
+            user_id (str): The listening user
+            after_id (int): Id of the last event the caller has seen
+            timeout (float): Seconds to wait; None waits indefinitely
+
+        Returns:
+            list: Events in publish order, empty if the timeout passed
+        """
+        user_id = str(user_id)
+        with self._lock:
+            channel = self._channel(user_id)
+            channel.listeners += 1
+        try:
+            with channel.condition:
+                pending = [item for item in channel.history if item.id > after_id]
+                if not pending:
+                    channel.condition.wait(timeout)
+                    pending = [item for item in channel.history if item.id > after_id]
+                return pending
+        finally:
+            with self._lock:
+                channel.listeners -= 1
+                channel.last_active = time.monotonic()
+
+
+class RedisRelay:
+    """
+    Fans events out across worker processes over Redis pub/sub.
+
+    Each worker publishes what it delivers locally and runs one subscriber
+    thread that delivers what the other workers publish. Messages carry the
+    sending worker's id so nothing is delivered twice. Event ids are assigned
+    by each worker as it delivers, keeping them increasing per process.
+    """
+
+    def __init__(self, bus, url, channel=RELAY_CHANNEL):
+        import redis
+
+        self.bus = bus
+        self.channel = channel
+        self.origin = uuid.uuid4().hex
+        self.client = redis.Redis.from_url(url)
+
+    def send(self, user_ids, event, data):
+        try:
+            self.client.publish(self.channel, json.dumps({
+                'origin': self.origin,
+                'user_ids': user_ids,
+                'event': event,
+                'data': data
+            }, default=str))
+        except Exception as e:
+            print(f"Error relaying {event} event: {str(e)}")
+
+    def listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    payload = json.loads(message['data'])
+                    if payload.get('origin') == self.origin:
+                        continue
+                    self.bus.deliver(payload.get('user_ids') or [], payload.get('event'), payload.get('data'))
+            except Exception as e:
+                print(f"Event relay disconnected, retrying: {str(e)}")
+                time.sleep(1)
+
+
+event_bus = EventBus()
+
+
+def start_relay(url=None):
+    """
+    Relay the process-wide bus through Redis so every worker sees every event
+
+    Requires the redis package. Without a URL (argument or EVENT_BUS_REDIS_URL)
+    the bus stays in-process.
+
+    Returns:
+        RedisRelay: The started relay, or None
+    """
+    url = url or os.environ.get('EVENT_BUS_REDIS_URL')
+    if not url or event_bus.relay is not None:
+        return event_bus.relay
+
+    try:
+        relay = RedisRelay(event_bus, url)
+    except ImportError:
+        print("EVENT_BUS_REDIS_URL is set but redis is not installed; events stay in-process")
+        return None
+
+    threading.Thread(target=relay.listen, name='event-relay', daemon=True).start()
+    event_bus.relay = relay
+    return relay
+
+
+def publish(user_ids, event, data=None):
+    """
+    Publish an event on the process-wide bus, never raising
+
+    Streaming is best-effort: a failure here must not fail the write that
+    triggered it.
+    """
+    try:
+        event_bus.publish(user_ids, event, data)
+    except Exception as e:
+        print(f"Error publishing {event} event: {str(e)}")
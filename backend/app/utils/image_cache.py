@@ -0,0 +1,141 @@
+import os
+import uuid
+import hashlib
+import threading
+from flask import current_app
+
+# Default size of the on-disk variant cache (overridable through IMAGE_CACHE_MAX_BYTES)
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 512 MB
+
+# When the cache overflows, evict until it is back under this fraction of the limit
+EVICT_TO_RATIO = 0.9
+
+
+class ImageCache:
+    """
+    Size-bounded LRU cache of rendered image variants on disk.
+
+    Recency is tracked through file modification times: a hit touches the
+    file, eviction removes the least recently touched files first. The running
+    total is kept in memory and re-synced from disk whenever we evict, so
+    several workers sharing the same directory stay roughly within the limit.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = None
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts):
+        """Build a cache key from the parts that identify a variant"""
+        return hashlib.sha256('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+    def path_for(self, key, ext):
+        # Shard by key prefix so a single directory doesn't grow huge
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{ext}")
+
+    def get(self, key, ext):
+        """
+        Look up a cached variant
+
+        Returns:
+            str: The absolute path of the cached file, or None on a miss
+        """
+        path = self.path_for(key, ext)
+        try:
+            os.utime(path, None)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, ext, render):
+        """
+        Render a variant into the cache
+
+        Args:
+            key (str): The cache key
+            ext (str): The file extension of the variant
+            render (callable): Called with a temporary path to write the variant to
+
+        Returns:
+            str: The absolute path of the cached file
+        """
+        path = self.path_for(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Render to a private temp file, then publish atomically so concurrent
+        # requests for the same variant never see a half-written file
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            render(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        self._account(os.path.getsize(path))
+        return path
+
+    def _scan(self):
+        """Return (mtime, size, path) for every cached file"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _account(self, added_bytes):
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._scan())
+            else:
+                self._total_bytes += added_bytes
+
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = self._scan()
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * EVICT_TO_RATIO)
+
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                total -= size
+
+        self._total_bytes = total
+
+
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+
+def get_image_cache():
+    """Return the process-wide ImageCache, creating it on first use"""
+    global _image_cache
+    if _image_cache is None:
+        with _image_cache_lock:
+            if _image_cache is None:
+                cache_dir = current_app.config.get(
+                    'IMAGE_CACHE_FOLDER',
+                    os.path.join(current_app.instance_path, 'image_cache')
+                )
+                max_bytes = int(os.environ.get('IMAGE_CACHE_MAX_BYTES', DEFAULT_CACHE_MAX_BYTES))
+                _image_cache = ImageCache(cache_dir, max_bytes=max_bytes)
+    return _image_cache
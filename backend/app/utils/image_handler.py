@@ -1,8 +1,110 @@
 import os
 import uuid
+import tempfile
+import mimetypes
 from PIL import Image
 from werkzeug.utils import secure_filename
-from flask import current_app
+
+# EXIF tag holding the camera orientation
+EXIF_ORIENTATION = 0x0112
+
+# Transpose needed to display each EXIF orientation upright
+ORIENTATION_TRANSPOSE = {
+    2: Image.FLIP_LEFT_RIGHT,
+    3: Image.ROTATE_180,
+    4: Image.FLIP_TOP_BOTTOM,
+    5: Image.TRANSPOSE,
+    6: Image.ROTATE_270,
+    7: Image.TRANSVERSE,
+    8: Image.ROTATE_90,
+}
+
+# Resampling filter by the longest side of the output. Small thumbnails
+# can't show the extra sharpness of Lanczos, so they use the cheaper bicubic.
+RESAMPLE_FILTERS = [
+    (320, Image.BICUBIC),
+    (None, Image.LANCZOS),
+]
+
+# Keep at least this much headroom over the target when pre-shrinking, so the
+# final resample still has enough pixels to filter properly
+REDUCE_HEADROOM = 2
+
+def pick_resample_filter(size):
+    """Return the resampling filter to use for an output of the given size"""
+    longest = max(size)
+    for limit, resample in RESAMPLE_FILTERS:
+        if limit is None or longest <= limit:
+            return resample
+    return Image.LANCZOS
+
+def open_scaled(source, max_size):
+    """
+    Open an image already scaled down to fit within max_size and rotated upright
+
+    JPEGs are decoded at a reduced scale with draft mode, so a 12MP phone
+    photo is never fully decoded when we only need an 800px copy. Other
+    formats are pre-shrunk with a cheap integer reduce before the final
+    resample. EXIF orientation is applied on the small image.
+
+    Args:
+        source: A path or file object
+        max_size (tuple): Maximum (width, height) of the upright image, either
+            may be None to only bound the other
+
+    Returns:
+        Image: A loaded image that no longer depends on source
+    """
+    with Image.open(source) as src:
+        orientation = src.getexif().get(EXIF_ORIENTATION, 1)
+
+        # Orientations 5-8 are rotated by 90 degrees, so the stored axes are swapped
+        swapped = orientation in (5, 6, 7, 8)
+        width, height = (src.height, src.width) if swapped else src.size
+
+        # A missing bound follows the aspect ratio of the other one
+        max_width, max_height = max_size
+        if max_width is None:
+            max_width = max(1, round(width * max_height / height))
+        if max_height is None:
+            max_height = max(1, round(height * max_width / width))
+        box = (max_height, max_width) if swapped else (max_width, max_height)
+
+        if src.format == 'JPEG':
+            # Lets libjpeg scale by 1/2, 1/4 or 1/8 while decoding, never below box
+            src.draft(src.mode, box)
+
+        img = src
+        if img.mode in ('P', '1'):
+            # Palette images can't be reduced or filtered directly
+            img = img.convert('RGBA')
+
+        factor = min(img.width // box[0], img.height // box[1]) // REDUCE_HEADROOM
+        if factor > 1:
+            img = img.reduce(factor)
+
+        if img.width > box[0] or img.height > box[1]:
+            scale = min(box[0] / img.width, box[1] / img.height)
+            size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+            img = img.resize(size, pick_resample_filter(size))
+
+        transpose = ORIENTATION_TRANSPOSE.get(orientation)
+        if transpose is not None:
+            img = img.transpose(transpose)
+
+        if img is src:
+            img = src.copy()
+
+    return img
+
+def flatten_transparency(img):
+    """Composite an image with transparency onto a white RGB background"""
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[3])
+        return background
+    return img
 
 def save_image(file, folder='uploads', allowed_extensions=None, max_size=(800, 800)):
     """
@@ -10,13 +112,15 @@ def save_image(file, folder='uploads', allowed_extensions=None, max_size=(800, 8
     
     Args:
         file: The uploaded file object
-        folder (str): The subfolder within static to save the image
+        folder (str): Key prefix within the storage backend ('uploads' stores at the root)
         allowed_extensions (list): List of allowed file extensions
         max_size (tuple): Maximum dimensions for the image
     
     Returns:
-        str: The relative path to the saved image, or None if failed
+        str: The URL of the saved image, or None if failed
     """
+    from app.utils.storage import get_storage
+
     if not file:
         return None
     
@@ -32,36 +136,28 @@ def save_image(file, folder='uploads', allowed_extensions=None, max_size=(800, 8
     
     # Generate a unique filename
     unique_filename = f"{uuid.uuid4().hex}.{ext}"
+    key = unique_filename if folder == 'uploads' else f"{folder}/{unique_filename}"
     
-    # Create the upload directory if it doesn't exist
-    upload_folder = os.path.join(current_app.static_folder, folder)
-    os.makedirs(upload_folder, exist_ok=True)
-    
-    # Save the file path
-    file_path = os.path.join(upload_folder, unique_filename)
+    # Process in a scratch file, then hand it to the storage backend
+    fd, file_path = tempfile.mkstemp(suffix=f".{ext}")
+    os.close(fd)
     
     # Process and save the image
     try:
         # Save the original file temporarily
         file.save(file_path)
         
-        # Open the image with PIL
-        with Image.open(file_path) as img:
-            # Convert to RGB if needed (for PNG with transparency)
-            if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                background.paste(img, mask=img.split()[3] if img.mode == 'RGBA' else None)
-                img = background
-            
-            # Resize if larger than max_size
-            if img.width > max_size[0] or img.height > max_size[1]:
-                img.thumbnail(max_size, Image.LANCZOS)
-            
-            # Save the processed image
-            img.save(file_path, optimize=True, quality=85)
+        # Decode at reduced scale, rotate upright and resize in one pass
+        img = open_scaled(file_path, max_size)
+
+        # Convert to RGB if needed (for PNG with transparency)
+        img = flatten_transparency(img)
+
+        # Save the processed image
+        img.save(file_path, optimize=True, quality=85)
         
-        # Return the relative path for database storage
-        return f"/static/{folder}/{unique_filename}"
+        # Return the URL for database storage
+        return get_storage().save_file(file_path, key, content_type=mimetypes.guess_type(unique_filename)[0])
     
     except Exception as e:
         print(f"Error processing image: {str(e)}")
@@ -75,24 +171,58 @@ def delete_image(image_path):
     Delete an image file
     
     Args:
-        image_path (str): The relative path to the image
+        image_path (str): The URL of the image as stored in the database
     
     Returns:
         bool: True if deleted successfully, False otherwise
     """
-    if not image_path or not image_path.startswith('/static/'):
+    from app.utils.storage import get_storage
+
+    storage = get_storage()
+    key = storage.key_from_url(image_path)
+    if not key:
         return False
     
     try:
-        # Get the absolute path
-        abs_path = os.path.join(current_app.root_path, '..', image_path.lstrip('/'))
-        
-        # Check if file exists and delete it
-        if os.path.exists(abs_path):
-            os.remove(abs_path)
-            return True
-        return False
+        return storage.delete(key)
     
     except Exception as e:
         print(f"Error deleting image: {str(e)}")
-        return False
\ No newline at end of file
+        return False
+
+
+# Output formats supported when rendering resized variants
+VARIANT_FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'webp': ('WEBP', 'image/webp'),
+    'png': ('PNG', 'image/png'),
+}
+
+def render_variant(source, dest_path, width, fmt='jpeg', quality=85):
+    """
+    Render a resized copy of an image
+
+    Args:
+        source: Path or seekable file object of the original image
+        dest_path (str): Absolute path to write the resized image to
+        width (int): Maximum width of the output, the height keeps the aspect ratio
+        fmt (str): Output format, one of VARIANT_FORMATS
+        quality (int): Encoder quality for lossy formats
+
+    Returns:
+        str: dest_path once the variant has been written
+    """
+    pil_format = VARIANT_FORMATS[fmt][0]
+
+    # Only ever scale down; the height follows the aspect ratio
+    img = open_scaled(source, (width, None))
+
+    # Flatten transparency for formats that can't store it
+    if pil_format == 'JPEG':
+        img = flatten_transparency(img)
+    if img.mode not in ('RGB', 'RGBA', 'L'):
+        img = img.convert('RGB')
+
+    img.save(dest_path, format=pil_format, optimize=True, quality=quality)
+
+    return dest_path
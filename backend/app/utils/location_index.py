@@ -0,0 +1,134 @@
+import os
+import time
+import threading
+import numpy as np
+from scipy.spatial import cKDTree
+from app.utils.supabase import get_supabase_client
+
+supabase = get_supabase_client()
+
+# Mean Earth radius
+EARTH_RADIUS_KM = 6371.0088
+
+# How long a loaded index is reused before locations are re-read; writes in
+# this process rebuild it straight away, the TTL catches other workers' writes
+DEFAULT_INDEX_TTL = 300  # seconds
+
+LOCATION_FIELDS = 'id, name, address, contact_person, phone_number, latitude, longitude'
+
+
+def to_unit_vectors(latitudes, longitudes):
+    """Convert degrees to points on the unit sphere, shape (n, 3)"""
+    lat = np.radians(latitudes)
+    lng = np.radians(longitudes)
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lng), cos_lat * np.sin(lng), np.sin(lat)))
+
+
+def chord_to_km(chord):
+    """Great-circle distance for a straight-line distance between unit vectors"""
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1))
+
+
+def km_to_chord(km):
+    return 2 * np.sin(min(km / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+class LocationIndex:
+    """
+    Nearest-neighbour lookups over drop-off locations.
+
+    Coordinates are held as unit-sphere vectors, where straight-line (chord)
+    distance increases with great-circle distance, so a KD-tree over them
+    answers k-nearest and radius queries exactly.
+    """
+
+    def __init__(self, locations):
+        self.locations = [
+            location for location in locations
+            if location.get('latitude') is not None and location.get('longitude') is not None
+        ]
+        self.latitudes = np.array([float(location['latitude']) for location in self.locations])
+        self.longitudes = np.array([float(location['longitude']) for location in self.locations])
+        self.points = to_unit_vectors(self.latitudes, self.longitudes)
+
+        self.tree = cKDTree(self.points) if self.locations else None
+
+    def __len__(self):
+        return len(self.locations)
+
+    def nearest(self, latitude, longitude, k=1):
+        """
+        Return the k closest locations
+
+        Args:
+            latitude (float): Query latitude in degrees
+            longitude (float): Query longitude in degrees
+            k (int): Number of locations to return
+
+        Returns:
+            list: (location dict, distance in km) pairs, closest first
+        """
+        k = min(k, len(self.locations))
+        if k <= 0:
+            return []
+
+        chords, indexes = self.tree.query(to_unit_vectors([latitude], [longitude])[0], k=k)
+        distances = chord_to_km(np.atleast_1d(chords))
+        indexes = np.atleast_1d(indexes)
+
+        return [(self.locations[i], float(d)) for i, d in zip(indexes, distances)]
+
+    def within(self, latitude, longitude, radius_km, limit=None):
+        """
+        Return the locations within radius_km, closest first
+
+        Args:
+            latitude (float): Query latitude in degrees
+            longitude (float): Query longitude in degrees
+            radius_km (float): Search radius
+            limit (int): Return at most this many
+
+        Returns:
+            list: (location dict, distance in km) pairs
+        """
+        if not self.locations:
+            return []
+
+        point = to_unit_vectors([latitude], [longitude])[0]
+        indexes = np.array(self.tree.query_ball_point(point, km_to_chord(radius_km)), dtype=int)
+        distances = chord_to_km(np.linalg.norm(self.points[indexes] - point, axis=1))
+
+        order = np.argsort(distances)[:limit]
+        return [(self.locations[indexes[i]], float(distances[i])) for i in order]
+
+
+_index = None
+_index_loaded_at = 0
+_index_lock = threading.Lock()
+
+
+def get_location_index():
+    """
+    Return the index over all drop-off locations with coordinates, loading
+    it when missing or older than LOCATION_INDEX_TTL_SECONDS
+
+    Returns:
+        LocationIndex: The current index
+    """
+    global _index, _index_loaded_at
+    ttl = int(os.environ.get('LOCATION_INDEX_TTL_SECONDS', DEFAULT_INDEX_TTL))
+
+    with _index_lock:
+        if _index is None or time.monotonic() - _index_loaded_at > ttl:
+            result = supabase.table('drop_off_locations').select(LOCATION_FIELDS).execute()
+            _index = LocationIndex(result.data or [])
+            _index_loaded_at = time.monotonic()
+        return _index
+
+
+def invalidate_location_index():
+    """Force the next lookup to reload locations after one was written"""
+    global _index
+    with _index_lock:
+        _index = None
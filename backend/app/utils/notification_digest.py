@@ -0,0 +1,148 @@
+import time
+import argparse
+import threading
+from html import escape
+from app.utils.supabase import get_supabase_client
+from app.utils.email_service import send_email
+from app.utils.sms_service import send_sms
+
+supabase = get_supabase_client()
+
+FREQUENCIES = ('hourly', 'daily')
+
+# Users handled per round trip
+DEFAULT_BATCH_SIZE = 500
+
+# Notices listed in one digest; the rest are summarized as a count
+MAX_DIGEST_ITEMS = 20
+
+
+def describe(notification):
+    """One digest line for a (possibly coalesced) notification"""
+    message = notification.get('message') or ''
+    count = notification.get('event_count') or 1
+    # Summarized rows already mention their count
+    if count > 1 and str(count) not in message:
+        return f"{message} (x{count})"
+    return message
+
+
+def render_digest_email(notifications, frequency):
+    """
+    Build the subject and HTML body of a digest email
+
+    Returns:
+        tuple: (subject, html_body)
+    """
+    shown = notifications[:MAX_DIGEST_ITEMS]
+    items = ''.join(f"<li>{escape(describe(notification))}</li>" for notification in shown)
+    more = len(notifications) - len(shown)
+    if more > 0:
+        items += f"<li>...and {more} more</li>"
+
+    period = 'hour' if frequency == 'hourly' else 'day'
+    subject = f"Lost & Found: {len(notifications)} new notification{'s' if len(notifications) != 1 else ''}"
+    html_body = f"""
+    <html>
+    <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+            <h2>Your Lost & Found digest</h2>
+            <p>Here is what happened in the last {period}:</p>
+            <ul>{items}</ul>
+            <p>Please log in to your account to view more details.</p>
+            <p style="font-size: 12px; color: #777;">You can change how often you receive these emails in your profile.</p>
+        </div>
+    </body>
+    </html>
+    """
+    return subject, html_body
+
+
+def send_due_digests(frequency, batch_size=DEFAULT_BATCH_SIZE, logger=None):
+    """
+    Send every digest of the given frequency that is due
+
+    Args:
+        frequency (str): 'hourly' or 'daily'
+        batch_size (int): Users fetched per round trip
+
+    Returns:
+        dict: Counts of users, emails and sms sent
+    """
+    log = logger.info if logger else print
+    stats = {'users': 0, 'emails': 0, 'sms': 0}
+
+    while True:
+        # Claiming advances each user's last_digest_at, which takes them out
+        # of the next page and out of other workers' runs
+        result = supabase.rpc('claim_due_notification_digests', {
+            'p_frequency': frequency,
+            'p_limit': batch_size
+        }).execute()
+        digests = result.data or []
+        if not digests:
+            break
+
+        for digest in digests:
+            notifications = digest.get('notifications') or []
+
+            # Emails and SMS only go into the outbox and dispatcher here;
+            # delivery happens in the background
+            if digest.get('email'):
+                subject, html_body = render_digest_email(notifications, frequency)
+                if send_email(digest['email'], subject, html_body):
+                    stats['emails'] += 1
+            if digest.get('digest_sms') and digest.get('phone'):
+                lines = [describe(notification) for notification in notifications[:5]]
+                if len(notifications) > 5:
+                    lines.append(f"...and {len(notifications) - 5} more")
+                if send_sms(digest['phone'], '\n'.join(lines), header=f"Lost & Found digest ({len(notifications)})"):
+                    stats['sms'] += 1
+
+        stats['users'] += len(digests)
+
+        if len(digests) < batch_size:
+            break
+
+    log(f"Sent {frequency} digests to {stats['users']} users ({stats['emails']} emails, {stats['sms']} sms)")
+    return stats
+
+
+def start_digest_scheduler(app, interval_seconds):
+    """
+    Check for due hourly and daily digests periodically in a daemon thread
+
+    Each user's own last_digest_at decides whether their digest is due, so
+    the interval only bounds how late a digest can go out. Every worker runs
+    one; users are claimed in the database, so each digest is sent once.
+
+    Returns:
+        threading.Thread: The started thread
+    """
+    def run():
+        while True:
+            time.sleep(interval_seconds)
+            for frequency in FREQUENCIES:
+                try:
+                    send_due_digests(frequency, logger=app.logger)
+                except Exception as e:
+                    app.logger.error(f"Sending {frequency} digests failed: {str(e)}")
+
+    thread = threading.Thread(target=run, name='notification-digest', daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Send due notification digests')
+    parser.add_argument('--frequency', choices=FREQUENCIES, action='append',
+                        help='Only send digests of this frequency (repeatable)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    for frequency in args.frequency or FREQUENCIES:
+        send_due_digests(frequency, batch_size=args.batch_size)
+
+    # Give the background senders a chance to deliver before exiting
+    from app.utils.sms_dispatcher import get_sms_dispatcher
+    get_sms_dispatcher().flush(timeout=60)
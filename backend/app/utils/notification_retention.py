@@ -0,0 +1,125 @@
+import os
+import time
+import argparse
+import threading
+from app.utils.supabase import get_supabase_client
+from app.utils.upload_gc import sweep_lock
+
+supabase = get_supabase_client()
+
+# Defaults (overridable through environment variables or CLI flags)
+DEFAULT_RETENTION_DAYS = 90
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_BATCH_PAUSE_SECONDS = 0.5
+DEFAULT_MAX_BATCHES = 200
+
+
+def archive_notifications(older_than_days=DEFAULT_RETENTION_DAYS, batch_size=DEFAULT_BATCH_SIZE,
+                          max_batches=DEFAULT_MAX_BATCHES, pause_seconds=DEFAULT_BATCH_PAUSE_SECONDS,
+                          archive_keep_months=None, logger=None):
+    """
+    Move read notifications past retention into the monthly archive
+
+    Each batch is its own short transaction (see
+    sql/create_notification_archive.sql), with a pause in between so a large
+    backlog drains without holding locks or saturating the database.
+
+    Args:
+        older_than_days (int): Only read notifications older than this move
+        batch_size (int): Rows moved per transaction
+        max_batches (int): Stop after this many batches; the next run resumes
+        pause_seconds (float): Sleep between batches
+        archive_keep_months (int): Also drop archive months older than this
+
+    Returns:
+        dict: Counts of rows moved, batches run and partitions created/dropped
+    """
+    log = logger.info if logger else print
+    stats = {'moved': 0, 'batches': 0, 'partitions_created': 0, 'partitions_dropped': 0}
+
+    # Make sure every month we are about to move into has its partition
+    result = supabase.rpc('ensure_notification_archive_partitions', {}).execute()
+    stats['partitions_created'] = result.data or 0
+
+    while stats['batches'] < max_batches:
+        result = supabase.rpc('archive_read_notifications', {
+            'p_older_than_days': older_than_days,
+            'p_batch_size': batch_size
+        }).execute()
+        moved = result.data or 0
+        stats['moved'] += moved
+        stats['batches'] += 1
+        if moved < batch_size:
+            break
+        time.sleep(pause_seconds)
+
+    if archive_keep_months:
+        result = supabase.rpc('drop_notification_archive_partitions', {'p_keep_months': archive_keep_months}).execute()
+        stats['partitions_dropped'] = result.data or 0
+
+    log(f"Archived {stats['moved']} notifications in {stats['batches']} batches, "
+        f"{stats['partitions_created']} partitions created, {stats['partitions_dropped']} dropped")
+    return stats
+
+
+def archive_from_config(logger=None):
+    """Run the archiver with settings from the environment"""
+    keep_months = int(os.environ.get('NOTIFICATION_ARCHIVE_KEEP_MONTHS', 0))
+    return archive_notifications(
+        older_than_days=int(os.environ.get('NOTIFICATION_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)),
+        batch_size=int(os.environ.get('NOTIFICATION_ARCHIVE_BATCH_SIZE', DEFAULT_BATCH_SIZE)),
+        archive_keep_months=keep_months or None,
+        logger=logger,
+    )
+
+
+def get_archive_lock_path(app):
+    return os.environ.get('NOTIFICATION_ARCHIVE_LOCK_PATH', os.path.join(app.instance_path, 'notification_archive.lock'))
+
+
+def start_notification_archiver(app, interval_seconds):
+    """
+    Run the archiver periodically in a daemon thread
+
+    Every worker starts one; a run only goes ahead in the worker that holds
+    the archive lock (see upload_gc.sweep_lock), the others skip the tick.
+
+    Args:
+        app: The Flask application
+        interval_seconds (int): Seconds between runs
+
+    Returns:
+        threading.Thread: The started thread
+    """
+    def run():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                with sweep_lock(get_archive_lock_path(app)) as locked:
+                    if not locked:
+                        app.logger.info("Notification archiving skipped: another process is archiving")
+                        continue
+                    archive_from_config(logger=app.logger)
+            except Exception as e:
+                app.logger.error(f"Notification archiving failed: {str(e)}")
+
+    thread = threading.Thread(target=run, name='notification-archiver', daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Move old read notifications into the archive')
+    parser.add_argument('--older-than-days', type=int, default=DEFAULT_RETENTION_DAYS)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--max-batches', type=int, default=DEFAULT_MAX_BATCHES)
+    parser.add_argument('--keep-months', type=int, default=None,
+                        help='Drop archive partitions older than this many months')
+    args = parser.parse_args()
+
+    archive_notifications(
+        older_than_days=args.older_than_days,
+        batch_size=args.batch_size,
+        max_batches=args.max_batches,
+        archive_keep_months=args.keep_months,
+    )
@@ -0,0 +1,237 @@
+import os
+import time
+import queue
+import threading
+from datetime import datetime
+from app.utils.supabase import get_supabase_client
+from app.utils.ttl_cache import TTLCache
+from app.utils.badge_counters import invalidate_badge_counters
+from app.utils.event_bus import publish
+
+supabase = get_supabase_client()
+
+# How long the admin roster is reused before it is re-read from Supabase
+DEFAULT_ADMIN_ROSTER_TTL = 300  # seconds
+
+# Same-key notifications this close together are folded into one row
+DEFAULT_COALESCE_WINDOW = 3600  # seconds
+
+# Unread badge counts, read from the notification_counters table
+unread_count_cache = TTLCache(ttl=int(os.environ.get('NOTIFICATION_UNREAD_TTL_SECONDS', 5)))
+
+_admin_roster = None
+_admin_roster_loaded_at = 0
+_admin_roster_lock = threading.Lock()
+
+
+def get_admin_ids():
+    """
+    Return the ids of all admin users, cached for ADMIN_ROSTER_TTL_SECONDS
+
+    Returns:
+        list: Admin user ids
+    """
+    global _admin_roster, _admin_roster_loaded_at
+    ttl = int(os.environ.get('ADMIN_ROSTER_TTL_SECONDS', DEFAULT_ADMIN_ROSTER_TTL))
+
+    with _admin_roster_lock:
+        if _admin_roster is None or time.monotonic() - _admin_roster_loaded_at > ttl:
+            result = supabase.table('users').select('id').eq('role', 'admin').execute()
+            _admin_roster = [row.get('id') for row in (result.data or [])]
+            _admin_roster_loaded_at = time.monotonic()
+        return list(_admin_roster)
+
+
+def invalidate_admin_roster():
+    """Force the next get_admin_ids call to re-read the roster"""
+    global _admin_roster
+    with _admin_roster_lock:
+        _admin_roster = None
+
+
+def get_unread_notification_count(user_id):
+    """
+    Return a user's unread notification count
+
+    Served from the in-process cache when fresh, otherwise read from the
+    incrementally maintained counter (see sql/create_notification_inbox.sql).
+    """
+    count = unread_count_cache.get(user_id)
+    if count is None:
+        result = supabase.rpc('get_unread_notification_count', {'p_user_id': user_id}).execute()
+        count = result.data or 0
+        unread_count_cache.set(user_id, count)
+    return count
+
+
+def invalidate_unread_counts(user_ids):
+    """Drop cached unread counts after notifications for these users changed"""
+    user_ids = set(user_ids)
+    for user_id in user_ids:
+        unread_count_cache.invalidate(user_id)
+    invalidate_badge_counters(user_ids)
+
+
+def invalidate_pending_claim_counts():
+    """Drop admins' cached badge counts after the set of pending claims changed"""
+    invalidate_badge_counters(get_admin_ids())
+
+
+def publish_notifications(rows):
+    """
+    Tell connected clients about newly created notifications
+
+    Drops the recipients' cached unread counts and pushes each row to its
+    recipient's event stream.
+    """
+    invalidate_unread_counts(row.get('user_id') for row in rows)
+    for row in rows:
+        publish([row.get('user_id')], 'notification', row)
+
+
+def publish_read_state(user_ids, data=None):
+    """Tell connected clients that notifications were read or removed"""
+    user_ids = list(user_ids)
+    invalidate_unread_counts(user_ids)
+    publish(user_ids, 'notification-read', data)
+
+
+def build_notification(user_id, message, item_id=None, notification_type='system'):
+    """Build a notification row in the shape the claims and admin endpoints use"""
+    return {
+        'user_id': user_id,
+        'item_id': item_id,
+        'message': message,
+        'notification_type': notification_type,
+        'created_at': datetime.utcnow().isoformat(),
+        'read': False
+    }
+
+
+def insert_notifications(rows):
+    """
+    Insert many notifications in a single round trip
+
+    Args:
+        rows (list): Notification rows
+
+    Returns:
+        list: The inserted rows
+    """
+    if not rows:
+        return []
+    result = supabase.table('notifications').insert(rows).execute()
+    publish_notifications(result.data or rows)
+    return result.data or []
+
+
+def coalesce_notification(row, coalesce_key, summary=None, window_seconds=None):
+    """
+    Insert a notification, or fold it into the recipient's matching unread one
+
+    Notifications with the same coalesce_key (e.g. type, sender and related
+    entity) created within the window become a single row whose event_count
+    grows instead of one row per event.
+
+    Args:
+        row (dict): Notification row
+        coalesce_key (str): Events with the same key are folded together
+        summary (str): Message for a folded row, with %s for the event count
+            (escape any other '%' as '%%')
+        window_seconds (int): Defaults to NOTIFICATION_COALESCE_SECONDS
+
+    Returns:
+        dict: The inserted or updated notification
+    """
+    if window_seconds is None:
+        window_seconds = int(os.environ.get('NOTIFICATION_COALESCE_SECONDS', DEFAULT_COALESCE_WINDOW))
+
+    result = supabase.rpc('upsert_coalesced_notification', {
+        'p_notification': row,
+        'p_coalesce_key': coalesce_key,
+        'p_window_seconds': window_seconds,
+        'p_summary': summary
+    }).execute()
+
+    notification = result.data or row
+    publish_notifications([notification])
+    return notification
+
+
+# Deferred fan-out: a single worker drains a queue of row batches so the
+# request that produced them doesn't wait for the insert
+_fanout_queue = queue.Queue()
+_fanout_worker = None
+_fanout_worker_lock = threading.Lock()
+
+
+def _run_fanout_worker():
+    while True:
+        rows = _fanout_queue.get()
+        try:
+            insert_notifications(rows)
+        except Exception as e:
+            print(f"Error inserting deferred notifications: {str(e)}")
+        finally:
+            _fanout_queue.task_done()
+
+
+def _ensure_fanout_worker():
+    global _fanout_worker
+    with _fanout_worker_lock:
+        if _fanout_worker is None or not _fanout_worker.is_alive():
+            _fanout_worker = threading.Thread(target=_run_fanout_worker, name='notification-fanout', daemon=True)
+            _fanout_worker.start()
+
+
+def fan_out(rows, defer=None):
+    """
+    Write a batch of notifications, optionally in the background
+
+    Args:
+        rows (list): Notification rows
+        defer (bool): Queue the insert instead of waiting for it. Defaults to
+            the NOTIFICATION_FANOUT_ASYNC environment variable
+
+    Returns:
+        list: The inserted rows, or an empty list when deferred
+    """
+    if not rows:
+        return []
+
+    if defer is None:
+        defer = os.environ.get('NOTIFICATION_FANOUT_ASYNC', '').lower() in ('1', 'true', 'yes')
+
+    if defer:
+        _ensure_fanout_worker()
+        _fanout_queue.put(rows)
+        return []
+
+    return insert_notifications(rows)
+
+
+def notify_claim_submitted(item):
+    """
+    Notify every admin and the finder that a claim was submitted for an item
+
+    Args:
+        item (dict): The claimed item
+
+    Returns:
+        list: The inserted notifications, or an empty list when deferred
+    """
+    rows = [
+        build_notification(admin_id, f"New claim submitted for item '{item.get('name')}'",
+                           item_id=item.get('id'), notification_type='claim_update')
+        for admin_id in get_admin_ids()
+    ]
+
+    if item.get('user_found_id'):
+        rows.append(build_notification(
+            item.get('user_found_id'),
+            f"Someone has claimed the item '{item.get('name')}' that you found",
+            item_id=item.get('id'),
+            notification_type='claim_update'
+        ))
+
+    return fan_out(rows)
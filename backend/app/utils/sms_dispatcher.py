@@ -0,0 +1,292 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+DEFAULT_RATE_PER_SECOND = 1.0
+DEFAULT_BURST = 5
+DEFAULT_WORKERS = 2
+
+# Notices for the same phone queued within this window go out as one SMS
+DEFAULT_COALESCE_SECONDS = 2.0
+
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_RETRY_SECONDS = 5
+
+# Twilio concatenates up to 10 segments; longer bodies are rejected
+MAX_SMS_LENGTH = 1600
+
+TWILIO_API_BASE = 'https://api.twilio.com'
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter
+
+    Holds up to burst tokens and refills at rate tokens per second; acquire
+    blocks until a token is available.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def render_sms(header, messages, footer=None):
+    """
+    Build one SMS body from one or more coalesced notices
+
+    Args:
+        header (str): Leading label, e.g. 'Lost & Found Notification'
+        messages (list): The notices
+        footer (str): Optional trailing line
+
+    Returns:
+        str: The body, cut to MAX_SMS_LENGTH
+    """
+    if len(messages) == 1:
+        text = f"{header}: {messages[0]}" if header else messages[0]
+    else:
+        lines = '\n'.join(f"- {message}" for message in messages)
+        text = f"{header} ({len(messages)}):\n{lines}" if header else lines
+
+    if footer:
+        text = f"{text}\n\n{footer}"
+    if len(text) > MAX_SMS_LENGTH:
+        text = text[:MAX_SMS_LENGTH - 3] + '...'
+    return text
+
+
+def create_twilio_client(account_sid, auth_token, api_base=None):
+    """
+    Build a Twilio client whose HTTP session is kept alive between sends
+
+    Args:
+        api_base (str): Send API calls here instead of api.twilio.com, e.g. a
+            local fake endpoint for testing
+
+    Returns:
+        twilio.rest.Client
+    """
+    from twilio.rest import Client
+    from twilio.http.http_client import TwilioHttpClient
+
+    class RebasedHttpClient(TwilioHttpClient):
+        def request(self, method, url, *args, **kwargs):
+            if api_base and url.startswith(TWILIO_API_BASE):
+                url = api_base.rstrip('/') + url[len(TWILIO_API_BASE):]
+            return super().request(method, url, *args, **kwargs)
+
+    http_client = RebasedHttpClient(pool_connections=True, timeout=15)
+    return Client(account_sid, auth_token, http_client=http_client)
+
+
+class SMSDispatcher:
+    """
+    Queued, rate-limited SMS sender
+
+    Messages are grouped by phone, header and footer. A group is sent once
+    it has waited coalesce_seconds, so a burst of notices to one phone
+    becomes a single SMS. Every send takes a token from a shared bucket,
+    which keeps the pool under the provider's rate limit. Rate-limited
+    (HTTP 429) and server errors are retried after a delay.
+    """
+
+    def __init__(self, client=None, from_number=None, rate=None, burst=None, workers=None,
+                 coalesce_seconds=None, max_attempts=DEFAULT_MAX_ATTEMPTS, retry_seconds=DEFAULT_RETRY_SECONDS):
+        self.client = client
+        self.from_number = from_number or os.environ.get('TWILIO_PHONE_NUMBER')
+        self.bucket = TokenBucket(
+            rate or float(os.environ.get('SMS_RATE_PER_SECOND', DEFAULT_RATE_PER_SECOND)),
+            burst or int(os.environ.get('SMS_BURST', DEFAULT_BURST))
+        )
+        self.workers = workers or int(os.environ.get('SMS_WORKERS', DEFAULT_WORKERS))
+        self.coalesce_seconds = coalesce_seconds if coalesce_seconds is not None else \
+            float(os.environ.get('SMS_COALESCE_SECONDS', DEFAULT_COALESCE_SECONDS))
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+
+        # (phone, header, footer) -> {'messages': [...], 'due_at': ..., 'attempts': ...}
+        self._pending = OrderedDict()
+        self._condition = threading.Condition()
+        self._threads = []
+        self._in_flight = 0
+        self._metrics = {
+            'queued': 0, 'coalesced': 0, 'sent': 0, 'failed': 0,
+            'retried': 0, 'rate_limited': 0, 'send_seconds': 0.0
+        }
+        self._metrics_lock = threading.Lock()
+
+    def _count(self, name, value=1):
+        with self._metrics_lock:
+            self._metrics[name] += value
+
+    def metrics(self):
+        """
+        Delivery counters since the dispatcher started
+
+        Returns:
+            dict: queued, coalesced, sent, failed, retried and rate_limited
+                counts, the number of SMS waiting, and the mean send latency
+        """
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        with self._condition:
+            metrics['pending'] = len(self._pending)
+        send_seconds = metrics.pop('send_seconds')
+        metrics['avg_send_ms'] = round(send_seconds * 1000 / metrics['sent'], 1) if metrics['sent'] else None
+        return metrics
+
+    def enqueue(self, phone, message, header=None, footer=None):
+        """
+        Queue a notice for a phone number
+
+        Args:
+            phone (str): Recipient phone number (E.164; '+' is added if missing)
+            message (str): The notice
+            header (str): Label shared by coalesced notices
+            footer (str): Trailing line shared by coalesced notices
+        """
+        if not phone.startswith('+'):
+            phone = '+' + phone
+
+        key = (phone, header, footer)
+        with self._condition:
+            group = self._pending.get(key)
+            if group is None:
+                self._pending[key] = {
+                    'messages': [message],
+                    'due_at': time.monotonic() + self.coalesce_seconds,
+                    'attempts': 0
+                }
+            else:
+                group['messages'].append(message)
+                self._count('coalesced')
+            self._count('queued')
+            self._condition.notify()
+        self.start()
+
+    def _take_due(self):
+        # Caller holds self._condition
+        now = time.monotonic()
+        for key, group in self._pending.items():
+            if group['due_at'] <= now:
+                del self._pending[key]
+                return key, group
+        return None, None
+
+    def _next_due_in(self):
+        # Caller holds self._condition
+        if not self._pending:
+            return None
+        return max(min(group['due_at'] for group in self._pending.values()) - time.monotonic(), 0)
+
+    def _get_client(self):
+        if self.client is None:
+            self.client = create_twilio_client(
+                os.environ.get('TWILIO_ACCOUNT_SID'),
+                os.environ.get('TWILIO_AUTH_TOKEN'),
+                api_base=os.environ.get('TWILIO_API_BASE_URL')
+            )
+        return self.client
+
+    def send(self, phone, header, footer, group):
+        body = render_sms(header, group['messages'], footer)
+        self.bucket.acquire()
+        started = time.monotonic()
+        try:
+            self._get_client().messages.create(body=body, from_=self.from_number, to=phone)
+            self._count('sent')
+            self._count('send_seconds', time.monotonic() - started)
+        except Exception as e:
+            status = getattr(e, 'status', None)
+            if status == 429:
+                self._count('rate_limited')
+
+            group['attempts'] += 1
+            retryable = status is None or status == 429 or status >= 500
+            if retryable and group['attempts'] < self.max_attempts:
+                self._count('retried')
+                with self._condition:
+                    group['due_at'] = time.monotonic() + self.retry_seconds * 2 ** (group['attempts'] - 1)
+                    # Notices queued meanwhile join the retried SMS
+                    existing = self._pending.pop((phone, header, footer), None)
+                    if existing:
+                        group['messages'].extend(existing['messages'])
+                    self._pending[(phone, header, footer)] = group
+                    self._condition.notify()
+            else:
+                self._count('failed')
+                print(f"Error sending SMS to {phone}: {str(e)}")
+
+    def _run_worker(self):
+        while True:
+            with self._condition:
+                key, group = self._take_due()
+                while key is None:
+                    self._condition.wait(self._next_due_in())
+                    key, group = self._take_due()
+                self._in_flight += 1
+            try:
+                self.send(*key, group)
+            except Exception as e:
+                print(f"SMS dispatcher error: {str(e)}")
+            finally:
+                with self._condition:
+                    self._in_flight -= 1
+
+    def start(self):
+        """Start the worker threads if they aren't running"""
+        with self._condition:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            for index in range(len(self._threads), self.workers):
+                thread = threading.Thread(target=self._run_worker, name=f'sms-dispatcher-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def flush(self, timeout=10):
+        """
+        Send everything queued now, ignoring the coalescing window
+
+        Returns:
+            bool: True if the queue drained before the timeout
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            for group in self._pending.values():
+                group['due_at'] = min(group['due_at'], time.monotonic())
+            self._condition.notify_all()
+        while time.monotonic() < deadline:
+            with self._condition:
+                if not self._pending and not self._in_flight:
+                    return True
+            time.sleep(0.05)
+        return False
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_sms_dispatcher():
+    """Return the process-wide dispatcher"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = SMSDispatcher()
+        return _dispatcher
@@ -1,13 +1,55 @@
 import os
-from twilio.rest import Client
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-def send_sms(recipient_phone, message):
+def twilio_configured():
+    """Check that the Twilio credentials are set"""
+    return all([
+        os.environ.get('TWILIO_ACCOUNT_SID'),
+        os.environ.get('TWILIO_AUTH_TOKEN'),
+        os.environ.get('TWILIO_PHONE_NUMBER')
+    ])
+
+def send_sms(recipient_phone, message, header=None, footer=None):
     """
-    Send an SMS using Twilio
+    Queue an SMS with the rate-limited dispatcher
+    
+    Returns immediately. Notices queued for the same phone within a couple
+    of seconds are sent as one SMS. Set SMS_DISPATCHER=false to send
+    synchronously.
+    
+    Args:
+        recipient_phone (str): The recipient's phone number (E.164 format)
+        message (str): The SMS message content
+        header (str, optional): Label shared by coalesced notices
+        footer (str, optional): Trailing line shared by coalesced notices
+    
+    Returns:
+        bool: True if SMS was queued (or sent) successfully, False otherwise
+    """
+    if os.environ.get('SMS_DISPATCHER', 'true').lower() in ('0', 'false', 'no'):
+        from app.utils.sms_dispatcher import render_sms
+        return send_sms_now(recipient_phone, render_sms(header, [message], footer))
+
+    try:
+        # Check if credentials are available
+        if not twilio_configured():
+            print("Twilio credentials not configured. SMS not sent.")
+            return False
+        
+        from app.utils.sms_dispatcher import get_sms_dispatcher
+        get_sms_dispatcher().enqueue(recipient_phone, message, header=header, footer=footer)
+        return True
+    
+    except Exception as e:
+        print(f"Error queueing SMS: {str(e)}")
+        return False
+
+def send_sms_now(recipient_phone, message):
+    """
+    Send an SMS using Twilio, blocking until it is accepted
     
     Args:
         recipient_phone (str): The recipient's phone number (E.164 format)
@@ -17,13 +59,15 @@ def send_sms(recipient_phone, message):
         bool: True if SMS was sent successfully, False otherwise
     """
     try:
+        from twilio.rest import Client
+        
         # Get Twilio configuration from environment variables
         account_sid = os.environ.get('TWILIO_ACCOUNT_SID')
         auth_token = os.environ.get('TWILIO_AUTH_TOKEN')
         twilio_phone = os.environ.get('TWILIO_PHONE_NUMBER')
         
         # Check if credentials are available
-        if not all([account_sid, auth_token, twilio_phone]):
+        if not twilio_configured():
             print("Twilio credentials not configured. SMS not sent.")
             return False
         
@@ -58,7 +102,10 @@ def send_notification_sms(user_phone, notification_message):
     Returns:
         bool: True if SMS was sent successfully, False otherwise
     """
-    # Format the message
-    sms_message = f"Lost & Found Notification: {notification_message}\n\nPlease log in to your account for more details."
-    
-    return send_sms(user_phone, sms_message)
\ No newline at end of file
+    # Notices sent close together are combined under one header and footer
+    return send_sms(
+        user_phone,
+        notification_message,
+        header="Lost & Found Notification",
+        footer="Please log in to your account for more details."
+    )
\ No newline at end of file
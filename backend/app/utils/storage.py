@@ -0,0 +1,291 @@
+import os
+import uuid
+import errno
+import shutil
+import threading
+from flask import current_app
+
+# Defaults (overridable through environment variables)
+DEFAULT_PRESIGN_EXPIRES = 15 * 60  # seconds a direct-upload URL stays valid
+DEFAULT_QUARANTINE_PREFIX = '.quarantine/'
+
+LOCAL_URL_PREFIX = '/static/uploads/'
+
+
+class StorageBackend:
+    """
+    Where uploaded images live.
+
+    Objects are addressed by a key relative to the upload root, e.g.
+    "3f2a...c1.jpg". Backends map keys to their own paths and public URLs.
+    """
+
+    # Whether clients can upload straight to the backend with presign_upload
+    supports_direct_upload = False
+
+    def url_for(self, key):
+        """Return the public URL stored in items.image_url for a key"""
+        raise NotImplementedError
+
+    def key_from_url(self, url):
+        """Return the key for a URL produced by url_for, or None if it isn't ours"""
+        raise NotImplementedError
+
+    def save_file(self, local_path, key, content_type=None):
+        """Store a local file under key, consuming the local file. Returns the URL"""
+        raise NotImplementedError
+
+    def open(self, key):
+        """Return a readable binary file object for key"""
+        raise NotImplementedError
+
+    def stat(self, key):
+        """Return (size, mtime) for key, or None if it doesn't exist"""
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Delete key. Returns True if something was deleted"""
+        raise NotImplementedError
+
+    def move(self, key, dest_key):
+        """Rename key to dest_key"""
+        raise NotImplementedError
+
+    def iter_objects(self):
+        """Yield (key, size, mtime) for every stored object"""
+        raise NotImplementedError
+
+    def presign_upload(self, key, content_type, max_bytes, expires_in=DEFAULT_PRESIGN_EXPIRES):
+        """Return a dict describing how a client can upload key directly"""
+        raise NotImplementedError('This storage backend does not support direct uploads')
+
+
+class LocalStorage(StorageBackend):
+    """Stores objects in a directory on the local disk"""
+
+    def __init__(self, root, url_prefix=LOCAL_URL_PREFIX):
+        self.root = root
+        self.url_prefix = url_prefix
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(os.path.abspath(self.root) + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def url_for(self, key):
+        return f"{self.url_prefix}{key}"
+
+    def key_from_url(self, url):
+        if not url:
+            return None
+        index = url.find(self.url_prefix)
+        if index == -1:
+            return None
+        return url[index + len(self.url_prefix):].split('?', 1)[0]
+
+    def save_file(self, local_path, key, content_type=None):
+        path = self.path_for(key)
+        if os.path.abspath(local_path) != path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                os.replace(local_path, path)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                # Scratch files from tempfile may sit on another filesystem
+                # (tmpfs, a separate volume); copy next to the destination
+                # first so the final rename is still atomic
+                part_path = f"{path}.{uuid.uuid4().hex}.part"
+                shutil.move(local_path, part_path)
+                os.replace(part_path, path)
+        return self.url_for(key)
+
+    def open(self, key):
+        return open(self.path_for(key), 'rb')
+
+    def stat(self, key):
+        try:
+            stat = os.stat(self.path_for(key))
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime
+
+    def delete(self, key):
+        try:
+            os.remove(self.path_for(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def move(self, key, dest_key):
+        dest = self.path_for(dest_key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        shutil.move(self.path_for(key), dest)
+
+    def iter_objects(self):
+        for root, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                key = os.path.relpath(path, self.root).replace(os.sep, '/')
+                yield key, stat.st_size, stat.st_mtime
+
+
+class S3Storage(StorageBackend):
+    """
+    Stores objects in an S3-compatible bucket (AWS S3, MinIO, R2...)
+
+    Clients upload with presigned POSTs, so image bytes never pass through
+    the API workers.
+    """
+
+    supports_direct_upload = True
+
+    def __init__(self, bucket, prefix='uploads/', endpoint_url=None, region=None,
+                 access_key=None, secret_key=None, public_url=None):
+        try:
+            import boto3
+        except ImportError:
+            raise ImportError("boto3 is required for STORAGE_BACKEND=s3. Install it with 'pip install boto3'.")
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+        )
+
+        if public_url:
+            self.public_url = public_url.rstrip('/') + '/'
+        elif endpoint_url:
+            # Path-style URL, which is what MinIO serves by default
+            self.public_url = f"{endpoint_url.rstrip('/')}/{bucket}/{prefix}"
+        else:
+            self.public_url = f"https://{bucket}.s3.amazonaws.com/{prefix}"
+
+    def object_key(self, key):
+        return f"{self.prefix}{key}"
+
+    def url_for(self, key):
+        return f"{self.public_url}{key}"
+
+    def key_from_url(self, url):
+        if not url or not url.startswith(self.public_url):
+            return None
+        return url[len(self.public_url):].split('?', 1)[0]
+
+    def save_file(self, local_path, key, content_type=None):
+        extra_args = {'CacheControl': 'public, max-age=31536000, immutable'}
+        if content_type:
+            extra_args['ContentType'] = content_type
+        self.client.upload_file(local_path, self.bucket, self.object_key(key), ExtraArgs=extra_args)
+        os.remove(local_path)
+        return self.url_for(key)
+
+    def open(self, key):
+        response = self.client.get_object(Bucket=self.bucket, Key=self.object_key(key))
+        return response['Body']
+
+    def stat(self, key):
+        from botocore.exceptions import ClientError
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        return response['ContentLength'], response['LastModified'].timestamp()
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.object_key(key))
+        return True
+
+    def move(self, key, dest_key):
+        self.client.copy_object(
+            Bucket=self.bucket,
+            Key=self.object_key(dest_key),
+            CopySource={'Bucket': self.bucket, 'Key': self.object_key(key)},
+        )
+        self.delete(key)
+
+    def iter_objects(self):
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for obj in page.get('Contents', []):
+                key = obj['Key'][len(self.prefix):]
+                yield key, obj['Size'], obj['LastModified'].timestamp()
+
+    def presign_upload(self, key, content_type, max_bytes, expires_in=DEFAULT_PRESIGN_EXPIRES):
+        # The policy pins the key, the content type and the size range, so the
+        # client can't use the URL to upload anything else
+        post = self.client.generate_presigned_post(
+            Bucket=self.bucket,
+            Key=self.object_key(key),
+            Fields={
+                'Content-Type': content_type,
+                'Cache-Control': 'public, max-age=31536000, immutable',
+            },
+            Conditions=[
+                {'Content-Type': content_type},
+                {'Cache-Control': 'public, max-age=31536000, immutable'},
+                ['content-length-range', 1, max_bytes],
+            ],
+            ExpiresIn=expires_in,
+        )
+        return {
+            'method': 'POST',
+            'url': post['url'],
+            'fields': post['fields'],
+            'expires_in': expires_in,
+        }
+
+
+def direct_upload_prefix(user_id):
+    """Key prefix for objects a user uploads directly"""
+    return f"direct/{user_id}/"
+
+
+def new_upload_key(ext, user_id):
+    """Generate a key for an object a user is about to upload directly"""
+    return f"{direct_upload_prefix(user_id)}{uuid.uuid4().hex}.{ext}"
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """
+    Return the configured storage backend, creating it on first use
+
+    STORAGE_BACKEND selects 'local' (default) or 's3'. The S3 backend reads
+    S3_BUCKET, S3_PREFIX, S3_ENDPOINT_URL, S3_REGION, S3_ACCESS_KEY,
+    S3_SECRET_KEY and S3_PUBLIC_URL; point S3_ENDPOINT_URL at
+    http://localhost:9000 to develop against MinIO.
+    """
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                backend = os.environ.get('STORAGE_BACKEND', 'local').lower()
+                if backend == 's3':
+                    _storage = S3Storage(
+                        bucket=os.environ['S3_BUCKET'],
+                        prefix=os.environ.get('S3_PREFIX', 'uploads/'),
+                        endpoint_url=os.environ.get('S3_ENDPOINT_URL'),
+                        region=os.environ.get('S3_REGION'),
+                        access_key=os.environ.get('S3_ACCESS_KEY'),
+                        secret_key=os.environ.get('S3_SECRET_KEY'),
+                        public_url=os.environ.get('S3_PUBLIC_URL'),
+                    )
+                else:
+                    _storage = LocalStorage(current_app.config['UPLOAD_FOLDER'])
+    return _storage
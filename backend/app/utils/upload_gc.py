@@ -0,0 +1,225 @@
+import os
+import time
+import fcntl
+import argparse
+import threading
+from contextlib import contextmanager
+from flask import current_app
+from app.utils.supabase import get_supabase_client
+from app.utils.storage import get_storage, DEFAULT_QUARANTINE_PREFIX
+
+supabase = get_supabase_client()
+
+# Defaults (overridable through environment variables or CLI flags)
+DEFAULT_GRACE_SECONDS = 24 * 60 * 60  # never touch files younger than a day
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_MAX_DELETES_PER_SECOND = 50
+
+# Precompressed copies served next to an upload (see routes/uploads.py); they
+# live and die with the file they were made from
+PRECOMPRESSED_SUFFIXES = ('.br', '.gz')
+
+
+def base_key(key):
+    """Return the key of the upload a precompressed sibling belongs to, or key itself"""
+    for suffix in PRECOMPRESSED_SUFFIXES:
+        if key.endswith(suffix):
+            return key[:-len(suffix)]
+    return key
+
+
+@contextmanager
+def sweep_lock(path):
+    """
+    Hold an exclusive, non-blocking lock on path while sweeping
+
+    Every worker process starts its own sweeper thread; only the one that
+    gets the lock sweeps, the others skip that round. The lock is per host,
+    so deployments spread over several hosts should disable the in-process
+    sweeper and run the CLI from a single scheduled job instead.
+
+    Yields:
+        bool: True if this process holds the lock
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as handle:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def get_lock_path(app):
+    return os.environ.get('UPLOAD_GC_LOCK_PATH', os.path.join(app.instance_path, 'upload_gc.lock'))
+
+
+def iter_referenced_uploads(storage, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Stream the storage keys referenced by items.image_url
+
+    Pages through the items table by id so memory stays bounded by the page
+    size rather than the number of items.
+
+    Yields:
+        str: The storage key of a referenced image
+    """
+    last_id = None
+    while True:
+        query = supabase.table('items').select('id, image_url').not_.is_('image_url', 'null').order('id')
+        if last_id is not None:
+            query = query.gt('id', last_id)
+        result = query.limit(page_size).execute()
+
+        rows = result.data or []
+        for row in rows:
+            key = storage.key_from_url(row.get('image_url'))
+            if key:
+                yield key
+
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]['id']
+
+
+def sweep_orphaned_uploads(storage=None, grace_seconds=DEFAULT_GRACE_SECONDS, dry_run=False,
+                           quarantine=False, quarantine_prefix=DEFAULT_QUARANTINE_PREFIX,
+                           max_deletes_per_second=DEFAULT_MAX_DELETES_PER_SECOND,
+                           page_size=DEFAULT_PAGE_SIZE, logger=None):
+    """
+    Remove uploaded files that no item references
+
+    Args:
+        storage: The storage backend to sweep, defaults to the configured one
+        grace_seconds (int): Only files older than this are considered, which
+            covers uploads whose item insert is still in flight
+        dry_run (bool): Report what would be removed without touching anything
+        quarantine (bool): Move orphans under quarantine_prefix instead of deleting them
+        quarantine_prefix (str): Key prefix for quarantined files, never swept itself
+        max_deletes_per_second (float): Throttle for removals, 0 disables it
+        page_size (int): Rows fetched per Supabase request
+        logger: Logger for progress messages, defaults to the app logger
+
+    Returns:
+        dict: Counts of scanned, orphaned and removed files and bytes reclaimed
+    """
+    storage = storage or get_storage()
+    logger = logger or current_app.logger
+
+    # Snapshot the cutoff before reading references, so a file uploaded and
+    # referenced while we page through items is always inside the grace period
+    cutoff = time.time() - grace_seconds
+    referenced = set(iter_referenced_uploads(storage, page_size=page_size))
+    logger.info(f"Upload sweep: {len(referenced)} referenced uploads")
+
+    stats = {'scanned': 0, 'orphaned': 0, 'removed': 0, 'bytes': 0}
+    interval = 1.0 / max_deletes_per_second if max_deletes_per_second else 0
+
+    for key, size, mtime in storage.iter_objects():
+        if key.startswith(quarantine_prefix):
+            continue
+
+        stats['scanned'] += 1
+        if base_key(key) in referenced or mtime > cutoff:
+            continue
+
+        stats['orphaned'] += 1
+        stats['bytes'] += size
+
+        if dry_run:
+            logger.info(f"Upload sweep (dry run): would remove {key}")
+            continue
+
+        try:
+            if quarantine:
+                storage.move(key, f"{quarantine_prefix}{key}")
+            else:
+                storage.delete(key)
+            stats['removed'] += 1
+            logger.info(f"Upload sweep: removed {key}")
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            logger.error(f"Upload sweep: failed to remove {key}: {str(e)}")
+
+        if interval:
+            time.sleep(interval)
+
+    logger.info(f"Upload sweep finished: {stats}")
+    return stats
+
+
+def sweep_from_config(app, dry_run=False):
+    """
+    Run a sweep with settings from the environment
+
+    Returns:
+        dict: Sweep counts, or None if another process is already sweeping
+    """
+    with app.app_context(), sweep_lock(get_lock_path(app)) as locked:
+        if not locked:
+            app.logger.info("Upload sweep skipped: another process is sweeping")
+            return None
+        return sweep_orphaned_uploads(
+            grace_seconds=int(os.environ.get('UPLOAD_GC_GRACE_SECONDS', DEFAULT_GRACE_SECONDS)),
+            dry_run=dry_run,
+            quarantine=os.environ.get('UPLOAD_GC_QUARANTINE', '').lower() in ('1', 'true', 'yes'),
+            max_deletes_per_second=float(os.environ.get('UPLOAD_GC_MAX_DELETES_PER_SECOND', DEFAULT_MAX_DELETES_PER_SECOND)),
+        )
+
+
+def start_upload_sweeper(app, interval_seconds):
+    """
+    Run the sweep periodically in a daemon thread
+
+    Args:
+        app: The Flask application
+        interval_seconds (int): Seconds between sweeps
+
+    Returns:
+        threading.Thread: The started thread
+    """
+    dry_run = os.environ.get('UPLOAD_GC_DRY_RUN', '').lower() in ('1', 'true', 'yes')
+
+    def run():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                sweep_from_config(app, dry_run=dry_run)
+            except Exception as e:
+                app.logger.error(f"Upload sweep failed: {str(e)}")
+
+    thread = threading.Thread(target=run, name='upload-sweeper', daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    from app import create_app
+
+    parser = argparse.ArgumentParser(description='Remove uploaded files that no item references')
+    parser.add_argument('--dry-run', action='store_true', help='Only report what would be removed')
+    parser.add_argument('--grace-seconds', type=int, default=DEFAULT_GRACE_SECONDS)
+    parser.add_argument('--quarantine', action='store_true',
+                        help=f"Move orphans under '{DEFAULT_QUARANTINE_PREFIX}' instead of deleting them")
+    parser.add_argument('--max-deletes-per-second', type=float, default=DEFAULT_MAX_DELETES_PER_SECOND)
+    parser.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context(), sweep_lock(get_lock_path(app)) as locked:
+        if not locked:
+            parser.exit(1, "Another process is already sweeping uploads\n")
+        stats = sweep_orphaned_uploads(
+            grace_seconds=args.grace_seconds,
+            dry_run=args.dry_run,
+            quarantine=args.quarantine,
+            max_deletes_per_second=args.max_deletes_per_second,
+            page_size=args.page_size,
+        )
+    print(f"Scanned {stats['scanned']} files, {stats['orphaned']} orphaned, "
+          f"{stats['removed']} removed, {stats['bytes']} bytes")
@@ -0,0 +1,211 @@
+import os
+import uuid
+import mimetypes
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+from app.utils.storage import get_storage
+
+# Default limits (overridable through environment variables)
+DEFAULT_MAX_IMAGE_BYTES = 10 * 1024 * 1024  # 10 MB per uploaded image
+DEFAULT_MAX_CONTENT_LENGTH = 12 * 1024 * 1024  # 12 MB per request body
+
+# Magic byte signatures for the image types we accept
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+]
+
+# Number of leading bytes needed before we can sniff the type
+SNIFF_BYTES = 8
+
+
+def get_max_image_bytes():
+    """Return the maximum size in bytes allowed for a single uploaded image"""
+    return int(os.environ.get('MAX_IMAGE_BYTES', DEFAULT_MAX_IMAGE_BYTES))
+
+
+def get_max_content_length():
+    """Return the maximum size in bytes allowed for a whole request body"""
+    return int(os.environ.get('MAX_CONTENT_LENGTH', DEFAULT_MAX_CONTENT_LENGTH))
+
+
+def sniff_image_type(header):
+    """
+    Detect the image type from its leading bytes
+
+    Args:
+        header (bytes): The first bytes of the file
+
+    Returns:
+        str: The file extension for the detected type, or None if unknown
+    """
+    for signature, ext in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return ext
+    return None
+
+
+class UploadSpool:
+    """
+    File-like object that Werkzeug streams an uploaded file into.
+
+    Every chunk is counted against the size limit and written straight to a
+    partial file inside the upload folder. The type is
+    sniffed from the magic bytes as soon as enough of the file has arrived, so
+    oversized or non-image uploads are rejected while the body is still being
+    read instead of after it has been buffered.
+    """
+
+    def __init__(self, upload_folder, filename=None, max_bytes=None):
+        self.upload_folder = upload_folder
+        self.filename = filename
+        self.max_bytes = max_bytes if max_bytes is not None else get_max_image_bytes()
+        self.size = 0
+        self.ext = None
+        self.committed_path = None
+        self._header = b''
+
+        os.makedirs(upload_folder, exist_ok=True)
+        self.part_path = os.path.join(upload_folder, f"{uuid.uuid4().hex}.part")
+        self._file = open(self.part_path, 'w+b')
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.discard()
+            raise RequestEntityTooLarge(f"Image exceeds the maximum size of {self.max_bytes} bytes")
+
+        if self.ext is None:
+            self._header += data[:SNIFF_BYTES]
+            if len(self._header) >= SNIFF_BYTES:
+                self.ext = sniff_image_type(self._header)
+                if self.ext is None:
+                    self.discard()
+                    raise UnsupportedMediaType('Uploaded file is not a supported image type')
+
+        return self._file.write(data)
+
+    def seek(self, offset, whence=0):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def flush(self):
+        self._file.flush()
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def commit(self):
+        """
+        Move the spooled file to its final name
+
+        Every upload gets its own random name, never one derived from the
+        content, so two items uploading the same bytes don't share a file
+        that deleting either of them would remove.
+
+        Returns:
+            str: The file name inside the upload folder, or None if the upload
+            was empty or too short to identify
+        """
+        if self.committed_path:
+            return os.path.basename(self.committed_path)
+
+        if self.ext is None:
+            # Files shorter than the sniff window never got identified
+            self.ext = sniff_image_type(self._header)
+        if self.ext is None or self.size == 0:
+            self.discard()
+            return None
+
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+        final_name = f"{uuid.uuid4().hex}.{self.ext}"
+        final_path = os.path.join(self.upload_folder, final_name)
+        os.replace(self.part_path, final_path)
+        self.committed_path = final_path
+        return final_name
+
+    def discard(self):
+        """Close and remove the partial file"""
+        if not self._file.closed:
+            self._file.close()
+        if not self.committed_path and os.path.exists(self.part_path):
+            os.remove(self.part_path)
+
+    def close(self):
+        # Anything that was not committed by the request handler is thrown away
+        self.discard()
+
+
+class StreamingUploadRequest(Request):
+    """Request class that spools uploaded files through an UploadSpool"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._upload_spools = []
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        max_content_length = current_app.config.get('MAX_CONTENT_LENGTH')
+        if max_content_length and total_content_length and total_content_length > max_content_length:
+            raise RequestEntityTooLarge()
+
+        upload_folder = current_app.config.get(
+            'UPLOAD_FOLDER',
+            os.path.join(current_app.root_path, 'static', 'uploads')
+        )
+        spool = UploadSpool(upload_folder, filename=filename)
+        self._upload_spools.append(spool)
+        return spool
+
+    def close(self):
+        # Werkzeug only closes the files it finished parsing; a request that
+        # aborted part way through (size limit, bad type, client gone) would
+        # otherwise leave its .part files behind
+        try:
+            super().close()
+        finally:
+            for spool in self._upload_spools:
+                spool.discard()
+            self._upload_spools = []
+
+
+def commit_upload(file):
+    """
+    Finalize a file uploaded through StreamingUploadRequest
+
+    Args:
+        file: The FileStorage from request.files
+
+    Returns:
+        str: The URL of the saved image, or None if it was not spooled or
+        could not be identified
+    """
+    if not file or not isinstance(file.stream, UploadSpool):
+        return None
+
+    final_name = file.stream.commit()
+    if not final_name:
+        return None
+
+    # The local backend stores straight from the upload folder; remote
+    # backends upload the spooled file and remove it
+    return get_storage().save_file(
+        file.stream.committed_path, final_name,
+        content_type=mimetypes.guess_type(final_name)[0]
+    )
@@ -0,0 +1,129 @@
+"""
+Micro-benchmark for the image decode-and-shrink step.
+
+Compares the original image_handler.save_image path (open, convert,
+thumbnail with LANCZOS and its default reducing_gap) against
+image_handler.open_scaled, which uses JPEG draft mode, reduce-on-load and
+per-size resampling. open_scaled backs the resized variants served by
+/api/images (render_variant) and image_handler.save_image; item uploads are
+stored as uploaded and don't go through either path. Each path runs in its own process
+so the reported peak RSS isn't polluted by the other one.
+
+Usage:
+    python benchmarks/bench_image_decode.py [image.jpg ...] [--runs 20] [--size 800]
+
+Without images, a synthetic 4032x3024 phone-sized JPEG is generated.
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+# Import image_handler directly so the benchmark doesn't need the Supabase
+# client that importing the app package creates
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'utils'))
+import image_handler  # noqa: E402
+
+
+def legacy_path(path, max_size):
+    """The pipeline image_handler.save_image used before open_scaled, unchanged"""
+    with Image.open(path) as img:
+        if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[3] if img.mode == 'RGBA' else None)
+            img = background
+        if img.width > max_size[0] or img.height > max_size[1]:
+            img.thumbnail(max_size, Image.LANCZOS)
+        img.load()
+        return img.size
+
+
+def fast_path(path, max_size):
+    img = image_handler.flatten_transparency(image_handler.open_scaled(path, max_size))
+    return img.size
+
+
+PATHS = {
+    'legacy': legacy_path,
+    'fast': fast_path,
+}
+
+
+def peak_rss_kb():
+    """Peak resident set size of this process in kilobytes"""
+    # VmHWM belongs to the current address space; ru_maxrss would also
+    # include the parent's peak, which Linux carries across exec
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def run_path(name, images, runs, max_size, queue):
+    func = PATHS[name]
+    baseline = peak_rss_kb()
+    timings = []
+    for _ in range(runs):
+        for path in images:
+            start = time.perf_counter()
+            func(path, max_size)
+            timings.append(time.perf_counter() - start)
+
+    queue.put((name, timings, peak_rss_kb() - baseline))
+
+
+def make_sample(directory):
+    path = os.path.join(directory, 'sample_4032x3024.jpg')
+    gradient = Image.linear_gradient('L').resize((4032, 3024))
+    noise = Image.effect_noise((4032, 3024), 64)
+    Image.merge('RGB', (gradient, noise, gradient.transpose(Image.FLIP_LEFT_RIGHT))).save(path, quality=92)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('images', nargs='*', help='Images to process')
+    parser.add_argument('--runs', type=int, default=20, help='Passes over the image set')
+    parser.add_argument('--size', type=int, default=800, help='Maximum output dimension')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        images = args.images or [make_sample(tmp)]
+        max_size = (args.size, args.size)
+
+        ctx = multiprocessing.get_context('spawn')
+        queue = ctx.Queue()
+        results = {}
+        for name in PATHS:
+            proc = ctx.Process(target=run_path, args=(name, images, args.runs, max_size, queue))
+            proc.start()
+            result = queue.get()
+            proc.join()
+            results[result[0]] = result
+
+    print(f"{len(images)} image(s) x {args.runs} runs, max size {args.size}px")
+    print(f"{'path':<8} {'mean ms':>10} {'min ms':>10} {'+peak RSS MB':>13}")
+    for name, timings, peak in results.values():
+        mean_ms = sum(timings) / len(timings) * 1000
+        min_ms = min(timings) * 1000
+        print(f"{name:<8} {mean_ms:>10.1f} {min_ms:>10.1f} {peak / 1024:>13.1f}")
+
+    legacy_mean = sum(results['legacy'][1]) / len(results['legacy'][1])
+    fast_mean = sum(results['fast'][1]) / len(results['fast'][1])
+    print(f"speedup: {legacy_mean / fast_mean:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+-- Evidence score of each claim's proof against the claimed item (0-100),
+-- computed by app/utils/claim_scoring.py
+ALTER TABLE claims ADD COLUMN IF NOT EXISTS evidence_score REAL NOT NULL DEFAULT 0;
+ALTER TABLE claims ADD COLUMN IF NOT EXISTS evidence_scored_at TIMESTAMP WITH TIME ZONE;
+
+-- Review queue ordered by likely-legitimate first
+CREATE INDEX IF NOT EXISTS idx_claims_status_evidence_score
+    ON claims(verification_status, evidence_score DESC, created_at, id);
+
+-- Write a batch of scores in one statement
+CREATE OR REPLACE FUNCTION set_claim_scores(scores JSONB)
+RETURNS INTEGER
+LANGUAGE SQL
+SECURITY DEFINER
+AS $$
+    WITH updated AS (
+        UPDATE claims c
+        SET evidence_score = s.score,
+            evidence_scored_at = NOW()
+        FROM jsonb_to_recordset(scores) AS s(id UUID, score REAL)
+        WHERE c.id = s.id
+        RETURNING c.id
+    )
+    SELECT COUNT(*)::INTEGER FROM updated;
+$$;
+
+REVOKE EXECUTE ON FUNCTION set_claim_scores FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION set_claim_scores TO service_role;
@@ -0,0 +1,263 @@
+-- Per-side read watermarks: everything a participant received up to
+-- last_read_at is read. Opening a thread advances one timestamp on the
+-- conversation row instead of flipping read on every message.
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS last_read_at_a TIMESTAMPTZ;
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS last_read_at_b TIMESTAMPTZ;
+
+-- Advance p_user_id's watermark in the conversation to p_read_at (never
+-- backwards) and recount their unread messages past it. Does nothing, and
+-- writes nothing, when the watermark is already there.
+-- The conversation row is locked before counting: a message inserted
+-- meanwhile waits for the lock and its trigger then adds to the new count,
+-- instead of the count overwriting its increment.
+-- Returns the user's unread count in the conversation.
+CREATE OR REPLACE FUNCTION mark_conversation_read(
+    p_user_id UUID,
+    p_other_user_id UUID,
+    p_item_id UUID DEFAULT NULL,
+    p_read_at TIMESTAMPTZ DEFAULT NOW()
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+    v_is_a BOOLEAN := p_user_id < p_other_user_id;
+    v_conversation_id UUID;
+    v_last_read_at TIMESTAMPTZ;
+    v_unread INTEGER;
+BEGIN
+    SELECT c.id,
+           CASE WHEN v_is_a THEN c.last_read_at_a ELSE c.last_read_at_b END,
+           CASE WHEN v_is_a THEN c.unread_a ELSE c.unread_b END
+    INTO v_conversation_id, v_last_read_at, v_unread
+    FROM conversations c
+    WHERE c.user_a = LEAST(p_user_id, p_other_user_id)
+    AND c.user_b = GREATEST(p_user_id, p_other_user_id)
+    AND COALESCE(c.item_id, '00000000-0000-0000-0000-000000000000'::UUID) = COALESCE(p_item_id, '00000000-0000-0000-0000-000000000000'::UUID)
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RETURN 0;
+    END IF;
+
+    -- Watermark already at or past p_read_at: report the stored count
+    IF v_last_read_at IS NOT NULL AND v_last_read_at >= p_read_at THEN
+        RETURN v_unread;
+    END IF;
+
+    -- Received messages past the new watermark that weren't read one by
+    -- one; a new statement, so it sees everything committed before the lock
+    SELECT COUNT(*) INTO v_unread
+    FROM messages m
+    WHERE m.sender_id = p_other_user_id
+    AND m.receiver_id = p_user_id
+    AND (m.item_id = p_item_id OR (p_item_id IS NULL AND m.item_id IS NULL))
+    AND m.created_at > p_read_at
+    AND NOT COALESCE(m.read, FALSE);
+
+    IF v_is_a THEN
+        UPDATE conversations
+        SET last_read_at_a = p_read_at,
+            unread_a = v_unread
+        WHERE id = v_conversation_id;
+    ELSE
+        UPDATE conversations
+        SET last_read_at_b = p_read_at,
+            unread_b = v_unread
+        WHERE id = v_conversation_id;
+    END IF;
+
+    RETURN v_unread;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION mark_conversation_read FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION mark_conversation_read TO service_role;
+
+-- Recounting after a delete has to stop at the watermarks too, or every
+-- message under them that was never flipped to read comes back as unread
+CREATE OR REPLACE FUNCTION conversations_on_message_delete()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    WITH affected AS (
+        SELECT DISTINCT LEAST(sender_id, receiver_id) AS user_a,
+               GREATEST(sender_id, receiver_id) AS user_b,
+               COALESCE(item_id, '00000000-0000-0000-0000-000000000000'::UUID) AS item_key
+        FROM old_rows
+    ), recomputed AS (
+        SELECT a.user_a, a.user_b, a.item_key, last.content, last.created_at, last.sender_id,
+               (SELECT COUNT(*) FROM messages m
+                WHERE m.receiver_id = a.user_a AND m.sender_id = a.user_b AND NOT COALESCE(m.read, FALSE)
+                AND COALESCE(m.item_id, '00000000-0000-0000-0000-000000000000'::UUID) = a.item_key
+                AND m.created_at > COALESCE(c.last_read_at_a, '-infinity')) AS unread_a,
+               (SELECT COUNT(*) FROM messages m
+                WHERE m.receiver_id = a.user_b AND m.sender_id = a.user_a AND NOT COALESCE(m.read, FALSE)
+                AND COALESCE(m.item_id, '00000000-0000-0000-0000-000000000000'::UUID) = a.item_key
+                AND m.created_at > COALESCE(c.last_read_at_b, '-infinity')) AS unread_b
+        FROM affected a
+        LEFT JOIN conversations c
+            ON c.user_a = a.user_a
+            AND c.user_b = a.user_b
+            AND COALESCE(c.item_id, '00000000-0000-0000-0000-000000000000'::UUID) = a.item_key
+        LEFT JOIN LATERAL (
+            SELECT m.content, m.created_at, m.sender_id
+            FROM messages m
+            WHERE LEAST(m.sender_id, m.receiver_id) = a.user_a
+            AND GREATEST(m.sender_id, m.receiver_id) = a.user_b
+            AND COALESCE(m.item_id, '00000000-0000-0000-0000-000000000000'::UUID) = a.item_key
+            ORDER BY m.created_at DESC
+            LIMIT 1
+        ) last ON TRUE
+    ), updated AS (
+        UPDATE conversations c
+        SET last_message = r.content,
+            last_message_at = r.created_at,
+            last_sender_id = r.sender_id,
+            unread_a = r.unread_a,
+            unread_b = r.unread_b
+        FROM recomputed r
+        WHERE c.user_a = r.user_a
+        AND c.user_b = r.user_b
+        AND COALESCE(c.item_id, '00000000-0000-0000-0000-000000000000'::UUID) = r.item_key
+        AND r.created_at IS NOT NULL
+    )
+    -- Conversations with no messages left disappear from the list (a
+    -- disjoint set of rows from the update above)
+    DELETE FROM conversations c
+    USING recomputed r
+    WHERE c.user_a = r.user_a
+    AND c.user_b = r.user_b
+    AND COALESCE(c.item_id, '00000000-0000-0000-0000-000000000000'::UUID) = r.item_key
+    AND r.created_at IS NULL;
+    RETURN NULL;
+END;
+$$;
+
+-- A user's unread messages across all conversations, from the summary rows
+CREATE OR REPLACE FUNCTION get_unread_message_count(p_user_id UUID)
+RETURNS INTEGER
+LANGUAGE SQL
+STABLE
+AS $$
+    SELECT (
+        COALESCE((SELECT SUM(unread_a) FROM conversations WHERE user_a = p_user_id), 0) +
+        COALESCE((SELECT SUM(unread_b) FROM conversations WHERE user_b = p_user_id), 0)
+    )::INTEGER;
+$$;
+
+-- The history reports a message as read once it is under the receiver's
+-- watermark, so the thread needs no per-message writes to show receipts
+CREATE OR REPLACE FUNCTION get_conversation_messages(
+    user1_uuid UUID,
+    user2_uuid UUID,
+    item_uuid UUID DEFAULT NULL,
+    p_before UUID DEFAULT NULL,
+    p_after UUID DEFAULT NULL,
+    p_limit INTEGER DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    sender_id UUID,
+    receiver_id UUID,
+    content TEXT,
+    read BOOLEAN,
+    created_at TIMESTAMP WITH TIME ZONE,
+    is_sender BOOLEAN
+)
+LANGUAGE plpgsql
+STABLE
+AS $$
+#variable_conflict use_column
+DECLARE
+    v_cursor_at TIMESTAMPTZ;
+    v_cursor_id UUID := COALESCE(p_after, p_before);
+    v_user1_read_at TIMESTAMPTZ;
+    v_user2_read_at TIMESTAMPTZ;
+BEGIN
+    -- Filter out messages with yourself
+    IF user1_uuid = user2_uuid THEN
+        RETURN;
+    END IF;
+
+    IF v_cursor_id IS NOT NULL THEN
+        -- The cursor has to be a message of this conversation, so another
+        -- thread's ids can't be used to probe it
+        SELECT m.created_at INTO v_cursor_at
+        FROM messages m
+        WHERE m.id = v_cursor_id
+        AND ((m.sender_id = user1_uuid AND m.receiver_id = user2_uuid)
+             OR (m.sender_id = user2_uuid AND m.receiver_id = user1_uuid))
+        AND (m.item_id = item_uuid OR (item_uuid IS NULL AND m.item_id IS NULL));
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'CURSOR_NOT_FOUND: %', v_cursor_id;
+        END IF;
+    END IF;
+
+    SELECT CASE WHEN user1_uuid < user2_uuid THEN c.last_read_at_a ELSE c.last_read_at_b END,
+           CASE WHEN user1_uuid < user2_uuid THEN c.last_read_at_b ELSE c.last_read_at_a END
+    INTO v_user1_read_at, v_user2_read_at
+    FROM conversations c
+    WHERE c.user_a = LEAST(user1_uuid, user2_uuid)
+    AND c.user_b = GREATEST(user1_uuid, user2_uuid)
+    AND COALESCE(c.item_id, '00000000-0000-0000-0000-000000000000'::UUID) = COALESCE(item_uuid, '00000000-0000-0000-0000-000000000000'::UUID);
+
+    IF p_after IS NOT NULL THEN
+        RETURN QUERY
+        SELECT page.id, page.sender_id, page.receiver_id, page.content,
+               COALESCE(page.read, FALSE) OR (page.created_at <= CASE
+                   WHEN page.receiver_id = user1_uuid THEN v_user1_read_at ELSE v_user2_read_at
+               END) IS TRUE,
+               page.created_at,
+               page.sender_id = user1_uuid
+        FROM (
+            (SELECT m.* FROM messages m
+             WHERE m.sender_id = user1_uuid AND m.receiver_id = user2_uuid
+             AND (m.item_id = item_uuid OR (item_uuid IS NULL AND m.item_id IS NULL))
+             AND (m.created_at, m.id) > (v_cursor_at, v_cursor_id)
+             ORDER BY m.created_at, m.id
+             LIMIT p_limit)
+            UNION ALL
+            (SELECT m.* FROM messages m
+             WHERE m.sender_id = user2_uuid AND m.receiver_id = user1_uuid
+             AND (m.item_id = item_uuid OR (item_uuid IS NULL AND m.item_id IS NULL))
+             AND (m.created_at, m.id) > (v_cursor_at, v_cursor_id)
+             ORDER BY m.created_at, m.id
+             LIMIT p_limit)
+            ORDER BY created_at, id
+            LIMIT p_limit
+        ) page
+        ORDER BY page.created_at, page.id;
+    ELSE
+        -- Newest first to apply the limit, then flipped to oldest first
+        RETURN QUERY
+        SELECT page.id, page.sender_id, page.receiver_id, page.content,
+               COALESCE(page.read, FALSE) OR (page.created_at <= CASE
+                   WHEN page.receiver_id = user1_uuid THEN v_user1_read_at ELSE v_user2_read_at
+               END) IS TRUE,
+               page.created_at,
+               page.sender_id = user1_uuid
+        FROM (
+            (SELECT m.* FROM messages m
+             WHERE m.sender_id = user1_uuid AND m.receiver_id = user2_uuid
+             AND (m.item_id = item_uuid OR (item_uuid IS NULL AND m.item_id IS NULL))
+             AND (p_before IS NULL OR (m.created_at, m.id) < (v_cursor_at, v_cursor_id))
+             ORDER BY m.created_at DESC, m.id DESC
+             LIMIT p_limit)
+            UNION ALL
+            (SELECT m.* FROM messages m
+             WHERE m.sender_id = user2_uuid AND m.receiver_id = user1_uuid
+             AND (m.item_id = item_uuid OR (item_uuid IS NULL AND m.item_id IS NULL))
+             AND (p_before IS NULL OR (m.created_at, m.id) < (v_cursor_at, v_cursor_id))
+             ORDER BY m.created_at DESC, m.id DESC
+             LIMIT p_limit)
+            ORDER BY created_at DESC, id DESC
+            LIMIT p_limit
+        ) page
+        ORDER BY page.created_at, page.id;
+    END IF;
+END;
+$$;
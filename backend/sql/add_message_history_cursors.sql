@@ -0,0 +1,108 @@
+-- Serves one direction of a conversation in time order straight from the
+-- index; the history query reads both directions and merges them
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_created_at
+    ON messages(sender_id, receiver_id, item_id, created_at, id);
+
+-- Cursor-paged conversation history.
+-- Cursors are message ids: p_before returns the p_limit messages just older
+-- than that message, p_after the p_limit messages just newer (for fetching
+-- only what arrived since the last poll). With neither, the newest p_limit
+-- messages are returned; with no limit either, the whole thread as before.
+-- Messages are always returned oldest first. Ties on created_at are broken
+-- by id so no message is skipped or repeated across pages. The item test
+-- is written so it folds to a plain indexable condition once item_uuid is
+-- known.
+DROP FUNCTION IF EXISTS get_conversation_messages(UUID, UUID, UUID);
+
+CREATE OR REPLACE FUNCTION get_conversation_messages(
+    user1_uuid UUID,
+    user2_uuid UUID,
+    item_uuid UUID DEFAULT NULL,
+    p_before UUID DEFAULT NULL,
+    p_after UUID DEFAULT NULL,
+    p_limit INTEGER DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    sender_id UUID,
+    receiver_id UUID,
+    content TEXT,
+    read BOOLEAN,
+    created_at TIMESTAMP WITH TIME ZONE,
+    is_sender BOOLEAN
+)
+LANGUAGE plpgsql
+STABLE
+AS $$
+#variable_conflict use_column
+DECLARE
+    v_cursor_at TIMESTAMPTZ;
+    v_cursor_id UUID := COALESCE(p_after, p_before);
+BEGIN
+    -- Filter out messages with yourself
+    IF user1_uuid = user2_uuid THEN
+        RETURN;
+    END IF;
+
+    IF v_cursor_id IS NOT NULL THEN
+        -- The cursor has to be a message of this conversation, so another
+        -- thread's ids can't be used to probe it
+        SELECT m.created_at INTO v_cursor_at
+        FROM messages m
+        WHERE m.id = v_cursor_id
+        AND ((m.sender_id = user1_uuid AND m.receiver_id = user2_uuid)
+             OR (m.sender_id = user2_uuid AND m.receiver_id = user1_uuid))
+        AND (m.item_id = item_uuid OR (item_uuid IS NULL AND m.item_id IS NULL));
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'CURSOR_NOT_FOUND: %', v_cursor_id;
+        END IF;
+    END IF;
+
+    IF p_after IS NOT NULL THEN
+        RETURN QUERY
+        SELECT page.id, page.sender_id, page.receiver_id, page.content, page.read, page.created_at,
+               page.sender_id = user1_uuid
+        FROM (
+            (SELECT m.* FROM messages m
+             WHERE m.sender_id = user1_uuid AND m.receiver_id = user2_uuid
+             AND (m.item_id = item_uuid OR (item_uuid IS NULL AND m.item_id IS NULL))
+             AND (m.created_at, m.id) > (v_cursor_at, v_cursor_id)
+             ORDER BY m.created_at, m.id
+             LIMIT p_limit)
+            UNION ALL
+            (SELECT m.* FROM messages m
+             WHERE m.sender_id = user2_uuid AND m.receiver_id = user1_uuid
+             AND (m.item_id = item_uuid OR (item_uuid IS NULL AND m.item_id IS NULL))
+             AND (m.created_at, m.id) > (v_cursor_at, v_cursor_id)
+             ORDER BY m.created_at, m.id
+             LIMIT p_limit)
+            ORDER BY created_at, id
+            LIMIT p_limit
+        ) page
+        ORDER BY page.created_at, page.id;
+    ELSE
+        -- Newest first to apply the limit, then flipped to oldest first
+        RETURN QUERY
+        SELECT page.id, page.sender_id, page.receiver_id, page.content, page.read, page.created_at,
+               page.sender_id = user1_uuid
+        FROM (
+            (SELECT m.* FROM messages m
+             WHERE m.sender_id = user1_uuid AND m.receiver_id = user2_uuid
+             AND (m.item_id = item_uuid OR (item_uuid IS NULL AND m.item_id IS NULL))
+             AND (p_before IS NULL OR (m.created_at, m.id) < (v_cursor_at, v_cursor_id))
+             ORDER BY m.created_at DESC, m.id DESC
+             LIMIT p_limit)
+            UNION ALL
+            (SELECT m.* FROM messages m
+             WHERE m.sender_id = user2_uuid AND m.receiver_id = user1_uuid
+             AND (m.item_id = item_uuid OR (item_uuid IS NULL AND m.item_id IS NULL))
+             AND (p_before IS NULL OR (m.created_at, m.id) < (v_cursor_at, v_cursor_id))
+             ORDER BY m.created_at DESC, m.id DESC
+             LIMIT p_limit)
+            ORDER BY created_at DESC, id DESC
+            LIMIT p_limit
+        ) page
+        ORDER BY page.created_at, page.id;
+    END IF;
+END;
+$$;
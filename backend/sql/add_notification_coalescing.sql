@@ -0,0 +1,141 @@
+-- Notifications of the same type about the same sender and entity are
+-- collapsed into one unread row that counts the events it stands for.
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS coalesce_key TEXT;
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS event_count INTEGER NOT NULL DEFAULT 1;
+
+CREATE INDEX IF NOT EXISTS idx_notifications_coalesce
+    ON notifications(user_id, coalesce_key, created_at DESC)
+    WHERE NOT read AND coalesce_key IS NOT NULL;
+
+-- Insert a notification, or fold it into the recipient's unread one with the
+-- same key from within the window. A folded row takes the new message and
+-- timestamp so it resurfaces at the top of the inbox; p_summary (with %s for
+-- the event count) replaces the message once more than one event is folded.
+CREATE OR REPLACE FUNCTION upsert_coalesced_notification(
+    p_notification JSONB,
+    p_coalesce_key TEXT,
+    p_window_seconds INTEGER DEFAULT 3600,
+    p_summary TEXT DEFAULT NULL
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+    v_user_id UUID := (p_notification->>'user_id')::UUID;
+    v_row notifications%ROWTYPE;
+BEGIN
+    -- Serialize writers for one recipient and key so concurrent events
+    -- can't both miss the existing row and insert two
+    PERFORM pg_advisory_xact_lock(hashtext(v_user_id::TEXT || ':' || p_coalesce_key));
+
+    SELECT * INTO v_row
+    FROM notifications
+    WHERE user_id = v_user_id
+    AND coalesce_key = p_coalesce_key
+    AND NOT read
+    AND created_at > NOW() - make_interval(secs => p_window_seconds)
+    ORDER BY created_at DESC
+    LIMIT 1
+    FOR UPDATE;
+
+    IF FOUND THEN
+        UPDATE notifications
+        SET event_count = v_row.event_count + 1,
+            message = CASE
+                WHEN p_summary IS NOT NULL THEN format(p_summary, v_row.event_count + 1)
+                ELSE p_notification->>'message'
+            END,
+            created_at = NOW()
+        WHERE id = v_row.id
+        RETURNING * INTO v_row;
+    ELSE
+        INSERT INTO notifications
+        SELECT * FROM jsonb_populate_record(NULL::notifications,
+            jsonb_strip_nulls(p_notification) || jsonb_build_object(
+                'id', gen_random_uuid(),
+                'coalesce_key', p_coalesce_key,
+                'event_count', 1,
+                'read', FALSE,
+                'created_at', NOW()
+            ))
+        RETURNING * INTO v_row;
+    END IF;
+
+    RETURN to_jsonb(v_row);
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION upsert_coalesced_notification FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION upsert_coalesced_notification TO service_role;
+
+-- Digest delivery preferences: 'off', 'hourly' or 'daily'
+ALTER TABLE users ADD COLUMN IF NOT EXISTS digest_frequency TEXT NOT NULL DEFAULT 'off'
+    CHECK (digest_frequency IN ('off', 'hourly', 'daily'));
+ALTER TABLE users ADD COLUMN IF NOT EXISTS digest_sms BOOLEAN NOT NULL DEFAULT FALSE;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS last_digest_at TIMESTAMPTZ;
+
+CREATE INDEX IF NOT EXISTS idx_users_digest_frequency
+    ON users(digest_frequency, last_digest_at)
+    WHERE digest_frequency <> 'off';
+
+-- Claim the users whose digest is due and return each with the unread
+-- notifications created since their previous digest, in one round trip.
+-- last_digest_at is advanced in the same statement and rows another worker
+-- is claiming are skipped, so concurrent schedulers never pick up the same
+-- user; a digest that then fails to send is skipped rather than repeated.
+DROP FUNCTION IF EXISTS get_due_notification_digests(TEXT, INTEGER);
+
+CREATE OR REPLACE FUNCTION claim_due_notification_digests(
+    p_frequency TEXT,
+    p_limit INTEGER DEFAULT 500
+)
+RETURNS JSONB
+LANGUAGE SQL
+AS $$
+    WITH period AS (
+        SELECT CASE p_frequency WHEN 'hourly' THEN INTERVAL '1 hour' ELSE INTERVAL '1 day' END AS length
+    ), due AS (
+        SELECT u.id, COALESCE(u.last_digest_at, NOW() - period.length) AS since
+        FROM users u
+        CROSS JOIN period
+        WHERE u.digest_frequency = p_frequency
+        AND (u.last_digest_at IS NULL OR u.last_digest_at <= NOW() - period.length)
+        AND EXISTS (
+            SELECT 1
+            FROM notifications n
+            WHERE n.user_id = u.id
+            AND NOT n.read
+            AND n.created_at > COALESCE(u.last_digest_at, NOW() - period.length)
+        )
+        LIMIT p_limit
+        FOR UPDATE OF u SKIP LOCKED
+    ), claimed AS (
+        UPDATE users u
+        SET last_digest_at = NOW()
+        FROM due
+        WHERE u.id = due.id
+        RETURNING u.id, u.email, u.phone, u.digest_sms, due.since
+    )
+    SELECT COALESCE(jsonb_agg(jsonb_build_object(
+        'user_id', c.id,
+        'email', c.email,
+        'phone', c.phone,
+        'digest_sms', c.digest_sms,
+        'notifications', (
+            SELECT jsonb_agg(jsonb_build_object(
+                       'message', n.message,
+                       'event_count', n.event_count,
+                       'created_at', n.created_at
+                   ) ORDER BY n.created_at DESC)
+            FROM notifications n
+            WHERE n.user_id = c.id
+            AND NOT n.read
+            AND n.created_at > c.since
+        )
+    )), '[]'::jsonb)
+    FROM claimed c;
+$$;
+
+REVOKE EXECUTE ON FUNCTION claim_due_notification_digests FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION claim_due_notification_digests TO service_role;
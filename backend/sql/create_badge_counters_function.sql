@@ -0,0 +1,26 @@
+-- Every header badge count for one user in one round trip. Unread
+-- notifications come from notification_counters, unread messages from the
+-- conversation summaries; admins also get the pending claim count, an
+-- index-only count on idx_claims_status_created_at.
+CREATE OR REPLACE FUNCTION get_badge_counters(
+    p_user_id UUID,
+    p_include_claims BOOLEAN DEFAULT FALSE
+)
+RETURNS JSONB
+LANGUAGE SQL
+STABLE
+AS $$
+    SELECT jsonb_build_object(
+        'notifications', COALESCE((SELECT unread_count FROM notification_counters WHERE user_id = p_user_id), 0),
+        'messages', (
+            COALESCE((SELECT SUM(unread_a) FROM conversations WHERE user_a = p_user_id), 0) +
+            COALESCE((SELECT SUM(unread_b) FROM conversations WHERE user_b = p_user_id), 0)
+        )::INTEGER,
+        'pending_claims', CASE
+            WHEN p_include_claims THEN (SELECT COUNT(*) FROM claims WHERE verification_status = 'pending')::INTEGER
+        END
+    );
+$$;
+
+REVOKE EXECUTE ON FUNCTION get_badge_counters FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION get_badge_counters TO service_role;
@@ -0,0 +1,18 @@
+-- Support the admin review queue (GET /api/claims/review-queue)
+
+-- Manual triage priority, higher is reviewed first; admins set it with
+-- PUT /api/claims/<id> {"priority": n}, n between -100 and 100
+ALTER TABLE claims ADD COLUMN IF NOT EXISTS priority SMALLINT NOT NULL DEFAULT 0;
+
+-- Keyset pagination by age within a status
+CREATE INDEX IF NOT EXISTS idx_claims_status_created_at
+    ON claims(verification_status, created_at, id);
+
+-- Keyset pagination by priority within a status
+CREATE INDEX IF NOT EXISTS idx_claims_status_priority
+    ON claims(verification_status, priority DESC, created_at, id);
+
+-- Embedding items and filtering by category
+CREATE INDEX IF NOT EXISTS idx_claims_item_id ON claims(item_id);
+CREATE INDEX IF NOT EXISTS idx_claims_user_id ON claims(user_id);
+CREATE INDEX IF NOT EXISTS idx_items_category ON items(category);
@@ -0,0 +1,232 @@
+-- One row per conversation (participant pair + optional item) holding what
+-- the conversation list shows, kept current by triggers on messages so the
+-- list never scans message history.
+-- user_a is always the smaller of the two participant ids.
+CREATE TABLE IF NOT EXISTS conversations (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_a UUID NOT NULL,
+    user_b UUID NOT NULL,
+    item_id UUID,
+    last_message TEXT,
+    last_message_at TIMESTAMPTZ,
+    last_sender_id UUID,
+    unread_a INTEGER NOT NULL DEFAULT 0,
+    unread_b INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    CHECK (user_a < user_b)
+);
+
+-- Participants may read their own rows; only the triggers below and the
+-- service role write them
+ALTER TABLE conversations ENABLE ROW LEVEL SECURITY;
+REVOKE ALL ON conversations FROM anon;
+REVOKE INSERT, UPDATE, DELETE ON conversations FROM authenticated;
+
+DROP POLICY IF EXISTS conversations_select_policy ON conversations;
+CREATE POLICY conversations_select_policy ON conversations
+    FOR SELECT
+    TO authenticated
+    USING (auth.uid() IN (user_a, user_b));
+
+-- NULL item ids are folded into one key so item-less conversations are unique too
+CREATE UNIQUE INDEX IF NOT EXISTS idx_conversations_participants_item
+    ON conversations(user_a, user_b, (COALESCE(item_id, '00000000-0000-0000-0000-000000000000'::UUID)));
+CREATE INDEX IF NOT EXISTS idx_conversations_user_a_last_message_at
+    ON conversations(user_a, last_message_at DESC);
+CREATE INDEX IF NOT EXISTS idx_conversations_user_b_last_message_at
+    ON conversations(user_b, last_message_at DESC);
+
+-- Statement-level triggers: a batch of inserted or updated messages touches
+-- each affected conversation row once. They run as the owner so messages
+-- written by clients can maintain the read-only summary rows.
+CREATE OR REPLACE FUNCTION conversations_on_message_insert()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    INSERT INTO conversations AS c (user_a, user_b, item_id, last_message, last_message_at, last_sender_id, unread_a, unread_b)
+    SELECT DISTINCT ON (user_a, user_b, item_key)
+           user_a, user_b, item_id,
+           content, created_at, sender_id,
+           SUM(CASE WHEN receiver_id = user_a AND NOT COALESCE(read, FALSE) THEN 1 ELSE 0 END) OVER w,
+           SUM(CASE WHEN receiver_id = user_b AND NOT COALESCE(read, FALSE) THEN 1 ELSE 0 END) OVER w
+    FROM (
+        SELECT LEAST(sender_id, receiver_id) AS user_a,
+               GREATEST(sender_id, receiver_id) AS user_b,
+               COALESCE(item_id, '00000000-0000-0000-0000-000000000000'::UUID) AS item_key,
+               *
+        FROM new_rows
+        WHERE sender_id <> receiver_id
+    ) m
+    WINDOW w AS (PARTITION BY user_a, user_b, item_key)
+    ORDER BY user_a, user_b, item_key, created_at DESC
+    ON CONFLICT (user_a, user_b, (COALESCE(item_id, '00000000-0000-0000-0000-000000000000'::UUID))) DO UPDATE
+    SET last_message = CASE WHEN EXCLUDED.last_message_at >= COALESCE(c.last_message_at, '-infinity') THEN EXCLUDED.last_message ELSE c.last_message END,
+        last_sender_id = CASE WHEN EXCLUDED.last_message_at >= COALESCE(c.last_message_at, '-infinity') THEN EXCLUDED.last_sender_id ELSE c.last_sender_id END,
+        last_message_at = GREATEST(c.last_message_at, EXCLUDED.last_message_at),
+        unread_a = c.unread_a + EXCLUDED.unread_a,
+        unread_b = c.unread_b + EXCLUDED.unread_b;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION conversations_on_message_update()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    -- Only read-state changes move the counters
+    UPDATE conversations c
+    SET unread_a = GREATEST(c.unread_a + d.delta_a, 0),
+        unread_b = GREATEST(c.unread_b + d.delta_b, 0)
+    FROM (
+        SELECT LEAST(n.sender_id, n.receiver_id) AS user_a,
+               GREATEST(n.sender_id, n.receiver_id) AS user_b,
+               COALESCE(n.item_id, '00000000-0000-0000-0000-000000000000'::UUID) AS item_key,
+               SUM(CASE WHEN n.receiver_id < n.sender_id THEN (COALESCE(o.read, FALSE)::INTEGER - COALESCE(n.read, FALSE)::INTEGER) ELSE 0 END) AS delta_a,
+               SUM(CASE WHEN n.receiver_id > n.sender_id THEN (COALESCE(o.read, FALSE)::INTEGER - COALESCE(n.read, FALSE)::INTEGER) ELSE 0 END) AS delta_b
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        WHERE COALESCE(o.read, FALSE) IS DISTINCT FROM COALESCE(n.read, FALSE)
+        AND n.sender_id <> n.receiver_id
+        GROUP BY 1, 2, 3
+    ) d
+    WHERE c.user_a = d.user_a
+    AND c.user_b = d.user_b
+    AND COALESCE(c.item_id, '00000000-0000-0000-0000-000000000000'::UUID) = d.item_key;
+    RETURN NULL;
+END;
+$$;
+
+-- Deletes are rare; recompute the affected conversations from scratch
+CREATE OR REPLACE FUNCTION conversations_on_message_delete()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    WITH affected AS (
+        SELECT DISTINCT LEAST(sender_id, receiver_id) AS user_a,
+               GREATEST(sender_id, receiver_id) AS user_b,
+               COALESCE(item_id, '00000000-0000-0000-0000-000000000000'::UUID) AS item_key
+        FROM old_rows
+    ), recomputed AS (
+        SELECT a.user_a, a.user_b, a.item_key, last.content, last.created_at, last.sender_id,
+               (SELECT COUNT(*) FROM messages m
+                WHERE m.receiver_id = a.user_a AND m.sender_id = a.user_b AND NOT COALESCE(m.read, FALSE)
+                AND COALESCE(m.item_id, '00000000-0000-0000-0000-000000000000'::UUID) = a.item_key) AS unread_a,
+               (SELECT COUNT(*) FROM messages m
+                WHERE m.receiver_id = a.user_b AND m.sender_id = a.user_a AND NOT COALESCE(m.read, FALSE)
+                AND COALESCE(m.item_id, '00000000-0000-0000-0000-000000000000'::UUID) = a.item_key) AS unread_b
+        FROM affected a
+        LEFT JOIN LATERAL (
+            SELECT m.content, m.created_at, m.sender_id
+            FROM messages m
+            WHERE LEAST(m.sender_id, m.receiver_id) = a.user_a
+            AND GREATEST(m.sender_id, m.receiver_id) = a.user_b
+            AND COALESCE(m.item_id, '00000000-0000-0000-0000-000000000000'::UUID) = a.item_key
+            ORDER BY m.created_at DESC
+            LIMIT 1
+        ) last ON TRUE
+    ), updated AS (
+        UPDATE conversations c
+        SET last_message = r.content,
+            last_message_at = r.created_at,
+            last_sender_id = r.sender_id,
+            unread_a = r.unread_a,
+            unread_b = r.unread_b
+        FROM recomputed r
+        WHERE c.user_a = r.user_a
+        AND c.user_b = r.user_b
+        AND COALESCE(c.item_id, '00000000-0000-0000-0000-000000000000'::UUID) = r.item_key
+        AND r.created_at IS NOT NULL
+    )
+    -- Conversations with no messages left disappear from the list (a
+    -- disjoint set of rows from the update above)
+    DELETE FROM conversations c
+    USING recomputed r
+    WHERE c.user_a = r.user_a
+    AND c.user_b = r.user_b
+    AND COALESCE(c.item_id, '00000000-0000-0000-0000-000000000000'::UUID) = r.item_key
+    AND r.created_at IS NULL;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS conversations_message_insert ON messages;
+CREATE TRIGGER conversations_message_insert
+    AFTER INSERT ON messages
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION conversations_on_message_insert();
+
+DROP TRIGGER IF EXISTS conversations_message_update ON messages;
+CREATE TRIGGER conversations_message_update
+    AFTER UPDATE ON messages
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION conversations_on_message_update();
+
+DROP TRIGGER IF EXISTS conversations_message_delete ON messages;
+CREATE TRIGGER conversations_message_delete
+    AFTER DELETE ON messages
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION conversations_on_message_delete();
+
+-- Backfill from the existing messages
+INSERT INTO conversations (user_a, user_b, item_id, last_message, last_message_at, last_sender_id, unread_a, unread_b)
+SELECT DISTINCT ON (user_a, user_b, item_key)
+       user_a, user_b, item_id, content, created_at, sender_id,
+       SUM(CASE WHEN receiver_id = user_a AND NOT COALESCE(read, FALSE) THEN 1 ELSE 0 END) OVER w,
+       SUM(CASE WHEN receiver_id = user_b AND NOT COALESCE(read, FALSE) THEN 1 ELSE 0 END) OVER w
+FROM (
+    SELECT LEAST(sender_id, receiver_id) AS user_a,
+           GREATEST(sender_id, receiver_id) AS user_b,
+           COALESCE(item_id, '00000000-0000-0000-0000-000000000000'::UUID) AS item_key,
+           *
+    FROM messages
+    WHERE sender_id <> receiver_id
+) m
+WINDOW w AS (PARTITION BY user_a, user_b, item_key)
+ORDER BY user_a, user_b, item_key, created_at DESC
+ON CONFLICT DO NOTHING;
+
+-- The conversation list is now one indexed read of the user's rows plus
+-- primary-key lookups for the names on the page
+CREATE OR REPLACE FUNCTION get_conversations(user_uuid UUID)
+RETURNS TABLE (
+    conversation_id UUID,
+    other_user_id UUID,
+    other_user_name TEXT,
+    last_message TEXT,
+    last_message_time TIMESTAMP WITH TIME ZONE,
+    unread_count BIGINT,
+    item_id UUID,
+    item_name TEXT
+)
+LANGUAGE SQL
+STABLE
+AS $$
+    SELECT
+        c.id AS conversation_id,
+        c.other_user_id,
+        COALESCE(p.name, p.email) AS other_user_name,
+        c.last_message,
+        c.last_message_at AS last_message_time,
+        c.unread_count::BIGINT,
+        c.item_id,
+        i.name AS item_name
+    FROM (
+        SELECT id, user_b AS other_user_id, item_id, last_message, last_message_at, unread_a AS unread_count
+        FROM conversations
+        WHERE user_a = user_uuid
+        UNION ALL
+        SELECT id, user_a AS other_user_id, item_id, last_message, last_message_at, unread_b AS unread_count
+        FROM conversations
+        WHERE user_b = user_uuid
+    ) c
+    LEFT JOIN profiles p ON c.other_user_id = p.id
+    LEFT JOIN items i ON c.item_id = i.id
+    WHERE c.last_message IS NOT NULL
+    ORDER BY c.last_message_at DESC;
+$$;
@@ -0,0 +1,65 @@
+-- Full-text search over message content. The tsvector is stored so ranking
+-- doesn't re-parse every matching message.
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS content_tsv TSVECTOR
+    GENERATED ALWAYS AS (to_tsvector('english', COALESCE(content, ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_messages_content_tsv ON messages USING GIN (content_tsv);
+
+-- Ranked search across the conversations p_user_id takes part in, with the
+-- same participant rule as messages_select_policy (the backend's service
+-- key bypasses RLS, so it is applied here explicitly; called as an
+-- authenticated user RLS applies as well). p_query takes web-search syntax:
+-- quoted phrases, OR and -excluded words. Optionally narrowed to one other
+-- participant and/or item. Snippets are built for the returned page only,
+-- from HTML-escaped content with matches wrapped in <mark>.
+CREATE OR REPLACE FUNCTION search_messages(
+    p_user_id UUID,
+    p_query TEXT,
+    p_other_user_id UUID DEFAULT NULL,
+    p_item_id UUID DEFAULT NULL,
+    p_limit INTEGER DEFAULT 20,
+    p_offset INTEGER DEFAULT 0
+)
+RETURNS TABLE (
+    id UUID,
+    sender_id UUID,
+    receiver_id UUID,
+    other_user_id UUID,
+    other_user_name TEXT,
+    item_id UUID,
+    item_name TEXT,
+    created_at TIMESTAMP WITH TIME ZONE,
+    rank REAL,
+    snippet TEXT
+)
+LANGUAGE SQL
+STABLE
+AS $$
+    WITH query AS (
+        SELECT websearch_to_tsquery('english', p_query) AS q
+    ), page AS (
+        SELECT m.id, m.sender_id, m.receiver_id, m.item_id, m.content, m.created_at,
+               ts_rank_cd(m.content_tsv, query.q) AS rank,
+               CASE WHEN m.sender_id = p_user_id THEN m.receiver_id ELSE m.sender_id END AS other_user_id
+        FROM messages m, query
+        WHERE m.content_tsv @@ query.q
+        AND (m.sender_id = p_user_id OR m.receiver_id = p_user_id)
+        AND (p_other_user_id IS NULL OR m.sender_id = p_other_user_id OR m.receiver_id = p_other_user_id)
+        AND (p_item_id IS NULL OR m.item_id = p_item_id)
+        ORDER BY rank DESC, m.created_at DESC, m.id
+        LIMIT p_limit OFFSET p_offset
+    )
+    SELECT page.id, page.sender_id, page.receiver_id, page.other_user_id,
+           COALESCE(p.name, p.email) AS other_user_name,
+           page.item_id, i.name AS item_name, page.created_at, page.rank,
+           ts_headline('english',
+               replace(replace(replace(page.content, '&', '&amp;'), '<', '&lt;'), '>', '&gt;'),
+               query.q,
+               'StartSel=<mark>, StopSel=</mark>, MaxWords=24, MinWords=8, MaxFragments=2, FragmentDelimiter=" ... "'
+           ) AS snippet
+    FROM page
+    CROSS JOIN query
+    LEFT JOIN profiles p ON p.id = page.other_user_id
+    LEFT JOIN items i ON i.id = page.item_id
+    ORDER BY page.rank DESC, page.created_at DESC, page.id;
+$$;
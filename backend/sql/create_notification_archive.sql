@@ -0,0 +1,165 @@
+-- Read notifications past the retention period are moved out of the hot
+-- notifications table into an archive partitioned by month, so inbox
+-- queries only ever scan recent rows and old months can be dropped whole.
+CREATE TABLE IF NOT EXISTS notifications_archive (
+    LIKE notifications INCLUDING DEFAULTS
+) PARTITION BY RANGE (created_at);
+
+ALTER TABLE notifications_archive ADD COLUMN IF NOT EXISTS archived_at TIMESTAMPTZ NOT NULL DEFAULT NOW();
+
+-- Rows outside every monthly partition land here instead of failing
+CREATE TABLE IF NOT EXISTS notifications_archive_default
+    PARTITION OF notifications_archive DEFAULT;
+
+-- Only the backend reads the archive. Partitions are tables of their own
+-- that PostgREST would expose too, so each one is locked down as well
+-- (monthly ones as ensure_notification_archive_partitions creates them).
+ALTER TABLE notifications_archive ENABLE ROW LEVEL SECURITY;
+REVOKE ALL ON notifications_archive FROM anon, authenticated;
+GRANT ALL ON notifications_archive TO service_role;
+ALTER TABLE notifications_archive_default ENABLE ROW LEVEL SECURITY;
+REVOKE ALL ON notifications_archive_default FROM anon, authenticated;
+GRANT ALL ON notifications_archive_default TO service_role;
+
+-- Created on the parent, so every partition gets its own copy
+CREATE INDEX IF NOT EXISTS idx_notifications_archive_user_created_at
+    ON notifications_archive(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_notifications_archive_id
+    ON notifications_archive(id);
+
+-- The archiving job looks for old read rows by age
+CREATE INDEX IF NOT EXISTS idx_notifications_read_created_at
+    ON notifications(created_at)
+    WHERE read;
+
+-- Create the monthly partitions covering p_from through p_months_ahead
+-- months from now; existing ones are left alone
+CREATE OR REPLACE FUNCTION ensure_notification_archive_partitions(
+    p_from TIMESTAMPTZ DEFAULT NULL,
+    p_months_ahead INTEGER DEFAULT 2
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+    v_month DATE;
+    v_last DATE := (date_trunc('month', NOW()) + make_interval(months => p_months_ahead))::DATE;
+    v_name TEXT;
+    v_created INTEGER := 0;
+BEGIN
+    v_month := date_trunc('month', COALESCE(
+        p_from,
+        (SELECT MIN(created_at) FROM notifications WHERE read),
+        NOW()
+    ))::DATE;
+
+    WHILE v_month <= v_last LOOP
+        v_name := 'notifications_archive_' || to_char(v_month, 'YYYY_MM');
+        IF to_regclass(v_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF notifications_archive FOR VALUES FROM (%L) TO (%L)',
+                v_name, v_month, (v_month + INTERVAL '1 month')::DATE
+            );
+            EXECUTE format('ALTER TABLE %I ENABLE ROW LEVEL SECURITY', v_name);
+            EXECUTE format('REVOKE ALL ON %I FROM anon, authenticated', v_name);
+            EXECUTE format('GRANT ALL ON %I TO service_role', v_name);
+            v_created := v_created + 1;
+        END IF;
+        v_month := (v_month + INTERVAL '1 month')::DATE;
+    END LOOP;
+
+    RETURN v_created;
+END;
+$$;
+
+-- Move one batch of read notifications older than p_older_than_days into
+-- the archive. SKIP LOCKED lets the job run next to users marking or
+-- deleting notifications without waiting on them. Returns the rows moved;
+-- callers repeat until it returns less than p_batch_size.
+CREATE OR REPLACE FUNCTION archive_read_notifications(
+    p_older_than_days INTEGER DEFAULT 90,
+    p_batch_size INTEGER DEFAULT 5000
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+    v_moved INTEGER;
+BEGIN
+    WITH batch AS (
+        SELECT id
+        FROM notifications
+        WHERE read
+        AND created_at < NOW() - make_interval(days => p_older_than_days)
+        ORDER BY created_at
+        LIMIT p_batch_size
+        FOR UPDATE SKIP LOCKED
+    ), moved AS (
+        DELETE FROM notifications n
+        USING batch
+        WHERE n.id = batch.id
+        RETURNING n.*
+    )
+    INSERT INTO notifications_archive
+    SELECT (jsonb_populate_record(NULL::notifications_archive, to_jsonb(moved) || jsonb_build_object('archived_at', NOW()))).*
+    FROM moved;
+
+    GET DIAGNOSTICS v_moved = ROW_COUNT;
+    RETURN v_moved;
+END;
+$$;
+
+-- Drop whole archive months older than p_keep_months
+CREATE OR REPLACE FUNCTION drop_notification_archive_partitions(p_keep_months INTEGER)
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+    v_partition RECORD;
+    v_cutoff TEXT := 'notifications_archive_' || to_char(date_trunc('month', NOW()) - make_interval(months => p_keep_months), 'YYYY_MM');
+    v_dropped INTEGER := 0;
+BEGIN
+    FOR v_partition IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'notifications_archive'::regclass
+        AND c.relname ~ '^notifications_archive_[0-9]{4}_[0-9]{2}$'
+        AND c.relname < v_cutoff
+    LOOP
+        EXECUTE format('DROP TABLE %I', v_partition.relname);
+        v_dropped := v_dropped + 1;
+    END LOOP;
+    RETURN v_dropped;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION ensure_notification_archive_partitions FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION archive_read_notifications FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION drop_notification_archive_partitions FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION ensure_notification_archive_partitions TO service_role;
+GRANT EXECUTE ON FUNCTION archive_read_notifications TO service_role;
+GRANT EXECUTE ON FUNCTION drop_notification_archive_partitions TO service_role;
+
+SELECT ensure_notification_archive_partitions();
+
+-- Monthly partitions created before they were locked down on creation
+DO $$
+DECLARE
+    v_partition RECORD;
+BEGIN
+    FOR v_partition IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'notifications_archive'::regclass
+    LOOP
+        EXECUTE format('ALTER TABLE %I ENABLE ROW LEVEL SECURITY', v_partition.relname);
+        EXECUTE format('REVOKE ALL ON %I FROM anon, authenticated', v_partition.relname);
+        EXECUTE format('GRANT ALL ON %I TO service_role', v_partition.relname);
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,58 @@
+-- Mark read, mark unread or delete many of one user's notifications in a
+-- single statement. Only rows owned by p_user_id are ever touched, so the
+-- ownership check needs no prior select. Targets are either p_ids or every
+-- row matching p_filter (keys: read, type, notification_type, item_id,
+-- related_id, before, after); with neither, all of the user's rows.
+-- Returns the number of rows changed.
+CREATE OR REPLACE FUNCTION bulk_update_notifications(
+    p_user_id UUID,
+    p_action TEXT,
+    p_ids UUID[] DEFAULT NULL,
+    p_filter JSONB DEFAULT '{}'::JSONB
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+    v_count INTEGER;
+    v_filter JSONB := COALESCE(p_filter, '{}'::JSONB);
+BEGIN
+    IF p_action NOT IN ('read', 'unread', 'delete') THEN
+        RAISE EXCEPTION 'INVALID_ACTION: %', p_action;
+    END IF;
+
+    IF p_action = 'delete' THEN
+        DELETE FROM notifications n
+        WHERE n.user_id = p_user_id
+        AND (p_ids IS NULL OR n.id = ANY(p_ids))
+        AND (NOT v_filter ? 'read' OR n.read = (v_filter->>'read')::BOOLEAN)
+        AND (NOT v_filter ? 'type' OR n.type = v_filter->>'type')
+        AND (NOT v_filter ? 'notification_type' OR n.notification_type = v_filter->>'notification_type')
+        AND (NOT v_filter ? 'item_id' OR n.item_id = (v_filter->>'item_id')::UUID)
+        AND (NOT v_filter ? 'related_id' OR n.related_id = (v_filter->>'related_id')::UUID)
+        AND (NOT v_filter ? 'before' OR n.created_at < (v_filter->>'before')::TIMESTAMPTZ)
+        AND (NOT v_filter ? 'after' OR n.created_at > (v_filter->>'after')::TIMESTAMPTZ);
+    ELSE
+        -- Rows already in the target state are skipped, so the count is
+        -- what actually changed and no-op rows aren't rewritten
+        UPDATE notifications n
+        SET read = (p_action = 'read')
+        WHERE n.user_id = p_user_id
+        AND n.read IS DISTINCT FROM (p_action = 'read')
+        AND (p_ids IS NULL OR n.id = ANY(p_ids))
+        AND (NOT v_filter ? 'type' OR n.type = v_filter->>'type')
+        AND (NOT v_filter ? 'notification_type' OR n.notification_type = v_filter->>'notification_type')
+        AND (NOT v_filter ? 'item_id' OR n.item_id = (v_filter->>'item_id')::UUID)
+        AND (NOT v_filter ? 'related_id' OR n.related_id = (v_filter->>'related_id')::UUID)
+        AND (NOT v_filter ? 'before' OR n.created_at < (v_filter->>'before')::TIMESTAMPTZ)
+        AND (NOT v_filter ? 'after' OR n.created_at > (v_filter->>'after')::TIMESTAMPTZ);
+    END IF;
+
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN v_count;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION bulk_update_notifications FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION bulk_update_notifications TO service_role;
@@ -0,0 +1,162 @@
+-- Per-user notification counters, maintained incrementally so the inbox and
+-- the unread badge never have to count rows.
+CREATE TABLE IF NOT EXISTS notification_counters (
+    user_id UUID PRIMARY KEY,
+    unread_count INTEGER NOT NULL DEFAULT 0,
+    total_count INTEGER NOT NULL DEFAULT 0
+);
+
+-- Only the triggers below and the service role touch the counters; clients
+-- read their badge through the API
+ALTER TABLE notification_counters ENABLE ROW LEVEL SECURITY;
+REVOKE ALL ON notification_counters FROM anon, authenticated;
+
+-- Statement-level triggers aggregate the deltas per user through transition
+-- tables, so marking a whole inbox read touches each counter row once
+-- instead of once per notification. They run as the owner so a write to
+-- notifications by any role can maintain the locked-down counters.
+CREATE OR REPLACE FUNCTION notification_counters_on_insert()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    INSERT INTO notification_counters (user_id, unread_count, total_count)
+    SELECT user_id,
+           COUNT(*) FILTER (WHERE NOT COALESCE(read, FALSE)),
+           COUNT(*)
+    FROM new_rows
+    WHERE user_id IS NOT NULL
+    GROUP BY user_id
+    ON CONFLICT (user_id) DO UPDATE
+    SET unread_count = notification_counters.unread_count + EXCLUDED.unread_count,
+        total_count = notification_counters.total_count + EXCLUDED.total_count;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION notification_counters_on_delete()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    UPDATE notification_counters c
+    SET unread_count = GREATEST(c.unread_count - d.unread, 0),
+        total_count = GREATEST(c.total_count - d.total, 0)
+    FROM (
+        SELECT user_id,
+               COUNT(*) FILTER (WHERE NOT COALESCE(read, FALSE)) AS unread,
+               COUNT(*) AS total
+        FROM old_rows
+        GROUP BY user_id
+    ) d
+    WHERE c.user_id = d.user_id;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION notification_counters_on_update()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    -- Old rows leave their user's counters, new rows join theirs; this also
+    -- covers the (rare) case of a notification changing owner
+    INSERT INTO notification_counters (user_id, unread_count, total_count)
+    SELECT user_id, SUM(unread), SUM(total)
+    FROM (
+        SELECT user_id, -(NOT COALESCE(read, FALSE))::INTEGER AS unread, -1 AS total FROM old_rows
+        UNION ALL
+        SELECT user_id, (NOT COALESCE(read, FALSE))::INTEGER AS unread, 1 AS total FROM new_rows
+    ) deltas
+    WHERE user_id IS NOT NULL
+    GROUP BY user_id
+    HAVING SUM(unread) <> 0 OR SUM(total) <> 0
+    ON CONFLICT (user_id) DO UPDATE
+    SET unread_count = GREATEST(notification_counters.unread_count + EXCLUDED.unread_count, 0),
+        total_count = GREATEST(notification_counters.total_count + EXCLUDED.total_count, 0);
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS notification_counters_insert ON notifications;
+CREATE TRIGGER notification_counters_insert
+    AFTER INSERT ON notifications
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notification_counters_on_insert();
+
+DROP TRIGGER IF EXISTS notification_counters_delete ON notifications;
+CREATE TRIGGER notification_counters_delete
+    AFTER DELETE ON notifications
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notification_counters_on_delete();
+
+DROP TRIGGER IF EXISTS notification_counters_update ON notifications;
+CREATE TRIGGER notification_counters_update
+    AFTER UPDATE ON notifications
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notification_counters_on_update();
+
+-- Backfill from the existing notifications
+INSERT INTO notification_counters (user_id, unread_count, total_count)
+SELECT user_id,
+       COUNT(*) FILTER (WHERE NOT COALESCE(read, FALSE)),
+       COUNT(*)
+FROM notifications
+WHERE user_id IS NOT NULL
+GROUP BY user_id
+ON CONFLICT (user_id) DO UPDATE
+SET unread_count = EXCLUDED.unread_count,
+    total_count = EXCLUDED.total_count;
+
+-- Inbox pages ordered by recency, optionally filtered by read state
+CREATE INDEX IF NOT EXISTS idx_notifications_user_created_at
+    ON notifications(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_notifications_user_read_created_at
+    ON notifications(user_id, read, created_at DESC);
+
+-- One round trip for an inbox page plus its counts
+CREATE OR REPLACE FUNCTION get_notification_inbox(
+    p_user_id UUID,
+    p_is_read BOOLEAN DEFAULT NULL,
+    p_limit INTEGER DEFAULT 10,
+    p_offset INTEGER DEFAULT 0
+)
+RETURNS JSONB
+LANGUAGE SQL
+STABLE
+AS $$
+    SELECT jsonb_build_object(
+        'notifications', COALESCE((
+            SELECT jsonb_agg(to_jsonb(page) ORDER BY page.created_at DESC)
+            FROM (
+                SELECT *
+                FROM notifications n
+                WHERE n.user_id = p_user_id
+                AND (p_is_read IS NULL OR n.read = p_is_read)
+                ORDER BY n.created_at DESC
+                LIMIT p_limit OFFSET p_offset
+            ) page
+        ), '[]'::jsonb),
+        'total', COALESCE(c.total_count, 0),
+        'unread_count', COALESCE(c.unread_count, 0)
+    )
+    FROM (SELECT p_user_id AS user_id) me
+    LEFT JOIN notification_counters c ON c.user_id = me.user_id;
+$$;
+
+-- The unread badge on its own
+CREATE OR REPLACE FUNCTION get_unread_notification_count(p_user_id UUID)
+RETURNS INTEGER
+LANGUAGE SQL
+STABLE
+AS $$
+    SELECT COALESCE((SELECT unread_count FROM notification_counters WHERE user_id = p_user_id), 0);
+$$;
+
+REVOKE EXECUTE ON FUNCTION get_notification_inbox FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION get_notification_inbox TO service_role;
+REVOKE EXECUTE ON FUNCTION get_unread_notification_count FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION get_unread_notification_count TO service_role;
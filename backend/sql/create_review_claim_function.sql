@@ -0,0 +1,87 @@
+-- Verify or reject a claim atomically in one round trip.
+-- Locks the item first so competing verifications of different claims for
+-- the same item are serialized: the second one sees the item as claimed
+-- and fails with ITEM_ALREADY_CLAIMED instead of double-assigning it.
+-- p_priority, when given, sets the claim's review-queue priority in the
+-- same update (see create_claims_review_queue_indexes.sql).
+DROP FUNCTION IF EXISTS review_claim(UUID, TEXT, TEXT);
+
+CREATE OR REPLACE FUNCTION review_claim(
+    p_claim_id UUID,
+    p_status TEXT,
+    p_admin_notes TEXT DEFAULT NULL,
+    p_priority INTEGER DEFAULT NULL
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+    v_item_id UUID;
+    v_claim claims%ROWTYPE;
+    v_item items%ROWTYPE;
+BEGIN
+    IF p_status NOT IN ('verified', 'rejected') THEN
+        RAISE EXCEPTION 'INVALID_STATUS: %', p_status;
+    END IF;
+
+    SELECT item_id INTO v_item_id FROM claims WHERE id = p_claim_id;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'CLAIM_NOT_FOUND: %', p_claim_id;
+    END IF;
+
+    -- Lock order is always item, then claim
+    SELECT * INTO v_item FROM items WHERE id = v_item_id FOR UPDATE;
+    SELECT * INTO v_claim FROM claims WHERE id = p_claim_id FOR UPDATE;
+
+    IF p_status = 'verified' AND v_claim.verification_status <> 'verified' THEN
+        IF v_item.status IN ('claimed', 'returned') THEN
+            RAISE EXCEPTION 'ITEM_ALREADY_CLAIMED: %', v_item_id;
+        END IF;
+
+        UPDATE items
+        SET status = 'claimed',
+            user_claimed_id = v_claim.user_id,
+            updated_at = NOW()
+        WHERE id = v_item_id
+        RETURNING * INTO v_item;
+
+        INSERT INTO notifications (user_id, item_id, message, notification_type, created_at, read)
+        VALUES (
+            v_claim.user_id,
+            v_item_id,
+            'Your claim for ''' || v_item.name || ''' has been verified. You can now pick it up.',
+            'claim_update',
+            NOW(),
+            FALSE
+        );
+    ELSIF p_status = 'rejected' AND v_claim.verification_status <> 'rejected' THEN
+        INSERT INTO notifications (user_id, item_id, message, notification_type, created_at, read)
+        VALUES (
+            v_claim.user_id,
+            v_item_id,
+            'Your claim for ''' || v_item.name || ''' has been rejected.',
+            'claim_update',
+            NOW(),
+            FALSE
+        );
+    END IF;
+
+    UPDATE claims
+    SET verification_status = p_status,
+        admin_notes = COALESCE(p_admin_notes, admin_notes),
+        priority = COALESCE(p_priority, priority),
+        updated_at = NOW()
+    WHERE id = p_claim_id
+    RETURNING * INTO v_claim;
+
+    RETURN jsonb_build_object(
+        'claim', to_jsonb(v_claim),
+        'item', to_jsonb(v_item)
+    );
+END;
+$$;
+
+-- Only the backend (service role) reviews claims
+REVOKE EXECUTE ON FUNCTION review_claim FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION review_claim TO service_role;
@@ -0,0 +1,67 @@
+-- Send a chat message in one round trip and one transaction: check the
+-- item, insert the message (the conversations triggers update the summary
+-- row in the same statement) and create or fold the receiver's notification.
+-- p_notification is the notification row without related_id, which is set
+-- to the new message; with no p_notification none is created.
+-- Returns {"message": <row>, "notification": <row or null>}.
+CREATE OR REPLACE FUNCTION send_message(
+    p_sender_id UUID,
+    p_receiver_id UUID,
+    p_content TEXT,
+    p_item_id UUID DEFAULT NULL,
+    p_notification JSONB DEFAULT NULL,
+    p_coalesce_key TEXT DEFAULT NULL,
+    p_window_seconds INTEGER DEFAULT 3600,
+    p_summary TEXT DEFAULT NULL
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+    v_message messages%ROWTYPE;
+    v_notification JSONB;
+BEGIN
+    IF p_sender_id = p_receiver_id THEN
+        RAISE EXCEPTION 'SELF_MESSAGE';
+    END IF;
+
+    -- Primary-key probe; the foreign key would reject a missing item too,
+    -- but without a usable error
+    IF p_item_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM items WHERE id = p_item_id) THEN
+        RAISE EXCEPTION 'ITEM_NOT_FOUND: %', p_item_id;
+    END IF;
+
+    INSERT INTO messages (sender_id, receiver_id, content, item_id, read, created_at, updated_at)
+    VALUES (p_sender_id, p_receiver_id, p_content, p_item_id, FALSE, NOW(), NOW())
+    RETURNING * INTO v_message;
+
+    IF p_notification IS NOT NULL THEN
+        IF p_coalesce_key IS NOT NULL THEN
+            v_notification := upsert_coalesced_notification(
+                p_notification || jsonb_build_object('user_id', p_receiver_id, 'related_id', v_message.id),
+                p_coalesce_key,
+                p_window_seconds,
+                p_summary
+            );
+        ELSE
+            INSERT INTO notifications
+            SELECT * FROM jsonb_populate_record(NULL::notifications,
+                jsonb_strip_nulls(p_notification) || jsonb_build_object(
+                    'id', gen_random_uuid(),
+                    'user_id', p_receiver_id,
+                    'related_id', v_message.id,
+                    'event_count', 1,
+                    'read', FALSE,
+                    'created_at', NOW()
+                ))
+            RETURNING to_jsonb(notifications.*) INTO v_notification;
+        END IF;
+    END IF;
+
+    RETURN jsonb_build_object('message', to_jsonb(v_message), 'notification', v_notification);
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION send_message FROM PUBLIC;
+GRANT EXECUTE ON FUNCTION send_message TO service_role;